@@ -1,9 +1,14 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Union, Optional
-import tempfile
+from typing import Dict, List, Union, Optional
+import json
+import threading
+import time
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 # Load environment variables from .env file
@@ -11,8 +16,57 @@ from dotenv import load_dotenv
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 load_dotenv(PROJECT_ROOT / ".env")
 
-from app.rag.glue import answer_question
-from app.rag.voice_utils import process_voice_query, translate_from_english, LANGUAGE_CODES
+from app.rag.glue import answer_question, answer_questions, stream_answer_question, iter_answer_question
+from app.rag.cache import answer_cache
+from app.rag.engine import get_engine
+from app.rag.filters import make_filters
+from app.rag.ratelimit import groq_limiter
+from app.rag.translation import get_translation_service
+from app.rag.tts import get_synthesizer
+from app.rag import llm
+from app.rag.llm_client import llm_guard
+from app.voice_pool import partial_pool, voice_pool, PoolSaturatedError
+from app.metrics import (
+    METRICS_ENABLED, HTTP_IN_FLIGHT, REQUEST_SECONDS,
+    register_gauge, render_metrics, request_timings, server_timing_header, span, start_request,
+)
+from app.voice_stream import voice_session
+from app.rag.audio import read_voice_upload, AudioTooLargeError, AudioDecodeError, MAX_UPLOAD_BYTES
+# voice_utils is cheap to import: whisper/torch, gTTS and the translator load on first use
+from app.rag.voice_utils import (
+    process_voice_query, translate_from_english, LANGUAGE_CODES,
+    get_whisper_model, voice_health, WHISPER_MODELS,
+)
+
+# ------------------------
+# Startup warm-up
+# ------------------------
+# Models load in a background thread so the worker accepts requests immediately;
+# /ready reports when retrieval can actually serve.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+WARMUP_VOICE = os.getenv("WARMUP_VOICE", "false").lower() == "true"
+
+
+def warm_up_models():
+    try:
+        get_engine().warm_up()
+    except Exception as e:
+        print(f"⚠️ Retrieval warm-up failed: {e}")
+
+    if WARMUP_VOICE:
+        try:
+            for model_name in set(WHISPER_MODELS.values()):
+                get_whisper_model(model_name)
+        except Exception as e:
+            print(f"⚠️ Whisper warm-up failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP_ON_STARTUP:
+        threading.Thread(target=warm_up_models, name="model-warmup", daemon=True).start()
+    yield
+
 
 # ------------------------
 # FastAPI App
@@ -21,6 +75,7 @@ app = FastAPI(
     title="Cybercrime RAG API",
     description="Retrieval-Augmented Generation API for Cybercrime Legal Guidance (India)",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # ------------------------
@@ -34,14 +89,129 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ------------------------
+# Upload size guard
+# ------------------------
+VOICE_UPLOAD_PATHS = {"/process-audio"}
+MULTIPART_OVERHEAD_BYTES = 64 * 1024   # form fields + boundaries around the audio part
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """
+    Refuse oversized voice uploads from Content-Length, before the body is read.
+    Uploads without one (chunked) are capped while streaming (audio.read_voice_upload).
+    """
+    if request.url.path in VOICE_UPLOAD_PATHS:
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Audio upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"},
+            )
+    return await call_next(request)
+
+
+# ------------------------
+# Metrics
+# ------------------------
+register_gauge(
+    "voice_pool_jobs", "Voice jobs running / waiting for a worker.",
+    lambda: {("running",): voice_pool.stats()["running"], ("queued",): voice_pool.stats()["queue_depth"]},
+    ("state",),
+)
+register_gauge(
+    "llm_circuit_open", "1 while the LLM circuit breaker is open or probing (answers are retrieval-only).",
+    lambda: 0 if llm_guard.breaker.state == "closed" else 1,
+)
+register_gauge(
+    "retrieval_batcher_queued", "Queries waiting in the retrieval micro-batchers.",
+    lambda: {
+        (name,): stats["queued"]
+        for name, stats in get_engine().health().get("batching", {}).items()
+    },
+    ("batcher",),
+)
+
+
+@app.middleware("http")
+async def record_request_timings(request: Request, call_next):
+    """
+    Request latency histogram + a Server-Timing header with per-stage durations.
+
+    Latency and the in-flight gauge cover the whole response body, so
+    streamed routes (/ask/stream, /ask/batch, /tts) count until their last
+    chunk. Their Server-Timing header only has the stages that ran before
+    the body started; the NDJSON routes report the rest in their final event.
+    """
+    if not METRICS_ENABLED:
+        return await call_next(request)
+
+    timings = start_request()
+    started = time.perf_counter()
+    HTTP_IN_FLIGHT.__enter__()
+    try:
+        response = await call_next(request)
+    except BaseException:
+        HTTP_IN_FLIGHT.__exit__(None, None, None)
+        raise
+    response.headers["Server-Timing"] = server_timing_header(timings, time.perf_counter() - started)
+
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    body = response.body_iterator
+    finished = False
+
+    def finish():
+        nonlocal finished
+        if not finished:
+            finished = True
+            HTTP_IN_FLIGHT.__exit__(None, None, None)
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started, request.method, route, str(response.status_code)
+            )
+
+    async def observed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            finish()
+
+    response.body_iterator = observed_body()
+    return response
+
+
 # ------------------------
 # Request / Response Models
 # ------------------------
-class AskRequest(BaseModel):
-    question: str
+class RetrievalOptions(BaseModel):
     top_k: int = 5
     language: str = "english"  # Supported: english, hindi, kannada, tamil
 
+    # Optional retrieval filters (pushed down into the Chroma query)
+    category: Optional[Union[str, List[str]]] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    location: Optional[str] = None
+    severity: Optional[str] = None   # matches seriousness_level
+
+    def filters(self):
+        return make_filters(
+            category=self.category,
+            year_from=self.year_from,
+            year_to=self.year_to,
+            location=self.location,
+            severity=self.severity,
+        )
+
+
+class AskRequest(RetrievalOptions):
+    question: str
+
+
+class AskBatchRequest(RetrievalOptions):
+    questions: List[str]   # at most ASK_BATCH_MAX_QUESTIONS
+
 
 class Source(BaseModel):
     title: str
@@ -55,11 +225,17 @@ class AskResponse(BaseModel):
     sources: List[Source]
 
 
+class TTSRequest(BaseModel):
+    text: str
+    language: str = "english"  # Supported: english, hindi, kannada, tamil
+
+
 class VoiceResponse(BaseModel):
     query_text_native: str
     response_text_native: str
     audio_base64: str
     sources: Optional[List[Source]] = []
+    timings: Optional[Dict[str, float]] = None   # per-stage seconds
 
 
 # ------------------------
@@ -67,7 +243,69 @@ class VoiceResponse(BaseModel):
 # ------------------------
 @app.get("/")
 def health_check():
-    return {"status": "ok", "message": "Cybercrime RAG API is running"}
+    return {
+        "status": "ok",
+        "message": "Cybercrime RAG API is running",
+        "retrieval": get_engine().health(),
+    }
+
+
+@app.get("/ready")
+def readiness_check():
+    """
+    Per-component load state. Returns 503 until retrieval is loaded,
+    so load balancers only route text traffic to warm workers.
+    Whisper is optional: it loads on the first voice request unless WARMUP_VOICE=true.
+    """
+    engine = get_engine()
+    components = {
+        "retrieval": engine.health(),
+        "llm": {
+            "state": "ready" if llm.client else "not_configured",
+            "circuit": llm_guard.breaker.state,
+        },
+        "voice": {**voice_health(), "pool": voice_pool.stats()},
+    }
+    return JSONResponse(
+        status_code=200 if engine.ready else 503,
+        content={"ready": engine.ready, "components": components},
+    )
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: stage / request latency histograms and gauges."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/llm/stats")
+def llm_stats():
+    """LLM call retries, hedges, failures and circuit breaker state."""
+    return llm_guard.stats()
+
+
+@app.get("/voice/stats")
+def voice_stats():
+    """Voice worker pool occupancy, queue depth and wait times (plus the /ws/voice partials pool)."""
+    return {**voice_pool.stats(), "partials": partial_pool.stats()}
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Semantic answer cache hit/miss counters."""
+    return answer_cache.stats()
+
+
+@app.get("/translation/stats")
+def translation_stats():
+    """Translation requests, failures and persistent cache hit rate."""
+    return get_translation_service().stats()
+
+
+@app.get("/tts/stats")
+def tts_stats():
+    """Synthesized segment count and audio cache hit rate."""
+    return get_synthesizer().stats()
 
 
 @app.post("/ask", response_model=AskResponse)
@@ -75,14 +313,16 @@ def ask(payload: AskRequest):
     try:
         answer, sources = answer_question(
             payload.question,
-            payload.top_k
+            payload.top_k,
+            payload.filters()
         )
 
         # Translate response to user's selected language if not English
         target_lang = payload.language.lower()
         if target_lang != "english" and target_lang in LANGUAGE_CODES:
             lang_code = LANGUAGE_CODES[target_lang]["translator"]
-            answer = translate_from_english(answer, lang_code)
+            with span("translate"):
+                answer = translate_from_english(answer, lang_code)
             print(f"🔄 Translated response to {target_lang}")
 
         return {
@@ -98,65 +338,260 @@ def ask(payload: AskRequest):
         )
 
 
-@app.post("/process-audio", response_model=VoiceResponse)
-async def process_audio(
-    file: UploadFile = File(...),
-    target_lang: str = Form(default="english")
-):
+@app.post("/ask/category/{category}", response_model=AskResponse)
+def ask_category(category: str, payload: AskRequest):
+    """
+    Fixed-category route (e.g. the financial-fraud flow): retrieval is
+    restricted to the given category regardless of the body's category.
+    """
+    return ask(payload.model_copy(update={"category": category}))
+
+
+@app.post("/ask/stream")
+async def ask_stream(payload: AskRequest):
+    """
+    Streaming variant of /ask (NDJSON, one JSON event per line).
+
+    - {"type": "sources", "sources": [...]} is sent first
+    - {"type": "token", "content": "..."} is forwarded as the LLM generates
+    - For non-English requests the answer is translated once generation
+      finishes and sent as a single {"type": "answer", "content": "..."}
+    - {"type": "done", "timings": {...}} ends the stream ({"type": "error"}
+      on failure); timings are the request's per-stage seconds
+    """
+    target_lang = payload.language.lower()
+    translate = target_lang != "english" and target_lang in LANGUAGE_CODES
+
+    async def event_stream():
+        answer_parts = []
+        try:
+            async for event in stream_answer_question(payload.question, payload.top_k, payload.filters()):
+                if event["type"] == "token" and translate:
+                    answer_parts.append(event["content"])
+                    continue
+
+                if event["type"] == "done" and translate:
+                    lang_code = LANGUAGE_CODES[target_lang]["translator"]
+                    with span("translate"):
+                        answer = await run_in_threadpool(
+                            translate_from_english, "".join(answer_parts), lang_code
+                        )
+                    print(f"🔄 Translated response to {target_lang}")
+                    yield json.dumps({"type": "answer", "content": answer}) + "\n"
+
+                if event["type"] == "done":
+                    event = {**event, "timings": request_timings()}
+                yield json.dumps(event) + "\n"
+
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            yield json.dumps({"type": "error", "detail": f"Internal server error: {str(e)}"}) + "\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "100"))
+
+
+@app.post("/ask/batch")
+async def ask_batch(payload: AskBatchRequest):
+    """
+    Answer many questions in one call (bulk triage), as NDJSON.
+
+    All questions are embedded together and retrieved with one multi-query
+    search; answers are generated concurrently (ASK_BATCH_CONCURRENCY) within
+    the Groq per-minute quotas (GROQ_REQUESTS_PER_MINUTE / GROQ_TOKENS_PER_MINUTE).
+
+    - {"type": "result", "index": i, "question": "...", "answer": "...", "sources": [...]}
+      is sent for each question as soon as it is answered (completion order;
+      index is the position in the request)
+    - {"type": "error", "index": i, "detail": "..."} if one question fails
+    - {"type": "done", "count": n, "seconds": t, "timings": {...}} ends the
+      stream; timings are the request's per-stage seconds
+    """
+    if not payload.questions:
+        raise HTTPException(status_code=400, detail="questions must not be empty")
+    if len(payload.questions) > ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {ASK_BATCH_MAX_QUESTIONS} questions per batch"
+        )
+
+    target_lang = payload.language.lower()
+    translate = target_lang != "english" and target_lang in LANGUAGE_CODES
+
+    async def event_stream():
+        started = time.perf_counter()
+        count = 0
+        try:
+            async for event in answer_questions(payload.questions, payload.top_k, payload.filters()):
+                event["question"] = payload.questions[event["index"]]
+                if event["type"] == "result" and translate:
+                    with span("translate"):
+                        event["answer"] = await run_in_threadpool(
+                            translate_from_english, event["answer"], LANGUAGE_CODES[target_lang]["translator"]
+                        )
+                count += 1
+                yield json.dumps(event) + "\n"
+
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            yield json.dumps({"type": "error", "detail": f"Internal server error: {str(e)}"}) + "\n"
+
+        yield json.dumps({
+            "type": "done", "count": count,
+            "seconds": round(time.perf_counter() - started, 3), "timings": request_timings(),
+        }) + "\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
+@app.get("/ask/batch/stats")
+def ask_batch_stats():
+    """Groq quota usage of batch jobs over the last minute."""
+    return groq_limiter.stats()
+
+
+def _run_voice_query(decoder, job_started: threading.Event, **kwargs):
+    """Voice pool job: owns the upload's decoder from the moment it starts."""
+    job_started.set()
+    try:
+        return process_voice_query(audio=decoder, **kwargs)
+    finally:
+        decoder.close()
+
+
+VOICE_FORM_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {
+                "file": {"type": "string", "format": "binary"},
+                "target_lang": {"type": "string", "default": "english"},
+                "audio_mode": {"type": "string", "default": "inline", "enum": ["inline", "stream"]},
+            },
+        }}},
+    },
+}
+
+
+@app.post("/process-audio", response_model=VoiceResponse, openapi_extra=VOICE_FORM_SCHEMA)
+async def process_audio(request: Request):
     """
     Process voice query through the RAG pipeline.
     
-    - Accepts audio file (webm, wav, mp3, etc.)
+    Form fields: file (audio), target_lang (default english),
+    audio_mode ("inline" or "stream").
+
+    - Accepts audio file (webm, wav, mp3, etc.), decoded by ffmpeg straight
+      from the request stream while it uploads
+      (413 above VOICE_MAX_UPLOAD_MB / VOICE_MAX_SECONDS)
     - Transcribes using Whisper
     - Translates to English (if needed)
     - Queries the RAG system
-    - Translates response back to native language
+    - Translates response back to native language and synthesizes it,
+      section by section while the LLM is still generating
     - Returns text + audio (base64 MP3)
+
+    With audio_mode="stream" no audio is synthesized here (audio_base64 is
+    empty); the client plays response_text_native through POST /tts instead.
     
     Supported languages: english, hindi, kannada, tamil
     """
-    # Validate language
-    valid_languages = ["english", "hindi", "kannada", "tamil"]
-    if target_lang.lower() not in valid_languages:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Invalid language. Supported: {', '.join(valid_languages)}"
-        )
-    
-    # Save uploaded file temporarily
-    temp_file = None
+    decoder = None
+    job_started = threading.Event()
     try:
-        # Create temp file with appropriate extension
-        suffix = os.path.splitext(file.filename)[1] if file.filename else ".webm"
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-        
-        # Write uploaded content
-        content = await file.read()
-        temp_file.write(content)
-        temp_file.close()
-        
-        # Process through voice pipeline
-        result = process_voice_query(
-            audio_file_path=temp_file.name,
+        # The audio part is decoded while it uploads, with a running byte cap
+        fields, decoder = await read_voice_upload(request)
+        target_lang = fields.get("target_lang", "english")
+        audio_mode = fields.get("audio_mode", "inline")
+
+        # Validate language
+        valid_languages = ["english", "hindi", "kannada", "tamil"]
+        if target_lang.lower() not in valid_languages:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid language. Supported: {', '.join(valid_languages)}"
+            )
+
+        # Process through voice pipeline on the bounded voice pool,
+        # never on the event loop. Once the job starts it closes the decoder,
+        # so a cancelled request never closes it under a running job.
+        result = await voice_pool.run(
+            _run_voice_query,
+            decoder,
+            job_started,
             target_language=target_lang.lower(),
-            rag_function=answer_question
+            rag_stream=iter_answer_question,
+            include_audio=audio_mode != "stream"
         )
         
         return VoiceResponse(
             query_text_native=result["query_text_native"],
             response_text_native=result["response_text_native"],
             audio_base64=result["audio_base64"],
-            sources=result.get("sources", [])
+            sources=result.get("sources", []),
+            timings=result.get("timings")
         )
     
+    except HTTPException:
+        raise
+
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Voice processing is at capacity, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+    except AudioTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    except AudioDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Voice processing error: {str(e)}"
         )
-    
+
     finally:
-        # Cleanup temp file
-        if temp_file and os.path.exists(temp_file.name):
-            os.unlink(temp_file.name)
+        # Rejected, invalid or cancelled before the job ran: nobody else will close it
+        if decoder is not None and not job_started.is_set():
+            decoder.close()
+
+
+@app.websocket("/ws/voice")
+async def voice_websocket(websocket: WebSocket):
+    """
+    Real-time voice: stream audio in while speaking, get partial transcripts,
+    then the answer as text + MP3 segments while it is generated.
+    See app/voice_stream.py for the message protocol.
+    """
+    await voice_session(websocket)
+
+
+@app.post("/tts")
+def text_to_speech(payload: TTSRequest):
+    """
+    Stream the spoken answer as audio/mpeg.
+
+    Sentences are synthesized in parallel and sent in order as each is ready,
+    so playback can start after the first sentence. Repeated sentences come
+    from the audio cache.
+    """
+    language = payload.language.lower()
+    if language not in LANGUAGE_CODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid language. Supported: {', '.join(LANGUAGE_CODES)}"
+        )
+    if not payload.text.strip():
+        raise HTTPException(status_code=400, detail="Text is empty")
 
+    # Sync generator: Starlette iterates it on the threadpool
+    audio = get_synthesizer().iter_audio(payload.text, LANGUAGE_CODES[language]["gtts"])
+    return StreamingResponse(audio, media_type="audio/mpeg")
@@ -0,0 +1,224 @@
+"""
+Lightweight latency metrics in the Prometheus text format.
+
+- span("stage") times a block: the duration goes into the
+  stage_duration_seconds histogram and into the current request's timings
+  (sent back as a Server-Timing header; streamed NDJSON routes also put
+  them in their final event, since their headers go out before the work)
+- gauges are read from callbacks at scrape time (in-flight requests,
+  voice queue depth, batcher queues)
+- /metrics renders everything
+
+With METRICS_ENABLED=false, span() returns a shared no-op context manager
+and nothing is recorded.
+"""
+
+import contextvars
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# --- CONFIG ---
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_NOOP = nullcontext()
+
+# Per-request stage timings; set by the HTTP middleware
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """{stage: seconds} for one request; spans in worker threads add to it concurrently."""
+
+    def __init__(self):
+        self._seconds = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._seconds)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}      # labels -> [bucket_counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: (list(s[0]), s[1], s[2]) for labels, s in self._series.items()}
+
+        for labels, (counts, total, count) in sorted(snapshot.items()):
+            base = _labels(self.label_names, labels)
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, le=_number(bound))} {bucket_count}')
+            lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, le="+Inf")} {count}')
+            lines.append(f"{self.name}_sum{base} {total:.6f}")
+            lines.append(f"{self.name}_count{base} {count}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose value(s) come from a callback at scrape time."""
+
+    def __init__(self, name: str, help_text: str, callback, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback      # () -> number, or {labels_tuple: number}
+        self.label_names = tuple(label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.callback()
+        except Exception:
+            return lines
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class InFlight:
+    """Thread-safe counter for a gauge (e.g. requests being served)."""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.value += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.value -= 1
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(names, values, **extra) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+# -----------------------------
+# REGISTRY
+# -----------------------------
+STAGE_SECONDS = Histogram(
+    "stage_duration_seconds", "Time spent in each pipeline stage.", ("stage",)
+)
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response body is complete.",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = InFlight()
+
+_registry = [STAGE_SECONDS, REQUEST_SECONDS]
+_registry_lock = threading.Lock()
+
+
+def register_gauge(name: str, help_text: str, callback, label_names=()):
+    """Add a scrape-time gauge to /metrics."""
+    with _registry_lock:
+        _registry.append(Gauge(name, help_text, callback, label_names))
+
+
+register_gauge("http_requests_in_flight", "HTTP requests currently being served.", lambda: HTTP_IN_FLIGHT.value)
+
+
+def render_metrics() -> str:
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -----------------------------
+# SPANS
+# -----------------------------
+def observe(stage: str, seconds: float):
+    """Record an already-measured stage duration."""
+    if not METRICS_ENABLED:
+        return
+    STAGE_SECONDS.observe(seconds, stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def _timed(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+
+def span(stage: str):
+    """Time a block as `stage` (no-op when metrics are disabled)."""
+    if not METRICS_ENABLED:
+        return _NOOP
+    return _timed(stage)
+
+
+def start_request():
+    """Begin collecting stage timings for the current request context."""
+    if not METRICS_ENABLED:
+        return None
+    timings = RequestTimings()
+    _request_timings.set(timings)
+    return timings
+
+
+def request_timings():
+    """The current request's {stage: seconds} so far (rounded), or None outside a request."""
+    timings = _request_timings.get()
+    if timings is None:
+        return None
+    return {stage: round(seconds, 3) for stage, seconds in timings.snapshot().items()}
+
+
+def server_timing_header(timings: RequestTimings, total_seconds: float) -> str:
+    """Server-Timing value: one entry per stage plus the total, in milliseconds."""
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.snapshot().items()]
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
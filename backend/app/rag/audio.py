@@ -0,0 +1,349 @@
+"""
+In-memory audio decoding for voice uploads.
+
+Voice uploads are parsed straight from the request stream
+(read_voice_upload): the audio part is piped into ffmpeg as it arrives, with
+a running byte cap, and comes out as a 16 kHz mono float32 array, which
+Whisper's transcribe() accepts directly. Nothing is buffered by Starlette's
+form parser, and only MP4 / M4A uploads (which may keep their index at the
+end) go through a temp file. ffmpeg is told to stop just past the duration
+cap, so an over-long recording is rejected without decoding all of it.
+
+trim_silence() is a small energy-based VAD that cuts the leading and
+trailing silence browser recorders leave around the speech; Whisper's
+cost grows with clip length, so that silence is not free.
+"""
+
+import asyncio
+import os
+import subprocess
+import tempfile
+import threading
+
+import numpy as np
+
+# --- CONFIG ---
+SAMPLE_RATE = 16000     # what Whisper expects
+MAX_UPLOAD_BYTES = int(float(os.getenv("VOICE_MAX_UPLOAD_MB", "10")) * 1024 * 1024)
+MAX_AUDIO_SECONDS = float(os.getenv("VOICE_MAX_SECONDS", "60"))
+READ_CHUNK_BYTES = 1 << 16
+FFMPEG_TIMEOUT_SECONDS = 30
+MP4_SNIFF_BYTES = 12    # enough for the size + "ftyp" box header
+
+VAD_ENABLED = os.getenv("VOICE_VAD", "true").lower() == "true"
+VAD_FRAME_MS = 30
+VAD_PADDING_MS = 250            # kept around detected speech so word edges are not clipped
+VAD_MIN_SPEECH_DBFS = -50.0     # frames quieter than this are never speech
+VAD_NOISE_MARGIN_DB = 12.0      # speech must be this far above the estimated noise floor
+
+
+class AudioTooLargeError(Exception):
+    """Upload exceeds the byte or duration cap (HTTP 413)."""
+
+
+class AudioDecodeError(Exception):
+    """ffmpeg could not decode the upload (HTTP 400)."""
+
+
+class StreamDecoder:
+    """
+    Incremental ffmpeg decode of one recording.
+
+    Encoded bytes are written to ffmpeg's stdin as they arrive (feed) while
+    a reader thread collects the 16-bit PCM it emits, so every byte is
+    decoded exactly once however often samples() is called. low_latency
+    skips ffmpeg's input probing so PCM starts flowing after the first
+    chunk of a live stream (the container must be self-describing, e.g.
+    webm).
+
+    MP4 / M4A (an "ftyp" box up front) can keep its index (the moov atom)
+    at the end of the file, as Safari / iOS recordings do, which ffmpeg
+    cannot read from a pipe. Those uploads are spooled to a temp file and
+    decoded from it in finish().
+    """
+
+    def __init__(self, max_seconds: float = MAX_AUDIO_SECONDS, sample_rate: int = SAMPLE_RATE, low_latency: bool = False):
+        self.max_samples = int(max_seconds * sample_rate)
+        self.max_seconds = max_seconds
+
+        self._cmd = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-threads", "0"]
+        if low_latency:
+            self._cmd += ["-probesize", "32", "-analyzeduration", "0"]
+        self._output = [
+            # Decode slightly past the cap so "too long" is distinguishable from "exactly max"
+            "-t", str(max_seconds + 0.5),
+            "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate),
+            "pipe:1",
+        ]
+
+        self._process = None
+        self._spool = None      # temp file for MP4 / M4A uploads
+        self._head = b""        # first bytes, held until the container is known
+        self._pcm = bytearray()
+        self._stderr = bytearray()
+        self._lock = threading.Lock()
+        self._readers = []
+
+        self.bytes_in = 0
+
+    def _start(self, source: str):
+        stdin = subprocess.PIPE if source == "pipe:0" else subprocess.DEVNULL
+        try:
+            self._process = subprocess.Popen(
+                self._cmd + ["-i", source] + self._output,
+                stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            raise RuntimeError("ffmpeg not found on PATH")
+
+        self._readers = [
+            threading.Thread(target=self._drain, args=(self._process.stdout, self._pcm), daemon=True),
+            # stderr is drained too, so a chatty ffmpeg can never block on a full pipe
+            threading.Thread(target=self._drain, args=(self._process.stderr, self._stderr), daemon=True),
+        ]
+        for reader in self._readers:
+            reader.start()
+
+    def _drain(self, pipe, sink: bytearray):
+        while True:
+            chunk = pipe.read1(READ_CHUNK_BYTES)
+            if not chunk:
+                return
+            with self._lock:
+                sink.extend(chunk)
+
+    def _open(self, final: bool = False):
+        """Pick pipe or temp file once the container header is in (or the input ended)."""
+        if len(self._head) < MP4_SNIFF_BYTES and not final:
+            return False
+        head, self._head = self._head, b""
+        if head[4:8] == b"ftyp":
+            self._spool = tempfile.NamedTemporaryFile(prefix="voice-", suffix=".mp4", delete=False)
+            self._spool.write(head)
+        else:
+            self._start("pipe:0")
+            self._write(head)
+        return True
+
+    def _write(self, data: bytes):
+        if not data or self._process.poll() is not None:
+            return      # ffmpeg already stopped (duration cap or bad input); finish() reports it
+        try:
+            self._process.stdin.write(data)
+            self._process.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            pass
+
+    def feed(self, data: bytes):
+        """Write encoded bytes to ffmpeg (blocks while its input pipe is full)."""
+        self.bytes_in += len(data)
+        if self._spool is not None:
+            self._spool.write(data)
+        elif self._process is not None:
+            self._write(data)
+        else:
+            self._head += data
+            self._open()
+
+    @property
+    def decoded_samples(self) -> int:
+        with self._lock:
+            return len(self._pcm) // 2
+
+    def check_duration(self, n_samples: int = None):
+        """Raise AudioTooLargeError once the decoded audio is past the duration cap."""
+        if (self.decoded_samples if n_samples is None else n_samples) > self.max_samples:
+            raise AudioTooLargeError(f"Audio is longer than {self.max_seconds:g} seconds")
+
+    def samples(self, start: int = 0):
+        """float32 samples decoded so far, from sample offset start."""
+        with self._lock:
+            end = len(self._pcm) // 2
+            data = bytes(self._pcm[2 * start:2 * end])
+        self.check_duration(end)
+        return np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+
+    def finish(self, timeout: float = FFMPEG_TIMEOUT_SECONDS):
+        """Close the input, wait for ffmpeg to flush, and return every sample."""
+        if self._process is None and self._spool is None:
+            self._open(final=True)
+        if self._spool is not None:
+            self._spool.close()
+            self._start(self._spool.name)
+        else:
+            try:
+                self._process.stdin.close()
+            except BrokenPipeError:
+                pass
+        try:
+            returncode = self._process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.close()
+            raise AudioDecodeError("Timed out decoding audio")
+        for reader in self._readers:
+            reader.join()
+
+        if returncode != 0 or not self._pcm:
+            detail = self._stderr.decode("utf-8", "replace").strip().splitlines()
+            raise AudioDecodeError(f"Could not decode audio: {detail[-1] if detail else 'no audio stream'}")
+        return self.samples()
+
+    def close(self):
+        """Stop ffmpeg (no-op once it has exited) and remove the temp file, if any."""
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        if self._spool is not None:
+            self._spool.close()
+            try:
+                os.unlink(self._spool.name)
+            except FileNotFoundError:
+                pass
+
+
+def decode_audio(data: bytes, max_seconds: float = MAX_AUDIO_SECONDS, sample_rate: int = SAMPLE_RATE):
+    """
+    Decode any ffmpeg-readable container (webm, ogg, wav, mp3, ...) from
+    memory into a mono float32 array in [-1, 1] at sample_rate.
+    """
+    if not data:
+        raise AudioDecodeError("Empty audio upload")
+
+    decoder = StreamDecoder(max_seconds, sample_rate)
+    try:
+        decoder.feed(data)
+        return decoder.finish()
+    finally:
+        decoder.close()
+
+
+async def read_voice_upload(request, file_field: str = "file", max_bytes: int = MAX_UPLOAD_BYTES,
+                            max_field_bytes: int = 1024):
+    """
+    Parse a multipart/form-data voice upload from request.stream().
+
+    The file part is fed to a StreamDecoder chunk by chunk while the body is
+    still arriving; the upload fails as soon as it passes max_bytes or the
+    decoded audio passes the duration cap, including chunked uploads without
+    a Content-Length. Returns ({field: value}, decoder); the caller owns the
+    decoder (finish() it, and close() it when done).
+    """
+    try:
+        from python_multipart import MultipartParser
+        from python_multipart.exceptions import FormParserError
+        from python_multipart.multipart import parse_options_header
+    except ModuleNotFoundError:
+        from multipart import MultipartParser
+        from multipart.exceptions import FormParserError
+        from multipart.multipart import parse_options_header
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise AudioDecodeError("Expected a multipart/form-data upload")
+
+    fields = {}
+    state = {"header": b"", "headers": {}, "name": None, "data": bytearray()}
+    pending = []        # audio bytes parsed from the current network chunk
+
+    def on_header_field(data, start, end):
+        state["header"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        key = state["header"].lower()
+        state["headers"][key] = state["headers"].get(key, b"") + data[start:end]
+
+    def on_header_end():
+        state["header"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        state["name"] = disposition.get(b"name", b"").decode("utf-8", "replace")
+        state["headers"] = {}
+
+    def on_part_data(data, start, end):
+        if state["name"] == file_field:
+            pending.append(bytes(data[start:end]))
+        else:
+            state["data"] += data[start:end]
+            if len(state["data"]) > max_field_bytes:
+                raise AudioDecodeError(f"Form field '{state['name']}' is too large")
+
+    def on_part_end():
+        if state["name"] != file_field:
+            fields[state["name"]] = state["data"].decode("utf-8", "replace")
+        state["name"], state["data"] = None, bytearray()
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    decoder = StreamDecoder()
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for data in pending:
+                if decoder.bytes_in + len(data) > max_bytes:
+                    raise AudioTooLargeError(f"Audio upload exceeds {max_bytes // (1024 * 1024)} MB")
+                await asyncio.to_thread(decoder.feed, data)
+            pending.clear()
+            decoder.check_duration()
+        parser.finalize()
+    except FormParserError:
+        decoder.close()
+        raise AudioDecodeError("Invalid multipart upload")
+    except BaseException:
+        decoder.close()
+        raise
+
+    if not decoder.bytes_in:
+        decoder.close()
+        raise AudioDecodeError("Empty audio upload")
+    return fields, decoder
+
+
+def _speech_frames(samples, sample_rate: int, frame_ms: int):
+    """(frame_length, indices of frames that look like speech) for a float32 clip."""
+    frame = int(sample_rate * frame_ms / 1000)
+    n_frames = len(samples) // frame
+    if n_frames < 2:
+        return frame, None
+
+    frames = samples[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    level_db = 20 * np.log10(np.maximum(rms, 1e-10))
+
+    noise_floor = np.percentile(level_db, 10)
+    threshold = max(VAD_MIN_SPEECH_DBFS, noise_floor + VAD_NOISE_MARGIN_DB)
+    return frame, np.flatnonzero(level_db > threshold)
+
+
+def trim_silence(samples, sample_rate: int = SAMPLE_RATE, frame_ms: int = VAD_FRAME_MS, padding_ms: int = VAD_PADDING_MS):
+    """
+    Cut leading / trailing non-speech from a float32 clip.
+
+    A frame counts as speech when its RMS level is above both an absolute
+    floor and the clip's noise floor (10th percentile frame level) plus a
+    margin. Returns the clip unchanged if no speech frame is found, so
+    Whisper still gets to decide on quiet recordings.
+    """
+    frame, speech = _speech_frames(samples, sample_rate, frame_ms)
+    if speech is None or not len(speech):
+        return samples
+
+    padding = int(sample_rate * padding_ms / 1000)
+    start = max(0, speech[0] * frame - padding)
+    end = min(len(samples), (speech[-1] + 1) * frame + padding)
+    return samples[start:end]
+
+
+def trailing_silence(samples, sample_rate: int = SAMPLE_RATE, frame_ms: int = VAD_FRAME_MS):
+    """Seconds of non-speech after the last speech frame, or None if no speech yet."""
+    frame, speech = _speech_frames(samples, sample_rate, frame_ms)
+    if speech is None or not len(speech):
+        return None
+    return (len(samples) - (speech[-1] + 1) * frame) / sample_rate
@@ -0,0 +1,100 @@
+"""
+Dynamic micro-batching for concurrent requests.
+
+Callers submit one item at a time from their own request threads. A single
+background thread collects whatever arrives within max_wait_ms (up to
+max_batch_size items), runs one batched call, and hands each caller its own
+result. Used by the retrieval engine so concurrent /ask requests share one
+encoder forward pass and one multi-query Chroma search.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Batches single-item calls into process_batch(list_of_items) -> list_of_results.
+
+    process_batch must return one result per item, in order. If it raises,
+    every caller in that batch gets the exception.
+    """
+
+    def __init__(self, process_batch, max_batch_size: int = 32, max_wait_ms: float = 2.0, name: str = "batcher"):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        """Submit one item and block until its batch has been processed."""
+        return self.submit(item).result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+
+            self.batches += 1
+            self.items += len(items)
+            self.largest_batch = max(self.largest_batch, len(items))
+
+            try:
+                results = self.process_batch(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "queued": self._queue.qsize(),
+        }
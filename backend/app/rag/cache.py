@@ -0,0 +1,169 @@
+"""
+Semantic answer cache for the RAG pipeline.
+
+Answers are keyed on the query embedding: a new question whose cosine
+similarity to a cached question is above the threshold is served from the
+cache instead of running retrieval + the Groq call again.
+
+- LRU eviction with a size cap
+- TTL expiry
+- Invalidated automatically whenever the collection is re-ingested
+  (ingest.py touches the marker file via mark_collection_updated())
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from app.rag.engine import DB_PATH
+
+# --- CONFIG ---
+INGEST_MARKER = DB_PATH / ".ingest_version"
+
+
+def mark_collection_updated(marker_path: Path = INGEST_MARKER):
+    """Record that the collection changed so running API workers drop their caches."""
+    marker_path.parent.mkdir(parents=True, exist_ok=True)
+    marker_path.write_text(str(time.time_ns()), encoding="utf-8")
+
+
+def _marker_version(marker_path: Path):
+    try:
+        return marker_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class SemanticCache:
+    """
+    Thread-safe embedding-keyed answer cache.
+
+    Entries are only compared against entries with the same scope (e.g. top_k),
+    so a hit never returns an answer built from a different retrieval setup.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        max_entries: int = 512,
+        ttl_seconds: float = 3600,
+        marker_path: Path = INGEST_MARKER,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.marker_path = marker_path
+
+        self._entries = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self._version = _marker_version(marker_path)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self):
+        """Drop everything if the collection was re-ingested since the last check."""
+        version = _marker_version(self.marker_path)
+        if version != self._version:
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+            self._version = version
+
+    def _expire(self, now: float):
+        expired = [
+            key for key, entry in self._entries.items()
+            if now - entry["created"] > self.ttl_seconds
+        ]
+        for key in expired:
+            del self._entries[key]
+            self.evictions += 1
+
+    def get(self, embedding, scope=None):
+        """
+        Look up a cached (answer, sources) pair for a query embedding.
+        Returns None on a miss.
+        """
+        query = self._normalize(embedding)
+        now = time.time()
+
+        with self._lock:
+            self._check_version()
+            self._expire(now)
+
+            keys = [key for key, entry in self._entries.items() if entry["scope"] == scope]
+            if keys:
+                matrix = np.stack([self._entries[key]["embedding"] for key in keys])
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+
+                if scores[best] >= self.threshold:
+                    key = keys[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    entry = self._entries[key]
+                    return entry["answer"], entry["sources"]
+
+            self.misses += 1
+            return None
+
+    def put(self, embedding, answer, sources, scope=None):
+        """Store an answer, evicting the least recently used entry when full."""
+        with self._lock:
+            self._check_version()
+
+            self._entries[self._next_key] = {
+                "embedding": self._normalize(embedding),
+                "answer": answer,
+                "sources": sources,
+                "scope": scope,
+                "created": time.time(),
+            }
+            self._next_key += 1
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# --- SHARED INSTANCE ---
+CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+
+answer_cache = SemanticCache(
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+    max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "512")),
+    ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600")),
+)
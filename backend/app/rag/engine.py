@@ -0,0 +1,352 @@
+"""
+Shared retrieval engine.
+
+One lazily initialized object per process owns the Chroma client, the
+collection and the sentence-transformer encoder. glue.py and query.py both
+go through get_engine() so the model and the DB handle are loaded once.
+"""
+
+import os
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from app.rag.batcher import MicroBatcher
+from app.rag.filters import build_where, filters_key
+from app.rag.lexical import LexicalIndex, INDEX_PATH
+from app.rag.flat_index import (
+    FLAT_INDEX_DIR, FLAT_INDEX_PRECISION, FLAT_INDEX_RESCORE, MANIFEST_FILE, load_flat_index,
+)
+
+# --- CONFIG ---
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+DB_PATH = Path(os.getenv("CYBERCRIME_DB_PATH", PROJECT_ROOT / "cyber_crime_db"))   # override for benchmarks / multiple deployments
+COLLECTION_NAME = "cybercrime_rag"
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# "chroma" (HNSW) or "flat" (exact NumPy search over the mmap'd export in flat_index.py)
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "chroma").lower()
+
+QUERY_BATCHING = os.getenv("QUERY_BATCHING", "true").lower() == "true"
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+QUERY_BATCH_MAX_WAIT_MS = float(os.getenv("QUERY_BATCH_MAX_WAIT_MS", "2"))
+
+RESULT_FIELDS = ("ids", "documents", "metadatas", "distances", "embeddings")
+SEARCH_INCLUDE = ["documents", "metadatas", "distances"]
+
+
+def _result_row(results, row: int, n_results: int):
+    """Slice one query's top-n out of a multi-query Chroma result, keeping the list-of-lists shape."""
+    single = {}
+    for field in RESULT_FIELDS:
+        values = results.get(field)
+        single[field] = [values[row][:n_results]] if values is not None else None
+    return single
+
+
+class RetrievalEngine:
+    """
+    Owns the Chroma client, collection and embedding model.
+
+    Nothing is loaded until the first call that needs it (or an explicit
+    load()), and loading happens once even under concurrent first requests.
+    """
+
+    def __init__(
+        self,
+        db_path: Path = DB_PATH,
+        collection_name: str = COLLECTION_NAME,
+        model_name: str = EMBEDDING_MODEL,
+        lexical_path: Path = INDEX_PATH,
+        backend: str = RETRIEVAL_BACKEND,
+        flat_index_dir: Path = FLAT_INDEX_DIR,
+        flat_precision: str = FLAT_INDEX_PRECISION,
+        flat_rescore: int = FLAT_INDEX_RESCORE,
+        batching: bool = QUERY_BATCHING,
+        max_batch_size: int = QUERY_BATCH_MAX_SIZE,
+        max_wait_ms: float = QUERY_BATCH_MAX_WAIT_MS,
+    ):
+        self.db_path = db_path
+        self.collection_name = collection_name
+        self.model_name = model_name
+        self.lexical_path = lexical_path
+
+        self._lexical = None
+        self._lexical_mtime = None
+        self._lexical_lock = threading.Lock()
+
+        self.backend = backend
+        self.flat_index_dir = flat_index_dir
+        self.flat_precision = flat_precision
+        self.flat_rescore = flat_rescore
+        self._flat = None
+        self._flat_key = None
+        self._flat_lock = threading.Lock()
+        self._flat_missing_warned = False
+
+        # Concurrent single-query callers are coalesced into one encoder pass
+        # and one multi-query Chroma search
+        self._embed_batcher = None
+        self._search_batcher = None
+        if batching:
+            self._embed_batcher = MicroBatcher(
+                self.embed, max_batch_size, max_wait_ms, name="embed-batcher"
+            )
+            self._search_batcher = MicroBatcher(
+                self._search_batch, max_batch_size, max_wait_ms, name="search-batcher"
+            )
+
+        self._client = None
+        self._collection = None
+        self._embedding_fn = None
+        self._lock = threading.Lock()
+
+        self.state = "not_loaded"   # not_loaded -> loading -> ready | error
+        self.error = None
+        self.load_seconds = None
+
+    def load(self):
+        """Open the DB and load the encoder (no-op once ready)."""
+        if self.state == "ready":
+            return self
+
+        with self._lock:
+            if self.state == "ready":
+                return self
+
+            self.state = "loading"
+            self.error = None
+            started = time.perf_counter()
+
+            try:
+                # Imported here so API workers start without paying for chromadb/torch
+                import chromadb
+                from chromadb.utils import embedding_functions
+
+                print(f"🔎 Loading retrieval engine ({self.model_name})...")
+                self._client = chromadb.PersistentClient(path=str(self.db_path))
+                self._embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
+                    model_name=self.model_name
+                )
+                self._collection = self._client.get_collection(
+                    name=self.collection_name,
+                    embedding_function=self._embedding_fn
+                )
+            except Exception as e:
+                self.state = "error"
+                self.error = str(e)
+                raise
+
+            self.load_seconds = round(time.perf_counter() - started, 3)
+            self.state = "ready"
+            print(f"✅ Retrieval engine ready in {self.load_seconds}s")
+
+        return self
+
+    def warm_up(self):
+        """Load everything and run one encode so the first real query is fast."""
+        self.load()
+        self._embedding_fn(["warm up"])
+        return self
+
+    @property
+    def collection(self):
+        return self.load()._collection
+
+    @property
+    def embedding_fn(self):
+        return self.load()._embedding_fn
+
+    def embed(self, texts):
+        """Embed a list of texts with the collection's model."""
+        return self.embedding_fn(list(texts))
+
+    def query(self, query_embeddings, n_results: int = 5, include=None, where=None):
+        """Nearest-neighbour search for one or more query embeddings."""
+        kwargs = {}
+        if include is not None:
+            kwargs["include"] = include
+        if where:
+            kwargs["where"] = where
+
+        return self.collection.query(
+            query_embeddings=list(query_embeddings),
+            n_results=n_results,
+            **kwargs
+        )
+
+    def embed_query(self, text: str):
+        """Embed one query, batched with concurrent callers when batching is on."""
+        if self._embed_batcher:
+            return self._embed_batcher(text)
+        return self.embed([text])[0]
+
+    def search(self, query_embedding, n_results: int = 5, filters=None, with_embeddings: bool = False):
+        """
+        Top-n search for one query embedding, batched with concurrent callers.
+        filters (see filters.make_filters) are pushed down as a Chroma `where`.
+        with_embeddings also returns the hits' stored vectors (for MMR).
+        Returns a Chroma-shaped result with a single row.
+        """
+        item = (query_embedding, n_results, filters, with_embeddings)
+        if self._search_batcher:
+            return self._search_batcher(item)
+        return self._search_batch([item])[0]
+
+    def search_many(self, query_embeddings, n_results: int = 5, filters=None, with_embeddings: bool = False):
+        """
+        Top-n search for many query embeddings in one multi-query call
+        (bulk callers that already hold every query). Returns one
+        single-row Chroma-shaped result per embedding.
+        """
+        return self._search_batch([
+            (embedding, n_results, filters, with_embeddings) for embedding in query_embeddings
+        ])
+
+    def _search_batch(self, items):
+        """
+        One multi-query search per distinct filter set, at the largest
+        requested n, sliced per caller. Embeddings are included for the
+        whole group if any caller in it asked for them.
+        """
+        groups = {}
+        for row, (_, _, filters, _) in enumerate(items):
+            groups.setdefault(filters_key(filters), []).append(row)
+
+        output = [None] * len(items)
+        flat = self.flat_index() if self.backend == "flat" else None
+
+        for rows in groups.values():
+            filters = items[rows[0]][2]
+            embeddings = [items[row][0] for row in rows]
+            max_results = max(items[row][1] for row in rows)
+            with_embeddings = any(items[row][3] for row in rows)
+
+            if flat is not None:
+                results = self._flat_query(flat, embeddings, max_results, filters, with_embeddings)
+            else:
+                include = SEARCH_INCLUDE + ["embeddings"] if with_embeddings else SEARCH_INCLUDE
+                results = self.query(embeddings, n_results=max_results, include=include, where=build_where(filters))
+
+            for position, row in enumerate(rows):
+                output[row] = _result_row(results, position, items[row][1])
+        return output
+
+    def _flat_query(self, flat, embeddings, n_results, filters, with_embeddings: bool = False):
+        """Exact search on the flat index, shaped like a multi-query Chroma result."""
+        hits = flat.search_many(embeddings, n_results, filters)
+
+        unique_ids = list(dict.fromkeys(record_id for row in hits for record_id, _ in row))
+        documents = {item["id"]: item for item in self.get_documents(unique_ids, with_embeddings)}
+
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if with_embeddings:
+            results["embeddings"] = []
+        for row in hits:
+            row = [(record_id, score) for record_id, score in row if record_id in documents]
+            results["ids"].append([record_id for record_id, _ in row])
+            results["documents"].append([documents[record_id]["document"] for record_id, _ in row])
+            results["metadatas"].append([documents[record_id]["metadata"] for record_id, _ in row])
+            # Squared L2 between unit vectors, i.e. what Chroma's default space reports
+            results["distances"].append([2.0 - 2.0 * score for _, score in row])
+            if with_embeddings:
+                results["embeddings"].append([documents[record_id]["embedding"] for record_id, _ in row])
+        return results
+
+    def flat_index(self):
+        """
+        The memory-mapped flat index, or None if it has not been exported.
+        Reloaded automatically when a re-ingest swaps in a new export or the
+        precision / rescore settings change.
+        """
+        try:
+            mtime = (self.flat_index_dir / MANIFEST_FILE).stat().st_mtime_ns
+        except FileNotFoundError:
+            if not self._flat_missing_warned:
+                print("⚠️ Flat index not exported yet; falling back to Chroma search")
+                self._flat_missing_warned = True
+            return None
+
+        key = (mtime, self.flat_precision, self.flat_rescore)
+        if key != self._flat_key:
+            with self._flat_lock:
+                if key != self._flat_key:
+                    self._flat = load_flat_index(self.flat_index_dir, self.flat_precision, self.flat_rescore)
+                    self._flat_key = key
+        return self._flat
+
+    def get_documents(self, ids, with_embeddings: bool = False):
+        """
+        Fetch records by id, returned in the order of ids (missing ids skipped).
+        with_embeddings adds each record's stored vector as "embedding".
+        """
+        if not ids:
+            return []
+        include = ["documents", "metadatas", "embeddings"] if with_embeddings else ["documents", "metadatas"]
+        found = self.collection.get(ids=list(ids), include=include)
+        by_id = {}
+        for i, record_id in enumerate(found["ids"]):
+            by_id[record_id] = {"id": record_id, "document": found["documents"][i], "metadata": found["metadatas"][i]}
+            if with_embeddings:
+                by_id[record_id]["embedding"] = found["embeddings"][i]
+        return [by_id[record_id] for record_id in ids if record_id in by_id]
+
+    def lexical_index(self):
+        """
+        The persisted BM25 index, or None if ingest has not built one yet.
+        Reloaded automatically when a re-ingest rewrites the file.
+        """
+        try:
+            mtime = self.lexical_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+        if mtime != self._lexical_mtime:
+            with self._lexical_lock:
+                if mtime != self._lexical_mtime:
+                    self._lexical = LexicalIndex.load(self.lexical_path)
+                    self._lexical_mtime = mtime
+        return self._lexical
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def health(self) -> dict:
+        """Load state without triggering a load."""
+        info = {
+            "state": self.state,
+            "backend": self.backend,
+            "model": self.model_name,
+            "collection": self.collection_name,
+            "load_seconds": self.load_seconds,
+        }
+        if self.error:
+            info["error"] = self.error
+        if self.ready:
+            try:
+                info["documents"] = self._collection.count()
+            except Exception as e:
+                info["error"] = str(e)
+        if self._lexical is not None:
+            info["lexical_documents"] = len(self._lexical)
+        if self._flat is not None:
+            info["flat_index"] = {
+                "documents": len(self._flat),
+                "precision": self._flat.precision,
+                "rescore": self._flat.rescore,
+                "bytes": self._flat.nbytes,
+            }
+        if self._embed_batcher:
+            info["batching"] = {
+                "embed": self._embed_batcher.stats(),
+                "search": self._search_batcher.stats(),
+            }
+        return info
+
+
+@lru_cache(maxsize=1)
+def get_engine() -> RetrievalEngine:
+    """Process-wide retrieval engine (created on first use, loaded lazily)."""
+    return RetrievalEngine()
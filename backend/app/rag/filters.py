@@ -0,0 +1,82 @@
+"""
+Metadata filters for retrieval.
+
+Filters map onto the flat metadata written by ingest.py (category,
+location, seriousness_level, year) and are pushed down into the Chroma
+query as a `where` clause, so only the matching subset is searched.
+The same filters can be checked in Python for lexical-index hits.
+"""
+
+import json
+
+
+def make_filters(category=None, year_from=None, year_to=None, location=None, severity=None):
+    """
+    Collect the filters that are set. Returns None when no filter is given.
+
+    category may be a single category or a list of categories.
+    """
+    filters = {}
+    if category:
+        filters["category"] = list(category) if isinstance(category, (list, tuple)) else [category]
+    if year_from is not None:
+        filters["year_from"] = int(year_from)
+    if year_to is not None:
+        filters["year_to"] = int(year_to)
+    if location:
+        filters["location"] = location
+    if severity:
+        filters["severity"] = severity
+    return filters or None
+
+
+def build_where(filters):
+    """Translate filters into a Chroma `where` clause (None if unfiltered)."""
+    if not filters:
+        return None
+
+    conditions = []
+    categories = filters.get("category")
+    if categories:
+        conditions.append(
+            {"category": categories[0]} if len(categories) == 1
+            else {"category": {"$in": categories}}
+        )
+    if "year_from" in filters:
+        conditions.append({"year": {"$gte": filters["year_from"]}})
+    if "year_to" in filters:
+        conditions.append({"year": {"$lte": filters["year_to"]}})
+    if "location" in filters:
+        conditions.append({"location": filters["location"]})
+    if "severity" in filters:
+        conditions.append({"seriousness_level": filters["severity"]})
+
+    if not conditions:
+        return None
+    # Chroma requires $and to have at least two operands
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def matches_filters(metadata: dict, filters) -> bool:
+    """Python-side equivalent of build_where, for records fetched by id."""
+    if not filters:
+        return True
+
+    metadata = metadata or {}
+    if "category" in filters and metadata.get("category") not in filters["category"]:
+        return False
+    year = metadata.get("year")
+    if "year_from" in filters and (year is None or year < filters["year_from"]):
+        return False
+    if "year_to" in filters and (year is None or year > filters["year_to"]):
+        return False
+    if "location" in filters and metadata.get("location") != filters["location"]:
+        return False
+    if "severity" in filters and metadata.get("seriousness_level") != filters["severity"]:
+        return False
+    return True
+
+
+def filters_key(filters) -> str:
+    """Stable hashable form of filters (cache scopes, batch grouping)."""
+    return json.dumps(filters, sort_keys=True) if filters else ""
@@ -0,0 +1,373 @@
+"""
+In-process exact search over memory-mapped embeddings.
+
+An alternative retrieval backend to Chroma's HNSW + SQLite. The collection's
+embeddings are exported (normalized) to a contiguous float32 .npy file that
+is opened with mmap, so every uvicorn worker on the host shares one
+page-cached copy. Top-k is a vectorized dot product + argpartition.
+
+Layout of cyber_crime_db/flat_index/:
+- embeddings.f32.npy   N x D float32, L2-normalized rows
+- embeddings.f16.npy   float16 copy (half the memory)
+- embeddings.i8.npy    int8 copy with a per-vector scale in scales.f32.npy
+                       (a quarter of the memory)
+- records.json         ids + the metadata fields used by filters
+- manifest.json        written last; its mtime tells readers to reload
+
+The quantized copies can be searched directly; with rescoring, the top
+candidates are re-ranked with exact float32 scores read from the f32 file.
+
+Export from an existing DB:  python -m app.rag.flat_index
+Memory / recall report:      python -m app.rag.flat_index --report
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.rag.filters import filters_key
+
+# --- CONFIG ---
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+FLAT_INDEX_DIR = Path(os.getenv("CYBERCRIME_DB_PATH", PROJECT_ROOT / "cyber_crime_db")) / "flat_index"
+EMBEDDINGS_FILE = "embeddings.f32.npy"
+EMBEDDING_FILES = {
+    "float32": EMBEDDINGS_FILE,
+    "float16": "embeddings.f16.npy",
+    "int8": "embeddings.i8.npy",
+}
+INT8_SCALES_FILE = "scales.f32.npy"
+RECORDS_FILE = "records.json"
+MANIFEST_FILE = "manifest.json"
+
+FILTER_FIELDS = ("category", "year", "location", "seriousness_level")
+MASK_CACHE_SIZE = 32
+SCORE_CHUNK_ROWS = 65536   # rows dequantized + scored at a time
+
+# Storage precision used for search, and how many candidates per result are
+# re-ranked with exact float32 scores (0 disables rescoring)
+FLAT_INDEX_PRECISION = os.getenv("FLAT_INDEX_PRECISION", "float32").lower()
+FLAT_INDEX_RESCORE = int(os.getenv("FLAT_INDEX_RESCORE", "4"))
+
+
+def _write_quantized(index_dir: Path, chunk_rows: int = SCORE_CHUNK_ROWS):
+    """Write float16 and int8 (+ per-vector scale) copies of the float32 matrix."""
+    source = np.load(index_dir / EMBEDDINGS_FILE, mmap_mode="r")
+    count, dim = source.shape
+
+    half = np.lib.format.open_memmap(
+        index_dir / EMBEDDING_FILES["float16"], mode="w+", dtype=np.float16, shape=(count, dim)
+    )
+    int8 = np.lib.format.open_memmap(
+        index_dir / EMBEDDING_FILES["int8"], mode="w+", dtype=np.int8, shape=(count, dim)
+    )
+    scales = np.lib.format.open_memmap(
+        index_dir / INT8_SCALES_FILE, mode="w+", dtype=np.float32, shape=(count,)
+    )
+
+    for start in range(0, count, chunk_rows):
+        block = np.asarray(source[start:start + chunk_rows])
+        half[start:start + len(block)] = block.astype(np.float16)
+
+        block_scales = np.abs(block).max(axis=1) / 127.0
+        block_scales[block_scales == 0] = 1.0
+        int8[start:start + len(block)] = np.round(block / block_scales[:, None]).astype(np.int8)
+        scales[start:start + len(block)] = block_scales
+
+    for matrix in (half, int8, scales):
+        matrix.flush()
+
+
+def _truncate_rows(path: Path, rows: int, chunk_rows: int = SCORE_CHUNK_ROWS):
+    """Rewrite a 2-D .npy keeping only its first rows (chunked, never all in RAM)."""
+    source = np.load(path, mmap_mode="r")
+    tmp_path = path.with_suffix(".truncated.npy")
+    target = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=source.dtype, shape=(rows, source.shape[1]))
+    for start in range(0, rows, chunk_rows):
+        target[start:min(rows, start + chunk_rows)] = source[start:min(rows, start + chunk_rows)]
+    target.flush()
+    del source, target
+    tmp_path.replace(path)
+
+
+def export_flat_index(collection, index_dir: Path = FLAT_INDEX_DIR, page_size: int = 1000):
+    """
+    Export every embedding in the collection to index_dir.
+
+    Rows are written page by page into a memory-mapped .npy, so the export
+    never holds the whole matrix in RAM. The new index is built in a
+    sibling directory and swapped in when complete. The matrix is sized
+    from collection.count(); if the collection changes during the export,
+    rows past that count are skipped and a short matrix is truncated, so
+    every row has an id.
+    """
+    count = collection.count()
+    tmp_dir = index_dir.with_name(index_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    records = {"ids": [], **{field: [] for field in FILTER_FIELDS}}
+    matrix = None
+    offset = 0
+
+    while offset < count:
+        page = collection.get(include=["embeddings", "metadatas"], limit=min(page_size, count - offset), offset=offset)
+        if not page["ids"]:
+            break
+        # Never more rows than the matrix holds, even if the collection grew
+        page_ids = page["ids"][:count - offset]
+        page_metadatas = page["metadatas"][:len(page_ids)]
+
+        vectors = np.asarray(page["embeddings"][:len(page_ids)], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+
+        if matrix is None:
+            matrix = np.lib.format.open_memmap(
+                tmp_dir / EMBEDDINGS_FILE, mode="w+", dtype=np.float32,
+                shape=(count, vectors.shape[1])
+            )
+        matrix[offset:offset + len(vectors)] = vectors
+
+        records["ids"].extend(page_ids)
+        for meta in page_metadatas:
+            meta = meta or {}
+            for field in FILTER_FIELDS:
+                records[field].append(meta.get(field))
+
+        offset += len(page_ids)
+
+    if matrix is None:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return None
+
+    matrix.flush()
+    dim = matrix.shape[1]
+    del matrix
+    if offset < count:
+        # The collection shrank during the export: drop the unwritten rows
+        _truncate_rows(tmp_dir / EMBEDDINGS_FILE, offset)
+    rows = np.load(tmp_dir / EMBEDDINGS_FILE, mmap_mode="r").shape[0]
+    assert len(records["ids"]) == rows, f"{len(records['ids'])} ids for {rows} rows"
+    _write_quantized(tmp_dir)
+
+    (tmp_dir / RECORDS_FILE).write_text(json.dumps(records), encoding="utf-8")
+    (tmp_dir / MANIFEST_FILE).write_text(
+        json.dumps({"count": offset, "dim": dim, "precisions": list(EMBEDDING_FILES)}),
+        encoding="utf-8"
+    )
+
+    # Swap in the new index (readers holding the old mmap keep their open file)
+    old_dir = index_dir.with_name(index_dir.name + ".old")
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if index_dir.exists():
+        index_dir.rename(old_dir)
+    tmp_dir.rename(index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    return offset
+
+
+class FlatIndex:
+    """
+    Exact cosine top-k over a memory-mapped, normalized embedding matrix.
+
+    precision selects the stored copy that is scanned ("float32", "float16"
+    or "int8"). For quantized copies, rescore > 0 re-ranks the top
+    k * rescore candidates with exact float32 scores.
+    """
+
+    def __init__(self, index_dir: Path = FLAT_INDEX_DIR, precision: str = "float32", rescore: int = 0):
+        if precision not in EMBEDDING_FILES:
+            raise ValueError(f"Unknown precision '{precision}'. Use one of: {', '.join(EMBEDDING_FILES)}")
+
+        self.index_dir = index_dir
+        self.precision = precision
+        self.rescore = rescore if precision != "float32" else 0
+
+        self.embeddings = np.load(index_dir / EMBEDDING_FILES[precision], mmap_mode="r")
+        self.scales = (
+            np.load(index_dir / INT8_SCALES_FILE, mmap_mode="r") if precision == "int8" else None
+        )
+        # Exact vectors are only touched for the rescored candidates
+        self.exact = (
+            np.load(index_dir / EMBEDDINGS_FILE, mmap_mode="r") if self.rescore else None
+        )
+
+        records = json.loads((index_dir / RECORDS_FILE).read_text(encoding="utf-8"))
+        self.ids = records["ids"]
+        self._fields = {
+            field: np.asarray(records[field], dtype=object)
+            for field in FILTER_FIELDS if field != "year"
+        }
+        self._fields["year"] = np.asarray(
+            [value if value is not None else 0 for value in records["year"]], dtype=np.int64
+        )
+        self._year_known = np.asarray([value is not None for value in records["year"]])
+        self._mask_cache = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of the scanned matrix (plus int8 scales)."""
+        total = self.embeddings.nbytes
+        if self.scales is not None:
+            total += self.scales.nbytes
+        return int(total)
+
+    def _mask(self, filters):
+        """Boolean row mask for filters (cached per distinct filter set)."""
+        key = filters_key(filters)
+        mask = self._mask_cache.get(key)
+        if mask is not None:
+            return mask
+
+        mask = np.ones(len(self.ids), dtype=bool)
+        if "category" in filters:
+            mask &= np.isin(self._fields["category"], filters["category"])
+        if "year_from" in filters:
+            mask &= self._year_known & (self._fields["year"] >= filters["year_from"])
+        if "year_to" in filters:
+            mask &= self._year_known & (self._fields["year"] <= filters["year_to"])
+        if "location" in filters:
+            mask &= self._fields["location"] == filters["location"]
+        if "severity" in filters:
+            mask &= self._fields["seriousness_level"] == filters["severity"]
+
+        if len(self._mask_cache) >= MASK_CACHE_SIZE:
+            self._mask_cache.pop(next(iter(self._mask_cache)))
+        self._mask_cache[key] = mask
+        return mask
+
+    def _scores(self, rows, queries):
+        """
+        Cosine scores (rows x queries) for the selected rows, computed in
+        chunks so quantized rows are only dequantized a block at a time.
+        """
+        n_rows = len(self.ids) if rows is None else len(rows)
+        scores = np.empty((n_rows, len(queries)), dtype=np.float32)
+
+        for start in range(0, n_rows, SCORE_CHUNK_ROWS):
+            stop = min(n_rows, start + SCORE_CHUNK_ROWS)
+            selection = slice(start, stop) if rows is None else rows[start:stop]
+
+            block = self.embeddings[selection]
+            if self.precision != "float32":
+                block = block.astype(np.float32)
+
+            scores[start:stop] = block @ queries.T
+            if self.scales is not None:
+                scores[start:stop] *= self.scales[selection][:, None]
+
+        return scores
+
+    def search_many(self, query_embeddings, k: int, filters=None):
+        """
+        Top-k for several query embeddings at once.
+        Returns one [(record_id, cosine_score), ...] list per query, best first.
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        rows = np.flatnonzero(self._mask(filters)) if filters else None
+        n_candidates = len(self.ids) if rows is None else len(rows)
+        if n_candidates == 0:
+            return [[] for _ in range(len(queries))]
+
+        scores = self._scores(rows, queries)
+        k = min(k, n_candidates)
+        n_first_pass = min(n_candidates, k * self.rescore) if self.rescore else k
+
+        output = []
+        for column in range(scores.shape[1]):
+            column_scores = scores[:, column]
+            top = np.argpartition(-column_scores, n_first_pass - 1)[:n_first_pass]
+            positions = top if rows is None else rows[top]
+            top_scores = column_scores[top]
+
+            if self.rescore:
+                # Exact float32 scores for the shortlisted rows only (sorted reads)
+                order = np.argsort(positions)
+                exact_scores = np.empty(len(positions), dtype=np.float32)
+                exact_scores[order] = self.exact[positions[order]] @ queries[column]
+                top_scores = exact_scores
+
+            best = np.argsort(-top_scores)[:k]
+            output.append([
+                (self.ids[positions[index]], float(top_scores[index]))
+                for index in best
+            ])
+        return output
+
+
+def load_flat_index(index_dir: Path = FLAT_INDEX_DIR, precision: str = FLAT_INDEX_PRECISION, rescore: int = FLAT_INDEX_RESCORE):
+    """FlatIndex for index_dir, or None if it has not been exported."""
+    if not (index_dir / MANIFEST_FILE).exists():
+        return None
+    return FlatIndex(index_dir, precision=precision, rescore=rescore)
+
+
+def quantization_report(index_dir: Path = FLAT_INDEX_DIR, k: int = 5, n_queries: int = 200, seed: int = 0):
+    """
+    Memory and recall@k of each precision / rescoring setting against the
+    float32 baseline. Queries are sampled corpus vectors with a little noise,
+    so they land near (not exactly on) real cases.
+    """
+    baseline = FlatIndex(index_dir, "float32")
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(baseline), size=min(n_queries, len(baseline)), replace=False)
+    queries = np.asarray(baseline.embeddings[np.sort(sample)], dtype=np.float32)
+    queries += rng.normal(scale=0.02, size=queries.shape).astype(np.float32)
+
+    expected = [{record_id for record_id, _ in row} for row in baseline.search_many(queries, k)]
+
+    rows = []
+    settings = [("float32", 0), ("float16", 0), ("float16", 4), ("int8", 0), ("int8", 4)]
+    for precision, rescore in settings:
+        index = FlatIndex(index_dir, precision, rescore)
+        started = time.perf_counter()
+        results = index.search_many(queries, k)
+        elapsed = time.perf_counter() - started
+
+        recall = np.mean([
+            len(expected_ids & {record_id for record_id, _ in row}) / len(expected_ids)
+            for expected_ids, row in zip(expected, results) if expected_ids
+        ])
+        rows.append({
+            "precision": precision,
+            "rescore": rescore,
+            "bytes": index.nbytes,
+            "saved": 1 - index.nbytes / baseline.nbytes,
+            f"recall@{k}": float(recall),
+            "ms_per_query": 1000 * elapsed / len(queries),
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or inspect the flat embedding index")
+    parser.add_argument("--report", action="store_true", help="Print memory / recall@k per precision")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.report:
+        print(f"{'precision':<10}{'rescore':>8}{'MB':>10}{'saved':>8}{f'recall@{args.k}':>11}{'ms/query':>10}")
+        for row in quantization_report(k=args.k, n_queries=args.queries):
+            print(
+                f"{row['precision']:<10}{row['rescore']:>8}{row['bytes'] / 1e6:>10.2f}"
+                f"{row['saved']:>8.0%}{row[f'recall@{args.k}']:>11.3f}{row['ms_per_query']:>10.3f}"
+            )
+    else:
+        from app.rag.engine import get_engine
+
+        exported = export_flat_index(get_engine().collection)
+        print(f"Exported {exported or 0} embeddings to {FLAT_INDEX_DIR}")
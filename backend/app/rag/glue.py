@@ -1,47 +1,271 @@
-import chromadb
-from pathlib import Path
-from chromadb.utils import embedding_functions
-from app.rag.llm import generate_answer
+import asyncio
+import os
+import time
+from app.metrics import span, observe
+from app.rag.llm import (
+    generate_answer, build_messages, stream_answer, iter_answer, complete_answer,
+    retrieval_only_answer, NOT_CONFIGURED_MESSAGE,
+)
+from app.rag.llm_client import LLMUnavailableError
+from app.rag.cache import answer_cache, CACHE_ENABLED
+from app.rag.engine import get_engine
+from app.rag.filters import filters_key
+from app.rag.query import retrieve_documents, retrieve_many, needs_embedding
+from app.rag.ratelimit import groq_limiter
 
-# --- CONFIG ---
-PROJECT_ROOT = Path(__file__).resolve().parents[3]
-DB_PATH = PROJECT_ROOT / "cyber_crime_db"
-COLLECTION_NAME = "cybercrime_rag"
 
-# --- INIT ONCE ---
-client = chromadb.PersistentClient(path=str(DB_PATH))
+NO_RESULTS_MESSAGE = "No relevant cases found for this query."
+INTERRUPTED_MESSAGE = "\n\n⚠️ The answer was interrupted. Please try again shortly."
+BATCH_CONCURRENCY = int(os.getenv("ASK_BATCH_CONCURRENCY", "4"))   # LLM calls in flight per batch
 
-embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name="all-MiniLM-L6-v2"
-)
 
-collection = client.get_collection(
-    name=COLLECTION_NAME,
-    embedding_function=embedding_fn
-)
+def embed_query(question: str):
+    """Embed a single query with the shared engine's embedding model."""
+    with span("embed"):
+        return get_engine().embed_query(question)
 
 
-def answer_question(question: str, n_results: int = 5):
+def _fallback_text(answer_parts, retrieved_docs) -> str:
+    """What to send when the LLM fails mid-answer: the retrieval-only answer, or a note if text was already sent."""
+    if answer_parts:
+        return INTERRUPTED_MESSAGE
+    return retrieval_only_answer(retrieved_docs)[0]
+
+
+def answer_question(question: str, n_results: int = 5, filters=None):
     """
     Full RAG pipeline:
-    1. Retrieve relevant documents
-    2. Generate answer using LLM
+    1. Check the semantic cache for a near-identical question
+    2. Retrieve relevant documents
+    3. Generate answer using LLM
+
+    Statute lookups served by the lexical index skip embedding (and so the cache).
+    filters (see filters.make_filters) restrict retrieval to matching cases.
+    If the LLM is unavailable (circuit open, retries exhausted) the answer
+    is built from the retrieved cases alone and not cached.
     """
-    results = collection.query(
-        query_texts=[question],
-        n_results=n_results
-    )
+    query_embedding = embed_query(question) if needs_embedding(question) else None
+    use_cache = CACHE_ENABLED and query_embedding is not None
+    cache_scope = (n_results, filters_key(filters))
 
-    if not results or not results["ids"] or not results["ids"][0]:
-        return "No relevant cases found for this query.", []
+    if use_cache:
+        with span("cache_lookup"):
+            cached = answer_cache.get(query_embedding, scope=cache_scope)
+        if cached:
+            return cached
 
-    retrieved_docs = []
+    with span("retrieve"):
+        retrieved_docs = retrieve_documents(question, n_results, query_embedding, filters)
 
-    for i in range(len(results["ids"][0])):
-        retrieved_docs.append({
-            "document": results["documents"][0][i],
-            "metadata": results["metadatas"][0][i],
-        })
+    if not retrieved_docs:
+        return NO_RESULTS_MESSAGE, []
+
+    try:
+        with span("llm"):
+            answer, case_summaries = generate_answer(question, retrieved_docs)
+    except LLMUnavailableError as e:
+        print(f"⚠️ {e}; answering from retrieval only")
+        return retrieval_only_answer(retrieved_docs)
+
+    if use_cache and answer and answer != NOT_CONFIGURED_MESSAGE:
+        answer_cache.put(query_embedding, answer, case_summaries, scope=cache_scope)
 
-    answer, case_summaries = generate_answer(question, retrieved_docs)
     return answer, case_summaries
+
+
+async def stream_answer_question(question: str, n_results: int = 5, filters=None):
+    """
+    Streaming RAG pipeline.
+
+    Yields events in order:
+    - {"type": "sources", "sources": [...]}   (before generation starts)
+    - {"type": "token", "content": "..."}     (one per LLM delta)
+    - {"type": "done"}
+
+    A semantic cache hit is sent as a single token event, and so is the
+    retrieval-only answer when the LLM is unavailable (llm_client.py).
+    """
+    # Chroma and the embedding model are synchronous; keep them off the event loop
+    query_embedding = None
+    if needs_embedding(question):
+        query_embedding = await asyncio.to_thread(embed_query, question)
+    use_cache = CACHE_ENABLED and query_embedding is not None
+    cache_scope = (n_results, filters_key(filters))
+
+    if use_cache:
+        with span("cache_lookup"):
+            cached = answer_cache.get(query_embedding, scope=cache_scope)
+        if cached:
+            answer, case_summaries = cached
+            yield {"type": "sources", "sources": case_summaries}
+            yield {"type": "token", "content": answer}
+            yield {"type": "done"}
+            return
+
+    with span("retrieve"):
+        retrieved_docs = await asyncio.to_thread(
+            retrieve_documents, question, n_results, query_embedding, filters
+        )
+
+    if not retrieved_docs:
+        yield {"type": "sources", "sources": []}
+        yield {"type": "token", "content": NO_RESULTS_MESSAGE}
+        yield {"type": "done"}
+        return
+
+    messages, case_summaries = build_messages(question, retrieved_docs)
+    yield {"type": "sources", "sources": case_summaries}
+
+    answer_parts = []
+    started = time.perf_counter()
+    try:
+        async for delta in stream_answer(messages):
+            if not answer_parts:
+                observe("llm_first_token", time.perf_counter() - started)
+            answer_parts.append(delta)
+            yield {"type": "token", "content": delta}
+    except LLMUnavailableError as e:
+        print(f"⚠️ {e}; answering from retrieval only")
+        yield {"type": "token", "content": _fallback_text(answer_parts, retrieved_docs)}
+        yield {"type": "done"}
+        return
+    observe("llm", time.perf_counter() - started)
+
+    answer = "".join(answer_parts)
+    if use_cache and answer and answer != NOT_CONFIGURED_MESSAGE:
+        answer_cache.put(query_embedding, answer, case_summaries, scope=cache_scope)
+
+    yield {"type": "done"}
+
+
+def iter_answer_question(question: str, n_results: int = 5, filters=None):
+    """
+    Blocking variant of stream_answer_question, yielding the same events.
+    Used from worker threads (the pipelined voice path) where there is no
+    event loop to drive the async client.
+    """
+    query_embedding = embed_query(question) if needs_embedding(question) else None
+    use_cache = CACHE_ENABLED and query_embedding is not None
+    cache_scope = (n_results, filters_key(filters))
+
+    if use_cache:
+        with span("cache_lookup"):
+            cached = answer_cache.get(query_embedding, scope=cache_scope)
+        if cached:
+            answer, case_summaries = cached
+            yield {"type": "sources", "sources": case_summaries}
+            yield {"type": "token", "content": answer}
+            yield {"type": "done"}
+            return
+
+    with span("retrieve"):
+        retrieved_docs = retrieve_documents(question, n_results, query_embedding, filters)
+
+    if not retrieved_docs:
+        yield {"type": "sources", "sources": []}
+        yield {"type": "token", "content": NO_RESULTS_MESSAGE}
+        yield {"type": "done"}
+        return
+
+    messages, case_summaries = build_messages(question, retrieved_docs)
+    yield {"type": "sources", "sources": case_summaries}
+
+    answer_parts = []
+    started = time.perf_counter()
+    try:
+        for delta in iter_answer(messages):
+            if not answer_parts:
+                observe("llm_first_token", time.perf_counter() - started)
+            answer_parts.append(delta)
+            yield {"type": "token", "content": delta}
+    except LLMUnavailableError as e:
+        print(f"⚠️ {e}; answering from retrieval only")
+        yield {"type": "token", "content": _fallback_text(answer_parts, retrieved_docs)}
+        yield {"type": "done"}
+        return
+    observe("llm", time.perf_counter() - started)
+
+    answer = "".join(answer_parts)
+    if use_cache and answer and answer != NOT_CONFIGURED_MESSAGE:
+        answer_cache.put(query_embedding, answer, case_summaries, scope=cache_scope)
+
+    yield {"type": "done"}
+
+
+async def answer_questions(questions, n_results: int = 5, filters=None, concurrency: int = BATCH_CONCURRENCY):
+    """
+    Bulk RAG pipeline (/ask/batch).
+
+    1. Every question is embedded in one encoder pass; semantic cache hits
+       are yielded straight away
+    2. The rest are retrieved with one multi-query vector search
+    3. Answers are generated concurrently: at most `concurrency` calls in
+       flight, and within the shared Groq quota (ratelimit.groq_limiter)
+
+    Yields one event per question as it completes, in completion order:
+    {"type": "result", "index": i, "answer": "...", "sources": [...]}
+    or {"type": "error", "index": i, "detail": "..."}.
+    """
+    questions = list(questions)
+    cache_scope = (n_results, filters_key(filters))
+
+    embeddings = [None] * len(questions)
+    to_embed = [i for i, question in enumerate(questions) if needs_embedding(question)]
+    if to_embed:
+        with span("embed"):
+            vectors = await asyncio.to_thread(get_engine().embed, [questions[i] for i in to_embed])
+        for i, vector in zip(to_embed, vectors):
+            embeddings[i] = vector
+
+    pending = []
+    for i in range(len(questions)):
+        if CACHE_ENABLED and embeddings[i] is not None:
+            with span("cache_lookup"):
+                cached = answer_cache.get(embeddings[i], scope=cache_scope)
+            if cached:
+                answer, case_summaries = cached
+                yield {"type": "result", "index": i, "answer": answer, "sources": case_summaries}
+                continue
+        pending.append(i)
+
+    if not pending:
+        return
+
+    with span("retrieve"):
+        retrieved = await asyncio.to_thread(
+            retrieve_many, [questions[i] for i in pending], n_results, [embeddings[i] for i in pending], filters
+        )
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def generate(i, retrieved_docs):
+        try:
+            messages, case_summaries = build_messages(questions[i], retrieved_docs)
+            async with semaphore:
+                started = time.perf_counter()
+                answer = await complete_answer(messages, limiter=groq_limiter)
+                observe("llm", time.perf_counter() - started)
+        except LLMUnavailableError:
+            answer, case_summaries = retrieval_only_answer(retrieved_docs)
+            return {"type": "result", "index": i, "answer": answer, "sources": case_summaries, "degraded": True}
+        except Exception as e:
+            return {"type": "error", "index": i, "detail": str(e)}
+
+        if CACHE_ENABLED and embeddings[i] is not None and answer and answer != NOT_CONFIGURED_MESSAGE:
+            answer_cache.put(embeddings[i], answer, case_summaries, scope=cache_scope)
+        return {"type": "result", "index": i, "answer": answer, "sources": case_summaries}
+
+    tasks = []
+    for i, retrieved_docs in zip(pending, retrieved):
+        if not retrieved_docs:
+            yield {"type": "result", "index": i, "answer": NO_RESULTS_MESSAGE, "sources": []}
+            continue
+        tasks.append(asyncio.ensure_future(generate(i, retrieved_docs)))
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The client went away or the consumer stopped early
+        for task in tasks:
+            task.cancel()
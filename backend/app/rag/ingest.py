@@ -1,144 +1,311 @@
+import argparse
+import hashlib
 import json
+import time
 import chromadb
 import os
 import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from chromadb.utils import embedding_functions
 from pathlib import Path
 
 # --- CONFIGURATION ---
 PROJECT_ROOT = Path(__file__).resolve().parents[3]
 filename=PROJECT_ROOT / "data" / "cases.json"
-db_path = PROJECT_ROOT / "cyber_crime_db"
+BATCH_SIZE = 256          # records embedded + written per batch
+EMBED_WORKERS = 2         # batches embedded in parallel while the next one is parsed
 
-def ingest_cases():
-    print("--- STEP 1: STARTING ---")
+# Allow running as a script (python backend/app/rag/ingest.py) as well as a module
+if str(PROJECT_ROOT / "backend") not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT / "backend"))
 
-    # 1. Check if file exists
-    if not os.path.exists(filename):
-        print(f" ERROR: The file '{filename}' was not found.")
-        sys.exit()
+from app.rag.cache import mark_collection_updated
+from app.rag.engine import DB_PATH, COLLECTION_NAME, EMBEDDING_MODEL
+from app.rag.json_stream import CaseFileError, iter_cases
+from app.rag.lexical import build_index_from_collection, INDEX_PATH as LEXICAL_INDEX_PATH
+from app.rag.flat_index import export_flat_index, FLAT_INDEX_DIR
 
-    # 2. Load JSON
-    try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        print("JSON loaded successfully.")
-    except Exception as e:
-        print(f" ERROR reading JSON file: {e}")
-        sys.exit()
+db_path = DB_PATH
 
-    # --- FIX: FLATTEN THE DATA ---
-    # Your JSON groups cases by keys (e.g., "account_hacking_cases", "cyber_bullying_cases").
-    # We must gather them into a single list to ingest them.
-    all_cases = []
-
-    if isinstance(data, dict):
-        for category, cases_list in data.items():
-            if isinstance(cases_list, list):
-                print(f" - Found {len(cases_list)} cases in category: {category}")
-                all_cases.extend(cases_list)
-    elif isinstance(data, list):
-        all_cases = data
-    else:
-        print("Error: JSON structure not recognized (expected dict or list).")
-        sys.exit()
 
-    print(f"Total records to process: {len(all_cases)}")
+def build_record(item):
+    """
+    Turn one raw case from cases.json into (record_id, composite_text, metadata).
 
-    # 3. Initialize ChromaDB
-    print("Initializing ChromaDB...")
-    client = chromadb.PersistentClient(path=str(db_path))
+    The metadata carries a content_hash of the text + metadata so incremental
+    ingests can skip records that did not change.
+    """
+    # Extract fields based on your specific JSON schema
+    record_id = item['ids'][0]
+    raw_meta = item['metadatas'][0]
+    incident_doc = item['documents'][0]
 
-    # 4. Setup Embedding Function
-    print("Setting up Embedding Function...")
-    default_ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"
+    # Prepare text for embedding (combine title, desc, laws, etc.)
+    laws_involved = raw_meta.get('laws_involved', [])
+    # Handle laws if it's a list of dicts or just a string
+    if isinstance(laws_involved, list):
+        laws_text = "; ".join([str(law.get('section', '')) for law in laws_involved if isinstance(law, dict)])
+    else:
+        laws_text = str(laws_involved)
+
+    composite_text = (
+        f"Incident: {raw_meta.get('title', 'Unknown')}\n"
+        f"Category: {raw_meta.get('category', 'Unknown')}\n"
+        f"Description: {incident_doc}\n"
+        f"Location: {raw_meta.get('location', 'Unknown')} ({raw_meta.get('year', 'Unknown')})\n"
+        f"Laws Involved: {laws_text}\n"
+        f"Severity: {raw_meta.get('seriousness_level', 'Unknown')}"
     )
 
-    # 5. Clean Slate 
-    print(" Preparing database...")
-    try:
-        # Delete old collection to prevent ID conflicts or stale data
-        client.delete_collection(name="cybercrime_rag")
-        print("   (Deleted old collection to ensure fresh data)")
-    except Exception:
-        print("   (No existing collection found, creating new one)")
+    # Prepare Metadata (ChromaDB requires flat simple types: str, int, float)
+    # Complex lists (like 'next_steps') must be converted to JSON strings.
+    clean_metadata = {
+        "title": raw_meta.get('title', ''),
+        "category": raw_meta.get('category', ''),
+        "subcategory": raw_meta.get('subcategory', ''),
+        "seriousness_level": raw_meta.get('seriousness_level', ''),
+        "location": raw_meta.get('location', 'Unknown'),
+        "year": int(raw_meta.get('year', 0)),
+        # Convert list to string for storage
+        "next_steps": json.dumps(raw_meta.get('next_steps_user_should_take', [])),
+        "laws": laws_text
+    }
+    clean_metadata["content_hash"] = content_hash(composite_text, clean_metadata)
 
-    collection = client.get_or_create_collection(
-        name="cybercrime_rag",
-        embedding_function=default_ef
+    return record_id, composite_text, clean_metadata
+
+
+def content_hash(document: str, metadata: dict) -> str:
+    """Stable hash of a record's embedded text and stored metadata."""
+    payload = json.dumps(
+        {"document": document, "metadata": metadata},
+        sort_keys=True,
+        ensure_ascii=False,
     )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def iter_record_batches(path, batch_size, stats):
+    """
+    Stream cases.json and yield {id: (composite_text, metadata)} batches.
 
-    # 6. Process Data
-    ids = []
-    documents = []
-    metadatas = []
+    Only one batch of built records is held at a time. Per-category,
+    skipped and duplicate counts are accumulated into stats. An id repeated
+    within a batch keeps its first occurrence, like ids repeated across
+    batches (see ingest_cases).
+    """
+    batch = {}
+    current_category = object()
 
-    print(" Processing records...")
+    for index, (category, item) in enumerate(iter_cases(path)):
+        if category != current_category:
+            current_category = category
+            if category is not None:
+                print(f" - Reading category: {category}")
+
+        stats["parsed"] += 1
 
-    for index, item in enumerate(all_cases):
         # Skip items that don't have the expected structure
         if not isinstance(item, dict) or not item.get('metadatas'):
             print(f"Skipping record {index}: Invalid format.")
+            stats["skipped"] += 1
             continue
 
         try:
-            # Extract fields based on your specific JSON schema
-            record_id = item['ids'][0]
-            raw_meta = item['metadatas'][0]
-            incident_doc = item['documents'][0]
-            
-            # Prepare text for embedding (combine title, desc, laws, etc.)
-            laws_involved = raw_meta.get('laws_involved', [])
-            # Handle laws if it's a list of dicts or just a string
-            if isinstance(laws_involved, list):
-                laws_text = "; ".join([str(law.get('section', '')) for law in laws_involved if isinstance(law, dict)])
-            else:
-                laws_text = str(laws_involved)
-
-            composite_text = (
-                f"Incident: {raw_meta.get('title', 'Unknown')}\n"
-                f"Category: {raw_meta.get('category', 'Unknown')}\n"
-                f"Description: {incident_doc}\n"
-                f"Location: {raw_meta.get('location', 'Unknown')} ({raw_meta.get('year', 'Unknown')})\n"
-                f"Laws Involved: {laws_text}\n"
-                f"Severity: {raw_meta.get('seriousness_level', 'Unknown')}"
-            )
-            
-            # Prepare Metadata (ChromaDB requires flat simple types: str, int, float)
-            # Complex lists (like 'next_steps') must be converted to JSON strings.
-            clean_metadata = {
-                "title": raw_meta.get('title', ''),
-                "category": raw_meta.get('category', ''),
-                "subcategory": raw_meta.get('subcategory', ''),
-                "seriousness_level": raw_meta.get('seriousness_level', ''),
-                "location": raw_meta.get('location', 'Unknown'),
-                "year": int(raw_meta.get('year', 0)),
-                # Convert list to string for storage
-                "next_steps": json.dumps(raw_meta.get('next_steps_user_should_take', [])),
-                "laws": laws_text
-            }
-
-            ids.append(record_id)
-            documents.append(composite_text)
-            metadatas.append(clean_metadata)
-
+            record_id, composite_text, clean_metadata = build_record(item)
         except KeyError as e:
             print(f" - Error in record {index}: Missing key {e}")
+            stats["skipped"] += 1
+            continue
         except Exception as e:
             print(f" - Unexpected error in record {index}: {e}")
+            stats["skipped"] += 1
+            continue
+
+        stats["categories"][category] = stats["categories"].get(category, 0) + 1
+
+        # Keyed by id: upsert rejects duplicate ids, so later copies are dropped
+        if record_id in batch:
+            stats["duplicates"] += 1
+            continue
+        batch[record_id] = (composite_text, clean_metadata)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = {}
+
+    if batch:
+        yield batch
+
+
+def stored_hashes(collection, ids):
+    """Map of id -> content_hash for the given ids that are already stored."""
+    existing = collection.get(ids=ids, include=["metadatas"])
+    return {
+        record_id: (meta or {}).get("content_hash")
+        for record_id, meta in zip(existing["ids"], existing["metadatas"])
+    }
+
+
+def iter_stored_ids(collection, page_size=BATCH_SIZE):
+    """Page through every id in the collection without loading documents."""
+    offset = 0
+    while True:
+        page = collection.get(include=[], limit=page_size, offset=offset)
+        if not page["ids"]:
+            return
+        yield from page["ids"]
+        offset += len(page["ids"])
+
+
+def ingest_cases(full_rebuild: bool = False, batch_size: int = BATCH_SIZE, workers: int = EMBED_WORKERS):
+    print("--- STEP 1: STARTING ---")
+
+    # 1. Check if file exists
+    if not os.path.exists(filename):
+        print(f" ERROR: The file '{filename}' was not found.")
+        sys.exit()
+
+    # 2. Initialize ChromaDB
+    print("Initializing ChromaDB...")
+    client = chromadb.PersistentClient(path=str(db_path))
 
-    # 7. Ingest into ChromaDB
-    if ids:
-        print(f"Adding {len(ids)} records to ChromaDB...")
-        collection.add(
+    # 3. Setup Embedding Function
+    print("Setting up Embedding Function...")
+    default_ef = embedding_functions.SentenceTransformerEmbeddingFunction(
+        model_name=EMBEDDING_MODEL
+    )
+
+    # 4. Prepare collection
+    print(" Preparing database...")
+    if full_rebuild:
+        try:
+            # Delete old collection to prevent ID conflicts or stale data
+            client.delete_collection(name=COLLECTION_NAME)
+            print("   (Deleted old collection to ensure fresh data)")
+        except Exception:
+            print("   (No existing collection found, creating new one)")
+
+    collection = client.get_or_create_collection(
+        name=COLLECTION_NAME,
+        embedding_function=default_ef
+    )
+
+    # 5. Stream records -> diff -> embed on the worker pool -> batched upsert
+    # Embedding of batch N runs on the pool while batch N+1 is parsed and diffed;
+    # at most `workers * 2` batches are in flight so memory stays bounded.
+    print(f" Streaming records (batch size {batch_size}, {workers} embedding workers)...")
+
+    stats = {"parsed": 0, "skipped": 0, "duplicates": 0, "categories": {}}
+    counts = {"added": 0, "updated": 0, "unchanged": 0, "written": 0}
+    seen_ids = set()
+    pending = deque()
+    started = time.perf_counter()
+
+    def write_oldest():
+        ids, documents, metadatas, future = pending.popleft()
+        collection.upsert(
             ids=ids,
             documents=documents,
-            metadatas=metadatas
+            metadatas=metadatas,
+            embeddings=future.result()
         )
-        print(f"--- SUCCESS: {len(ids)} records ingested successfully! ---")
-    else:
+        counts["written"] += len(ids)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for batch in iter_record_batches(filename, batch_size, stats):
+                # An id already seen in an earlier batch was diffed and written there
+                ids = [record_id for record_id in batch if record_id not in seen_ids]
+                stats["duplicates"] += len(batch) - len(ids)
+                seen_ids.update(ids)
+
+                existing = {} if full_rebuild else stored_hashes(collection, ids)
+                to_write = []
+                for record_id in ids:
+                    if record_id not in existing:
+                        counts["added"] += 1
+                        to_write.append(record_id)
+                    elif existing[record_id] != batch[record_id][1]["content_hash"]:
+                        counts["updated"] += 1
+                        to_write.append(record_id)
+                    else:
+                        counts["unchanged"] += 1
+
+                if to_write:
+                    documents = [batch[rid][0] for rid in to_write]
+                    metadatas = [batch[rid][1] for rid in to_write]
+                    future = pool.submit(default_ef, documents)
+                    pending.append((to_write, documents, metadatas, future))
+
+                while len(pending) >= workers * 2:
+                    write_oldest()
+
+                elapsed = time.perf_counter() - started
+                print(
+                    f"   {stats['parsed']} parsed, {counts['written']} written "
+                    f"({stats['parsed'] / elapsed:.0f} records/s)"
+                )
+
+            while pending:
+                write_oldest()
+
+    except CaseFileError as e:
+        print(f" ERROR reading JSON file: {e}")
+        sys.exit()
+
+    if not seen_ids:
         print("--- WARNING: No valid records found to ingest. ---")
+        return
+
+    for category, count in stats["categories"].items():
+        if category is not None:
+            print(f" - Found {count} cases in category: {category}")
+
+    # 6. Delete records that disappeared from cases.json
+    deleted = [] if full_rebuild else [
+        record_id for record_id in iter_stored_ids(collection)
+        if record_id not in seen_ids
+    ]
+    for start in range(0, len(deleted), batch_size):
+        collection.delete(ids=deleted[start:start + batch_size])
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Diff: {counts['added']} new, {counts['updated']} changed, "
+        f"{counts['unchanged']} unchanged, {len(deleted)} removed, "
+        f"{stats['skipped']} skipped, {stats['duplicates']} duplicate ids ignored"
+    )
+    print(f"Processed {stats['parsed']} records in {elapsed:.1f}s ({stats['parsed'] / elapsed:.0f} records/s)")
+
+    # 7. Rebuild the lexical (BM25) statute index next to the DB
+    lexical_path = Path(db_path) / LEXICAL_INDEX_PATH.name
+    if counts["written"] or deleted or full_rebuild or not lexical_path.exists():
+        lexical = build_index_from_collection(collection, lexical_path)
+        print(f"Lexical index rebuilt ({len(lexical)} records) -> {lexical_path.name}")
+
+    # 8. Re-export the memory-mapped embedding matrix used by the flat backend
+    flat_dir = Path(db_path) / FLAT_INDEX_DIR.name
+    if counts["written"] or deleted or full_rebuild or not flat_dir.exists():
+        exported = export_flat_index(collection, flat_dir)
+        print(f"Flat index exported ({exported or 0} vectors) -> {flat_dir.name}/")
+
+    if counts["written"] or deleted or full_rebuild:
+        # Running API workers drop their semantic answer caches on next lookup
+        mark_collection_updated()
+        print(f"--- SUCCESS: {counts['written']} records written, {len(deleted)} removed. ---")
+    else:
+        print("--- SUCCESS: Collection already up to date. ---")
+
 
 if __name__ == "__main__":
-    ingest_cases()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ingest data/cases.json into ChromaDB")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Drop and rebuild the whole collection instead of an incremental update"
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Records per embedding/write batch")
+    parser.add_argument("--workers", type=int, default=EMBED_WORKERS, help="Parallel embedding workers")
+    args = parser.parse_args()
+    ingest_cases(full_rebuild=args.full, batch_size=args.batch_size, workers=args.workers)
@@ -0,0 +1,145 @@
+"""
+Incremental reader for data/cases.json.
+
+Walks the top-level structure ({"category": [case, ...], ...} or a plain
+list of cases) and decodes one case at a time from a fixed-size read buffer,
+so memory use depends on the size of a single case, not the whole file.
+"""
+
+import json
+import re
+
+_WHITESPACE = re.compile(r"\s*")
+_DELIMITERS = set(" \t\r\n,:]}")
+_decoder = json.JSONDecoder()
+
+
+class CaseFileError(ValueError):
+    """cases.json is not valid JSON or not in a recognized layout."""
+
+
+class _BufferedJSONReader:
+    """Character buffer over a text file that refills on demand."""
+
+    def __init__(self, file_obj, chunk_size: int):
+        self.file_obj = file_obj
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+
+        chunk = self.file_obj.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+
+        # Drop the consumed prefix so the buffer never grows with the file
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character without consuming it ('' at EOF)."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found or 'EOF'}'")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+
+            # A number or literal cut at the buffer edge decodes early ("2." -> 2),
+            # so only accept a value once the character after it is visible
+            truncated = end == len(self.buffer) or self.buffer[end] not in _DELIMITERS
+            if truncated and self._fill():
+                continue
+
+            self.pos = end
+            return value
+
+
+def _iter_array(reader: _BufferedJSONReader):
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+
+    while True:
+        yield reader.value()
+
+        char = reader.peek()
+        reader.pos += 1
+        if char == "]":
+            return
+        if char != ",":
+            raise ValueError(f"Expected ',' or ']' in array but found '{char or 'EOF'}'")
+
+
+def iter_cases(path, chunk_size: int = 1 << 16):
+    """
+    Yield (category, case) pairs from cases.json one case at a time.
+
+    category is the top-level key for the grouped format and None when the
+    file is a plain list. Non-list category values are skipped. Parse errors
+    are raised as CaseFileError; errors in the consumer's own code never
+    pass through here.
+    """
+    try:
+        yield from _iter_cases(path, chunk_size)
+    except ValueError as e:     # json.JSONDecodeError, UnicodeDecodeError, layout errors
+        raise CaseFileError(str(e)) from e
+
+
+def _iter_cases(path, chunk_size: int):
+    with open(path, "r", encoding="utf-8") as f:
+        reader = _BufferedJSONReader(f, chunk_size)
+        first = reader.peek()
+
+        if first == "[":
+            for item in _iter_array(reader):
+                yield None, item
+            return
+
+        if first != "{":
+            raise ValueError("JSON structure not recognized (expected dict or list).")
+
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+
+        while True:
+            category = reader.value()
+            reader.expect(":")
+
+            if reader.peek() == "[":
+                for item in _iter_array(reader):
+                    yield category, item
+            else:
+                reader.value()
+
+            char = reader.peek()
+            reader.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' or '}}' in object but found '{char or 'EOF'}'")
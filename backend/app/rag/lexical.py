@@ -0,0 +1,215 @@
+"""
+Lexical (BM25) index over case laws, titles and categories.
+
+MiniLM embeddings are weak at exact statute references ("Section 66D IT
+Act", "IPC 420"). This index is built at ingest time, persisted next to the
+Chroma DB, and used two ways:
+- queries that are clearly section lookups are answered from it alone
+  (no embedding, no vector search), keeping only cases that cite that
+  section under the act the query named
+- all other queries fuse its ranking with the vector ranking (RRF)
+"""
+
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+
+# --- CONFIG ---
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+INDEX_PATH = Path(os.getenv("CYBERCRIME_DB_PATH", PROJECT_ROOT / "cyber_crime_db")) / "lexical_index.json"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+LAWS_WEIGHT = 2      # laws are repeated so statute matches outrank title words
+
+_TOKEN = re.compile(r"\d+[a-z]*|[a-z]+")
+_SECTION_NUMBER = re.compile(r"^\d{2,3}[a-z]?$")
+_ACT = r"ipc|bns|it\s*act|information\s+technology\s+act|indian\s+penal\s+code|bharatiya\s+nyaya\s+sanhita"
+# "section 66D", "sec. 420", "s. 66", "u/s 420", or an act followed by its section ("IPC 420", "IT Act 66D")
+_SECTION_REFERENCE = re.compile(
+    rf"\b(?:section|sec\.|s\.|u/s\.?|{_ACT})\s*(\d{{2,3}}[a-z]?)\b",
+    re.IGNORECASE,
+)
+_ACTS = {
+    "ipc": re.compile(r"\b(?:ipc|indian\s+penal\s+code)\b", re.IGNORECASE),
+    "bns": re.compile(r"\b(?:bns|bharatiya\s+nyaya\s+sanhita)\b", re.IGNORECASE),
+    "it": re.compile(r"\b(?:it\s*act|information\s+technology\s+act)\b", re.IGNORECASE),
+}
+_LAW_SEPARATOR = re.compile(r"[;\n]")
+_STOPWORDS = {"the", "of", "and", "a", "an", "in", "under", "is", "what", "section", "sec", "s", "u"}
+SECTION_LOOKUP_MAX_WORDS = 8
+
+
+def tokenize(text: str):
+    """Lowercase word / statute-number tokens ("Section 66D" -> ["66d"])."""
+    return [
+        token for token in _TOKEN.findall((text or "").lower().replace("_", " "))
+        if token not in _STOPWORDS
+    ]
+
+
+def section_numbers(text: str):
+    """Statute numbers mentioned in a query, e.g. {"66d", "420"}."""
+    return {token for token in tokenize(text) if _SECTION_NUMBER.match(token)}
+
+
+def section_references(query: str):
+    """Section numbers the query cites explicitly ("section 66C", "IPC 420"), lowercased."""
+    return {number.lower() for number in _SECTION_REFERENCE.findall(query or "")}
+
+
+def acts_mentioned(text: str):
+    """Acts named in text, as keys of _ACTS ({"ipc", "bns", "it"})."""
+    return {act for act, pattern in _ACTS.items() if pattern.search(text or "")}
+
+
+def is_section_lookup(query: str) -> bool:
+    """
+    True for short queries that cite a provision, like "Section 66D IT Act",
+    "IPC 420" or "what is sec. 66C". A bare number ("lost 500 rupees IT act")
+    is not a citation. Longer narratives go through hybrid search.
+    """
+    if len(query.split()) > SECTION_LOOKUP_MAX_WORDS:
+        return False
+    return bool(section_references(query))
+
+
+def cites_section(laws: str, numbers, acts) -> bool:
+    """
+    True if one entry of a case's laws ("Section 66D IT Act; IPC 420")
+    cites one of the section numbers under one of the acts (any act when
+    acts is empty), so "BNS 66" does not match a case citing IT Act 66.
+    """
+    for entry in _LAW_SEPARATOR.split(laws or ""):
+        if section_numbers(entry) & numbers and (not acts or acts_mentioned(entry) & acts):
+            return True
+    return False
+
+
+def index_text(metadata: dict) -> str:
+    """Text indexed for one case: laws (boosted), title and category."""
+    laws = metadata.get("laws", "") or ""
+    parts = [laws] * LAWS_WEIGHT + [
+        metadata.get("title", "") or "",
+        metadata.get("category", "") or "",
+        metadata.get("subcategory", "") or "",
+    ]
+    return " ".join(parts)
+
+
+class LexicalIndex:
+    """In-memory BM25 inverted index keyed by Chroma record id."""
+
+    def __init__(self, ids, doc_lengths, postings):
+        self.ids = ids
+        self.doc_lengths = doc_lengths
+        self.postings = postings    # term -> {doc_index: term_frequency}
+        self.avg_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, records):
+        """Build from an iterable of (record_id, metadata)."""
+        ids = []
+        doc_lengths = []
+        postings = {}
+
+        for record_id, metadata in records:
+            tokens = tokenize(index_text(metadata or {}))
+            doc_index = len(ids)
+            ids.append(record_id)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, {})[doc_index] = tf
+
+        return cls(ids, doc_lengths, postings)
+
+    def save(self, path: Path = INDEX_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "ids": self.ids,
+            "doc_lengths": self.doc_lengths,
+            "postings": {
+                term: [[doc, tf] for doc, tf in docs.items()]
+                for term, docs in self.postings.items()
+            },
+        }
+        # Write-then-rename so API workers never read a half-written index
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(payload), encoding="utf-8")
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path = INDEX_PATH):
+        payload = json.loads(path.read_text(encoding="utf-8"))
+        postings = {
+            term: {doc: tf for doc, tf in docs}
+            for term, docs in payload["postings"].items()
+        }
+        return cls(payload["ids"], payload["doc_lengths"], postings)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query: str, k: int = 5, required_terms=None):
+        """
+        BM25 top-k as [(record_id, score)].
+
+        With required_terms, only documents containing at least one of those
+        terms are returned (used to make section lookups exact).
+        """
+        n_docs = len(self.ids)
+        if not n_docs:
+            return []
+
+        allowed = None
+        if required_terms:
+            allowed = set()
+            for term in required_terms:
+                allowed.update(self.postings.get(term, {}))
+            if not allowed:
+                return []
+
+        scores = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc, tf in docs.items():
+                if allowed is not None and doc not in allowed:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc] / self.avg_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.ids[doc], score) for doc, score in top]
+
+
+def reciprocal_rank_fusion(rankings, k: int = RRF_K):
+    """Fuse ranked id lists: score(id) = sum(1 / (k + rank)). Returns ids best-first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, record_id in enumerate(ranking, 1):
+            scores[record_id] = scores.get(record_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def build_index_from_collection(collection, path: Path = INDEX_PATH, page_size: int = 1000):
+    """Rebuild and persist the index from what is stored in Chroma."""
+    def records():
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                return
+            yield from zip(page["ids"], page["metadatas"])
+            offset += len(page["ids"])
+
+    index = LexicalIndex.build(records())
+    index.save(path)
+    return index
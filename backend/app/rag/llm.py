@@ -1,11 +1,26 @@
 import os
 import re
-from groq import Groq
+from app.rag.llm_client import build_groq_clients, llm_guard
+from app.rag.prompt import (
+    PROMPT_TOKEN_BUDGET, build_system_prompt, estimate_tokens, fit_cases,
+)
 
 
-# Initialize Groq client
+# Initialize Groq clients (sync for /ask, async for streaming) on pooled
+# connections; every call goes through llm_guard (deadline, retries, breaker)
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-client = Groq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
+client, async_client = build_groq_clients(GROQ_API_KEY)
+
+MODEL_NAME = "llama-3.3-70b-versatile"
+TEMPERATURE = 0.6
+MAX_TOKENS = 1500
+PROMPT_DEBUG = os.getenv("PROMPT_DEBUG", "false").lower() == "true"    # log the prompt size of every request
+
+NOT_CONFIGURED_MESSAGE = "⚠️ GROQ_API_KEY not set."
+DEGRADED_NOTICE = (
+    "⚠️ The legal assistant is temporarily unavailable, so below are the most "
+    "similar cases on record for your question, without analysis. Please try again shortly."
+)
 
 def clean_title(title: str) -> str:
     if not title:
@@ -46,157 +61,7 @@ def clean_document_text(doc: str) -> str:
     return doc.strip()
 
 
-def generate_answer(question, retrieved_docs):
-    if not client:
-        return "⚠️ GROQ_API_KEY not set.", []
-
-    context = ""
-    case_summaries = []
-
-    for i, item in enumerate(retrieved_docs, 1):
-        meta = item["metadata"]
-        raw_doc = item["document"]
-        clean_doc = clean_document_text(raw_doc)
-
-        title = clean_title(meta.get("title", "Related Case"))
-
-        case_summaries.append({
-            "title": title,
-            "year": meta.get("year", "N/A"),
-            "summary": summarize_document(clean_doc),
-            "full_text": clean_doc
-        })
-
-        context += f"""
-Title: {title}
-Laws Involved: {meta.get('laws', 'N/A')}
-Description:
-{clean_doc}
-"""
-
-
-    system_prompt = """
-You are an expert Indian Cybercrime Legal Assistant AI. Your goal is to analyze a user's distress situation against a provided set of Retrieved Legal Context (Indian Penal Code, IT Act, BNS, or case precedents) and generate a structured, actionable, and legally grounded response.
-
-INPUT DATA:
-- User Query: The user's description of their incident.
-- Retrieved Context: A list of relevant legal sections, acts, and similar case precedents retrieved from the database.
-
-STRICT OUTPUT FORMATTING RULES:
-You must adhere effectively to the following structure. Do not include conversational filler before or after this structure. Use Markdown formatting.
-
-## 🚨 URGENT ACTION REQUIRED (ONLY for UPI/Financial Fraud)
-**IMPORTANT:** Display this section ONLY if the case specifically involves:
-- UPI fraud
-- Banking fraud
-- Unauthorized money transfer
-- Financial loss through digital payment fraud
-
-For these UPI/financial fraud cases ONLY:
-- Display this section FIRST with a prominent warning
-- Recommend calling **National Cyber Crime Helpline: 1930** immediately
-- Explain that quick action within the "golden hour" can help freeze fraudulent transactions
-
-**DO NOT include this section for other cybercrimes** like hacking, impersonation, stalking, defamation, identity theft without financial loss, etc.
-
-## 1. Case Overview
-Write a concise, 3-4 sentence summary of the user's situation.
-Highlight the specific nature of the cybercrime (e.g., Identity Theft, Impersonation, Cyber Stalking, UPI Fraud).
-
-## 2. Legal Analysis
-
-Create a Markdown table with two columns: "Relevant Section/Act" and "How it Applies to You".
-- Column 1 (Law): Cite the specific Act and Section.
-- Column 2 (Application): Explicitly map the law to the facts provided in the User Query. Do not just define the law; explain why the user's specific situation violates this law.
-- Constraint: Only cite laws present in the Retrieved Context or highly relevant general Indian Cyber laws known to you if context is sparse.
-
-**IMPORTANT - BNS FORMATTING RULE:**
-For any IPC (Indian Penal Code) sections, you MUST use the new Bharatiya Nyaya Sanhita (BNS) format. Use the mapping below:
-
-| BNS Section | Formerly IPC Section | Offence |
-|-------------|---------------------|---------|
-| BNS Section 319 | IPC Section 419 | Cheating by personation |
-| BNS Section 318 | IPC Section 420 | Cheating |
-| BNS Section 336 | IPC Section 468 | Forgery for purpose of cheating |
-| BNS Section 77 | IPC Section 354C | Voyeurism |
-| BNS Section 351 | IPC Section 503 | Criminal intimidation |
-| BNS Section 352 | IPC Section 507 | Anonymous criminal intimidation |
-| BNS Section 356 | IPC Section 499 | Defamation |
-
-**Required Format in Legal Analysis Table:**
-- Write as: **"BNS Section 319 (formerly IPC Section 419)"** NOT just "IPC Section 419"
-- Always show both the new BNS section and the old IPC section in parentheses
-- For IT Act sections, use normal format: "Section 66D of IT Act, 2000"
-
-
-## 3. Recommended Next Steps
-Provide a numbered list of immediate, practical actions the user must take (e.g., blocking, reporting to platform, temporarily deactivating accounts).
-
-**MANDATORY:** When recommending to file a complaint with the cybercrime portal, ALWAYS include the direct link:
-- **File Online Complaint:** [National Cyber Crime Reporting Portal](https://cybercrime.gov.in/)
-
-**For UPI/Financial fraud cases ONLY**, include:
-1. **URGENT: Call 1930** - National Cyber Crime Helpline (24x7) - Report immediately to freeze fraudulent transactions
-2. **File Online Complaint:** [https://cybercrime.gov.in/](https://cybercrime.gov.in/)
-
-**For all other cybercrimes** (hacking, stalking, impersonation, etc.), DO NOT include the 1930 helpline prominently - just list it in the Authorities section.
-
-**FOR SOCIAL MEDIA HARASSMENT / ILLICIT CONTENT / SENSITIVE VIDEOS:**
-If the case involves social media harassment, spread of nude/intimate/sensitive images or videos, impersonation on social platforms, or any abuse on social media:
-
-1. **FIRST** - Check if the user mentioned which platform (WhatsApp, Instagram, Facebook, etc.)
-2. **IF PLATFORM NOT MENTIONED** - Ask the user: "Which social media platform did this incident occur on? This will help me provide the specific grievance officer contact for faster resolution."
-3. **IF PLATFORM IS MENTIONED** - Provide the Grievance Officer contact from this list:
-
-**GRIEVANCE OFFICER CONTACTS:**
-| Platform | Officer Name | Email |
-|----------|-------------|-------|
-| WhatsApp | Siddhartha Nahar | grievance_officer_wa@support.whatsapp.com |
-| Facebook (Meta) | Meta India Team | fbgoindia@support.facebook.com |
-| Instagram | Meta India Team | support@instagram.com |
-| X (Twitter) | Vinay Prakash | grievance-officer-in@x.com |
-| YouTube / Google | Joe Grier | support-in@google.com |
-| Snapchat | Juhi Bhatnager | grievance-officer-in@snap.com |
-| LinkedIn | T. Mampilly | tmampilly@linkedin.com |
-| ShareChat | Harleen Sethi | grievance@sharechat.co |
-| Telegram | Abhimanyu Yadav | abhimanyu@telegram.org |
-| Reddit | Vijay Pamarathi | grievance-officer-in@reddit.com |
-| Quora | Resident Officer | rgo@quora.com |
-| Discord | Legal Team | grievance-officer-in@discord.com |
-| Tinder | Raunaq S. Kohli | grievance-officer-in@tinder.com |
-| Hinge | Raunaq S. Kohli | grievance-officer-in@hinge.co |
-| OkCupid | Raunaq S. Kohli | grievance-officer-in@okcupid.com |
-| Bumble | Prachetea Mazumdar | grievanceofficerindia@team.bumble.com |
-
-**Include in Recommended Next Steps for social media cases:**
-- Contact the platform's Grievance Officer (provide name and email from table above)
-- Report the content directly on the platform
-- File complaint at cybercrime.gov.in
-
-
-## 4. Required Evidence & Documents
-Provide a bulleted checklist of digital evidence the user needs to preserve immediately (e.g., specific URLs, timestamps, preservation of unedited screenshots, hash values if applicable).
-
-## 5. Authorities & Jurisdiction
-- List the specific authorities to contact:
-  - **Online Portal:** [https://cybercrime.gov.in/](https://cybercrime.gov.in/)
-  - Local Cyber Cell Police Station
-  - For UPI/financial fraud only: **Helpline 1930** (24x7)
-- Mention the appropriate jurisdiction logic (usually where the victim resides or where the device was when the crime occurred).
-
-TONE GUIDELINES:
-- Empathetic but Professional: Acknowledge the distress but remain objective.
-- For urgent cases (financial fraud, threats): Use urgent language and emphasize speed of action.
-- Disclaimer: End with a standard disclaimer that you are an AI assistant and this is information, not legal counsel.
-
-RESPONSE CONSTRAINTS:
-- If the Retrieved Context is insufficient to form a specific legal opinion, state this clearly in the Case Overview.
-- Do not hallucinate legal sections that do not exist in Indian Law.
-- ALWAYS include 1930 helpline and cybercrime.gov.in portal link in responses involving complaints or reporting.
-"""
-
-
-    user_prompt = f"""
+USER_PROMPT_TEMPLATE = """
 User Question:
 {question}
 
@@ -216,18 +81,214 @@ Ensure the response follows the exact structure specified in the system instruct
 Final Answer:
 """
 
-    response = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        temperature=0.6,
-        max_tokens=1500,
+
+def case_summary(item):
+    """Source entry (title, year, summary, full_text) for one retrieved case."""
+    meta = item["metadata"]
+    clean_doc = clean_document_text(item["document"])
+    return {
+        "title": clean_title(meta.get("title", "Related Case")),
+        "year": meta.get("year", "N/A"),
+        "summary": summarize_document(clean_doc),
+        "full_text": clean_doc
+    }
+
+
+def build_messages(question, retrieved_docs, token_budget: int = PROMPT_TOKEN_BUDGET):
+    """
+    Build the chat messages for the LLM and the case summaries shown as sources.
+
+    The prompt is kept within token_budget: optional system-prompt tables are
+    only included when relevant, and case descriptions are trimmed (or the
+    lowest-ranked cases dropped) to fit what is left.
+
+    Returns:
+        (messages, case_summaries)
+    """
+    system_prompt = build_system_prompt(question, retrieved_docs)
+
+    case_blocks = []
+    summaries = []
+
+    for item in retrieved_docs:
+        summary = case_summary(item)
+        summaries.append(summary)
+
+        case_blocks.append(f"""
+Title: {summary['title']}
+Laws Involved: {item['metadata'].get('laws', 'N/A')}
+Description:
+{summary['full_text']}
+""")
+
+    fixed_tokens = (
+        estimate_tokens(system_prompt)
+        + estimate_tokens(USER_PROMPT_TEMPLATE.format(question=question, context=""))
     )
+    kept_blocks = fit_cases(case_blocks, token_budget - fixed_tokens)
+    # Only cite cases the model actually saw
+    case_summaries = summaries[:len(kept_blocks)]
+
+    user_prompt = USER_PROMPT_TEMPLATE.format(question=question, context="".join(kept_blocks))
+
+    if PROMPT_DEBUG:
+        print(
+            f"🧮 Prompt ≈{estimate_tokens(system_prompt) + estimate_tokens(user_prompt)} tokens "
+            f"(budget {token_budget}, {len(kept_blocks)}/{len(case_blocks)} cases, "
+            f"system ≈{estimate_tokens(system_prompt)})"
+        )
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+    return messages, case_summaries
+
+
+def retrieval_only_answer(retrieved_docs):
+    """
+    Fallback when the LLM is unavailable (see llm_client.py): the retrieved
+    cases, their laws and the reporting channels, without analysis.
+
+    Returns:
+        (answer, case_summaries)
+    """
+    summaries = [case_summary(item) for item in retrieved_docs]
+
+    lines = [DEGRADED_NOTICE, "", "**Similar Cases**"]
+    for item, summary in zip(retrieved_docs, summaries):
+        laws = item["metadata"].get("laws") or "N/A"
+        lines.append(f"- **{summary['title']}** ({summary['year']}) — Laws: {laws}")
+        lines.append(f"  {summary['summary']}")
+    lines += [
+        "",
+        "**Where to Report**",
+        "- National Cyber Crime Helpline: **1930** (24x7)",
+        "- Online complaint: https://cybercrime.gov.in",
+        "",
+        "_This is general information, not legal advice._",
+    ]
+    return "\n".join(lines), summaries
+
+
+def log_usage(usage):
+    """Log actual prompt / completion token counts reported by Groq."""
+    if usage is None:
+        return
+    print(
+        f"🧮 Tokens used: prompt={getattr(usage, 'prompt_tokens', '?')}, "
+        f"completion={getattr(usage, 'completion_tokens', '?')}"
+    )
+
 
+def generate_answer(question, retrieved_docs):
+    if not client:
+        return NOT_CONFIGURED_MESSAGE, []
+
+    messages, case_summaries = build_messages(question, retrieved_docs)
+
+    response = llm_guard.call(lambda timeout: client.chat.completions.create(
+        model=MODEL_NAME,
+        messages=messages,
+        temperature=TEMPERATURE,
+        max_tokens=MAX_TOKENS,
+        timeout=timeout,
+    ))
+
+    log_usage(getattr(response, "usage", None))
 
     answer_text = response.choices[0].message.content
     return answer_text, case_summaries
 
 
+async def stream_answer(messages):
+    """
+    Stream the answer for prepared messages token by token.
+
+    Uses the async Groq client so a slow generation does not hold a
+    threadpool worker. Yields text deltas as they arrive.
+    """
+    if not async_client:
+        yield NOT_CONFIGURED_MESSAGE
+        return
+
+    stream = llm_guard.astream(lambda timeout: async_client.chat.completions.create(
+        model=MODEL_NAME,
+        messages=messages,
+        temperature=TEMPERATURE,
+        max_tokens=MAX_TOKENS,
+        stream=True,
+        timeout=timeout,
+    ))
+
+    async for chunk in stream:
+        # Groq reports usage on the final chunk under x_groq
+        x_groq = getattr(chunk, "x_groq", None)
+        if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+            log_usage(x_groq.usage)
+
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+
+async def complete_answer(messages, limiter=None):
+    """
+    Non-streamed answer for prepared messages on the async client, for
+    callers that run many generations concurrently (/ask/batch).
+
+    limiter (ratelimit.RateLimiter) is acquired for the estimated prompt
+    plus the completion allowance before each request is sent (retries and
+    hedges included; see LLMGuard.acall).
+    """
+    if not async_client:
+        return NOT_CONFIGURED_MESSAGE
+
+    prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+
+    response = await llm_guard.acall(
+        lambda timeout: async_client.chat.completions.create(
+            model=MODEL_NAME,
+            messages=messages,
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKENS,
+            timeout=timeout,
+        ),
+        limiter=limiter,
+        tokens=prompt_tokens + MAX_TOKENS,
+    )
+
+    log_usage(getattr(response, "usage", None))
+    return response.choices[0].message.content
+
+
+def iter_answer(messages):
+    """
+    Blocking counterpart of stream_answer, for worker threads (the voice
+    pipeline). Yields text deltas as they arrive.
+    """
+    if not client:
+        yield NOT_CONFIGURED_MESSAGE
+        return
+
+    stream = llm_guard.stream(lambda timeout: client.chat.completions.create(
+        model=MODEL_NAME,
+        messages=messages,
+        temperature=TEMPERATURE,
+        max_tokens=MAX_TOKENS,
+        stream=True,
+        timeout=timeout,
+    ))
+
+    for chunk in stream:
+        x_groq = getattr(chunk, "x_groq", None)
+        if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+            log_usage(x_groq.usage)
+
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
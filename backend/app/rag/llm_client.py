@@ -0,0 +1,404 @@
+"""
+Resilient calls to the Groq API.
+
+- Groq clients share pooled keep-alive httpx connections with explicit
+  connect / read timeouts (the SDK default is a 10 minute read timeout)
+- every call has an overall deadline; retryable failures (timeouts,
+  connection errors, 429, 5xx) are retried with jittered exponential
+  backoff while the deadline allows
+- optionally, a non-streamed call that has not answered after
+  LLM_HEDGE_AFTER_SECONDS gets a second, hedged request; the first
+  response wins. With a rate limiter, quota is taken before a request is
+  sent (outside the attempt timeout and hedge timer), and a hedge is only
+  sent if the limiter has room for it right away
+- a circuit breaker opens when the failure rate over a sliding window
+  spikes. While open, calls fail immediately with LLMUnavailableError
+  (callers fall back to a retrieval-only answer) instead of tying up
+  workers; after a cooldown a single probe call decides whether to close
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import groq
+import httpx
+
+# --- CONFIG ---
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))       # per attempt (and per streamed read)
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "45"))     # whole call, retries included
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0"))   # 0 = no hedging
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "30"))
+
+BREAKER_WINDOW_SECONDS = float(os.getenv("LLM_BREAKER_WINDOW_SECONDS", "30"))
+BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "8"))
+BREAKER_FAILURE_RATIO = float(os.getenv("LLM_BREAKER_FAILURE_RATIO", "0.5"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# APITimeoutError is an APIConnectionError; httpx errors surface directly while a stream is read
+RETRYABLE_ERRORS = (groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError, httpx.TransportError)
+
+
+class LLMUnavailableError(Exception):
+    """The LLM could not answer (breaker open, retries or deadline exhausted)."""
+
+
+def build_groq_clients(api_key: str):
+    """(sync, async) Groq clients on pooled keep-alive connections, or (None, None) without a key."""
+    if not api_key:
+        return None, None
+
+    timeout = httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS)
+    limits = httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+    )
+    # Retries are handled by LLMGuard, which also knows about the deadline and the breaker
+    sync_client = groq.Groq(
+        api_key=api_key, timeout=timeout, max_retries=0,
+        http_client=httpx.Client(timeout=timeout, limits=limits),
+    )
+    async_client = groq.AsyncGroq(
+        api_key=api_key, timeout=timeout, max_retries=0,
+        http_client=httpx.AsyncClient(timeout=timeout, limits=limits),
+    )
+    return sync_client, async_client
+
+
+class CircuitBreaker:
+    """
+    closed -> open when, over the last `window` seconds, at least `min_calls`
+    calls were made and `failure_ratio` of them failed.
+    open -> half_open after `cooldown` seconds; one probe call is let through.
+    half_open -> closed on success, back to open on failure.
+    """
+
+    def __init__(self, window: float = BREAKER_WINDOW_SECONDS, min_calls: int = BREAKER_MIN_CALLS,
+                 failure_ratio: float = BREAKER_FAILURE_RATIO, cooldown: float = BREAKER_COOLDOWN_SECONDS):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.cooldown = cooldown
+
+        self.state = "closed"
+        self._outcomes = deque()      # (timestamp, ok)
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+        self.times_opened = 0
+        self.rejected = 0
+
+    def _expire(self, now: float):
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (reserves the probe when half-open)."""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = "half_open"
+                self._probing = False
+
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+
+            self.rejected += 1
+            return False
+
+    def record(self, ok: bool):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "half_open":
+                self._probing = False
+                if ok:
+                    self.state = "closed"
+                    self._outcomes.clear()
+                    print("✅ LLM circuit closed")
+                else:
+                    self._open(now)
+                return
+
+            self._outcomes.append((now, ok))
+            self._expire(now)
+            failures = sum(1 for _, outcome in self._outcomes if not outcome)
+            if (
+                self.state == "closed"
+                and len(self._outcomes) >= self.min_calls
+                and failures / len(self._outcomes) >= self.failure_ratio
+            ):
+                self._open(now)
+
+    def release(self):
+        """A call ended without an outcome (cancelled, bad request); free the half-open probe."""
+        with self._lock:
+            if self.state == "half_open":
+                self._probing = False
+
+    def _open(self, now: float):
+        self.state = "open"
+        self._opened_at = now
+        self.times_opened += 1
+        print(f"🔌 LLM circuit open for {self.cooldown:g}s (failure rate spiked)")
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire(time.monotonic())
+            failures = sum(1 for _, outcome in self._outcomes if not outcome)
+            return {
+                "state": self.state,
+                "window_calls": len(self._outcomes),
+                "window_failures": failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+
+def _retry_after(error) -> float:
+    """Server-requested delay for 429 / 503 responses, if any."""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after")) if response is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class LLMGuard:
+    """
+    Wraps Groq calls with deadlines, retries, hedging and the circuit breaker.
+
+    Each method takes a factory `make(timeout)` that starts one request with
+    the given per-attempt timeout, e.g.
+        lambda timeout: client.chat.completions.create(..., timeout=timeout)
+    so a retry or hedge is simply another call of the factory.
+    """
+
+    def __init__(self, breaker: CircuitBreaker = None, timeout: float = LLM_TIMEOUT_SECONDS,
+                 deadline: float = LLM_DEADLINE_SECONDS, max_retries: int = LLM_MAX_RETRIES,
+                 retry_base: float = LLM_RETRY_BASE_SECONDS, hedge_after: float = LLM_HEDGE_AFTER_SECONDS):
+        self.breaker = breaker or CircuitBreaker()
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.hedge_after = hedge_after
+        self._hedge_executor = None
+
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedges_skipped = 0
+        self.failures = 0
+
+    # ---- policy ----
+    def _admit(self):
+        if not self.breaker.allow():
+            raise LLMUnavailableError("LLM circuit breaker is open")
+        self.calls += 1
+
+    def _retry_delay(self, attempt: int, error, deadline_at: float) -> float:
+        """
+        Record a failed attempt and return the delay before the next one:
+        full jitter, but never less than what the server asked for. Raises
+        LLMUnavailableError when out of attempts or time.
+        """
+        self.breaker.record(False)
+        delay = max(random.uniform(0, self.retry_base * 2 ** attempt), _retry_after(error))
+        if attempt >= self.max_retries or time.monotonic() + delay >= deadline_at:
+            self._fail(error)
+        self.retries += 1
+        print(f"🔁 LLM retry {attempt + 1} in {delay:.2f}s ({type(error).__name__})")
+        return delay
+
+    def _attempt_timeout(self, deadline_at: float) -> float:
+        return max(0.1, min(self.timeout, deadline_at - time.monotonic()))
+
+    def _fail(self, error):
+        self.failures += 1
+        raise LLMUnavailableError(f"LLM request failed: {error}") from error
+
+    # ---- sync ----
+    def _hedged(self, make, timeout: float):
+        if not self.hedge_after:
+            return make(timeout)
+        if self._hedge_executor is None:
+            self._hedge_executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONNECTIONS, thread_name_prefix="llm-hedge")
+
+        futures = [self._hedge_executor.submit(make, timeout)]
+        done, _ = wait(futures, timeout=self.hedge_after)
+        if not done:
+            self.hedges += 1
+            futures.append(self._hedge_executor.submit(make, timeout))
+
+        # First success wins; the slower request is left to finish and is ignored
+        error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def call(self, make):
+        """Blocking non-streamed call."""
+        self._admit()
+        try:
+            deadline_at = time.monotonic() + self.deadline
+            attempt = 0
+            while True:
+                try:
+                    result = self._hedged(make, self._attempt_timeout(deadline_at))
+                except RETRYABLE_ERRORS as e:
+                    time.sleep(self._retry_delay(attempt, e, deadline_at))
+                    attempt += 1
+                    continue
+                self.breaker.record(True)
+                return result
+        finally:
+            self.breaker.release()
+
+    def stream(self, make):
+        """
+        Blocking stream: yields chunks. Retries happen only until the first
+        chunk arrives (nothing has been shown to the user yet); after that a
+        failure ends the stream with LLMUnavailableError.
+        """
+        self._admit()
+        try:
+            deadline_at = time.monotonic() + self.deadline
+            attempt = 0
+            while True:
+                try:
+                    iterator = iter(make(self._attempt_timeout(deadline_at)))
+                    first = next(iterator, None)
+                    break
+                except RETRYABLE_ERRORS as e:
+                    time.sleep(self._retry_delay(attempt, e, deadline_at))
+                    attempt += 1
+
+            try:
+                if first is not None:
+                    yield first
+                    yield from iterator
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record(False)
+                self._fail(e)
+            self.breaker.record(True)
+        finally:
+            self.breaker.release()
+
+    # ---- async ----
+    async def _ahedged(self, make, timeout: float, limiter=None, tokens: int = 0):
+        if not self.hedge_after:
+            return await make(timeout)
+
+        tasks = [asyncio.ensure_future(make(timeout))]
+        done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+        if not done:
+            # Never wait for quota to hedge: when it is scarce the hedge is skipped
+            if limiter is None or limiter.try_acquire(tokens):
+                self.hedges += 1
+                tasks.append(asyncio.ensure_future(make(timeout)))
+            else:
+                self.hedges_skipped += 1
+
+        error = None
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def acall(self, make, limiter=None, tokens: int = 0):
+        """
+        Async non-streamed call; make(timeout) returns an awaitable.
+
+        limiter (ratelimit.RateLimiter), if given, is acquired for `tokens`
+        before every request is sent. The wait happens before the attempt
+        timeout and hedge timer start, and waiting for the first request's
+        quota does not count against the deadline.
+        """
+        self._admit()
+        try:
+            deadline_at = None
+            attempt = 0
+            while True:
+                if limiter is not None:
+                    await limiter.acquire(tokens)
+                if deadline_at is None:
+                    deadline_at = time.monotonic() + self.deadline
+                try:
+                    result = await self._ahedged(make, self._attempt_timeout(deadline_at), limiter, tokens)
+                except RETRYABLE_ERRORS as e:
+                    await asyncio.sleep(self._retry_delay(attempt, e, deadline_at))
+                    attempt += 1
+                    continue
+                self.breaker.record(True)
+                return result
+        finally:
+            self.breaker.release()
+
+    async def astream(self, make):
+        """Async stream; make(timeout) returns an awaitable of an async iterator. See stream()."""
+        self._admit()
+        try:
+            deadline_at = time.monotonic() + self.deadline
+            attempt = 0
+            while True:
+                try:
+                    iterator = (await make(self._attempt_timeout(deadline_at))).__aiter__()
+                    first = await anext(iterator, None)
+                    break
+                except RETRYABLE_ERRORS as e:
+                    await asyncio.sleep(self._retry_delay(attempt, e, deadline_at))
+                    attempt += 1
+
+            try:
+                if first is not None:
+                    yield first
+                    async for chunk in iterator:
+                        yield chunk
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record(False)
+                self._fail(e)
+            self.breaker.record(True)
+        finally:
+            self.breaker.release()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedges_skipped": self.hedges_skipped,
+            "failures": self.failures,
+            "timeout_seconds": self.timeout,
+            "deadline_seconds": self.deadline,
+            "hedge_after_seconds": self.hedge_after or None,
+            "breaker": self.breaker.stats(),
+        }
+
+
+# Shared by every LLM call in this process (one breaker per worker)
+llm_guard = LLMGuard()
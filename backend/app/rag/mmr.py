@@ -0,0 +1,72 @@
+"""
+Maximal marginal relevance (MMR) selection over retrieved cases.
+
+The dataset has many near-identical incidents that differ only in the
+"Incident N - City" part of the title. Plain top-k often returns several
+of them, which spends prompt tokens on the same story. This picks a
+smaller, diverse subset of the top-k:
+
+- candidates nearly identical to an already selected case
+  (cosine >= redundancy_threshold) are dropped, and their slot is not
+  refilled, so duplicates shrink the set instead of pulling in fillers
+- candidates below MMR_MIN_RELEVANCE_RATIO of the best match's relevance
+  are dropped too
+- the rest are ordered greedily by
+  lambda * relevance - (1 - lambda) * max_similarity_to_selected
+"""
+
+import os
+
+import numpy as np
+
+# --- CONFIG ---
+MMR_ENABLED = os.getenv("MMR_ENABLED", "true").lower() == "true"
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+MMR_REDUNDANCY_THRESHOLD = float(os.getenv("MMR_REDUNDANCY_THRESHOLD", "0.95"))
+MMR_MIN_RELEVANCE_RATIO = float(os.getenv("MMR_MIN_RELEVANCE_RATIO", "0.8"))   # 0 = no relevance floor
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def mmr_select(
+    query_embedding,
+    candidate_embeddings,
+    k: int,
+    lambda_mult: float = MMR_LAMBDA,
+    redundancy_threshold: float = MMR_REDUNDANCY_THRESHOLD,
+    min_relevance_ratio: float = MMR_MIN_RELEVANCE_RATIO,
+):
+    """
+    Indices of at most k candidates, in selection order.
+
+    Only the first k candidates (the plain top-k ranking) are considered,
+    so every dropped candidate makes the result smaller. Similarities are computed once as matrix products; each greedy step
+    only updates the running max-similarity-to-selected vector.
+    """
+    if k <= 0 or len(candidate_embeddings) == 0:
+        return []
+
+    candidates = _normalize(candidate_embeddings[:k])
+    relevance = candidates @ _normalize(query_embedding)
+    similarity = candidates @ candidates.T
+
+    floor = relevance.max() * min_relevance_ratio if min_relevance_ratio > 0 and relevance.max() > 0 else -np.inf
+    eligible = relevance >= floor
+    max_similarity = np.full(len(candidates), -np.inf, dtype=np.float32)
+    selected = []
+
+    while eligible.any():
+        redundancy = np.where(np.isfinite(max_similarity), max_similarity, 0.0)
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        best = int(np.argmax(np.where(eligible, scores, -np.inf)))
+
+        selected.append(best)
+        eligible[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[best])
+        eligible &= max_similarity < redundancy_threshold
+
+    return selected
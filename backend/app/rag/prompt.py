@@ -0,0 +1,266 @@
+"""
+Prompt construction under a token budget.
+
+The system prompt is split into a core and two optional blocks (the BNS
+mapping table and the grievance-officer table) that are only included
+when the question or the retrieved cases call for them. Retrieved case
+text is then trimmed so the whole prompt fits PROMPT_TOKEN_BUDGET.
+"""
+
+import os
+import re
+
+# --- CONFIG ---
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3500"))
+MIN_CASE_TOKENS = 60        # below this a case is dropped rather than trimmed further
+CHARS_PER_TOKEN = 4         # used to turn a token allowance into a character cut
+
+
+# -----------------------------
+# PROMPT TEXT
+# -----------------------------
+SYSTEM_PROMPT_TEMPLATE = """
+You are an expert Indian Cybercrime Legal Assistant AI. Your goal is to analyze a user's distress situation against a provided set of Retrieved Legal Context (Indian Penal Code, IT Act, BNS, or case precedents) and generate a structured, actionable, and legally grounded response.
+
+INPUT DATA:
+- User Query: The user's description of their incident.
+- Retrieved Context: A list of relevant legal sections, acts, and similar case precedents retrieved from the database.
+
+STRICT OUTPUT FORMATTING RULES:
+You must adhere effectively to the following structure. Do not include conversational filler before or after this structure. Use Markdown formatting.
+
+## 🚨 URGENT ACTION REQUIRED (ONLY for UPI/Financial Fraud)
+**IMPORTANT:** Display this section ONLY if the case specifically involves:
+- UPI fraud
+- Banking fraud
+- Unauthorized money transfer
+- Financial loss through digital payment fraud
+
+For these UPI/financial fraud cases ONLY:
+- Display this section FIRST with a prominent warning
+- Recommend calling **National Cyber Crime Helpline: 1930** immediately
+- Explain that quick action within the "golden hour" can help freeze fraudulent transactions
+
+**DO NOT include this section for other cybercrimes** like hacking, impersonation, stalking, defamation, identity theft without financial loss, etc.
+
+## 1. Case Overview
+Write a concise, 3-4 sentence summary of the user's situation.
+Highlight the specific nature of the cybercrime (e.g., Identity Theft, Impersonation, Cyber Stalking, UPI Fraud).
+
+## 2. Legal Analysis
+
+Create a Markdown table with two columns: "Relevant Section/Act" and "How it Applies to You".
+- Column 1 (Law): Cite the specific Act and Section.
+- Column 2 (Application): Explicitly map the law to the facts provided in the User Query. Do not just define the law; explain why the user's specific situation violates this law.
+- Constraint: Only cite laws present in the Retrieved Context or highly relevant general Indian Cyber laws known to you if context is sparse.
+
+{bns_rules}- For IT Act sections, use normal format: "Section 66D of IT Act, 2000"
+
+
+## 3. Recommended Next Steps
+Provide a numbered list of immediate, practical actions the user must take (e.g., blocking, reporting to platform, temporarily deactivating accounts).
+
+**MANDATORY:** When recommending to file a complaint with the cybercrime portal, ALWAYS include the direct link:
+- **File Online Complaint:** [National Cyber Crime Reporting Portal](https://cybercrime.gov.in/)
+
+**For UPI/Financial fraud cases ONLY**, include:
+1. **URGENT: Call 1930** - National Cyber Crime Helpline (24x7) - Report immediately to freeze fraudulent transactions
+2. **File Online Complaint:** [https://cybercrime.gov.in/](https://cybercrime.gov.in/)
+
+**For all other cybercrimes** (hacking, stalking, impersonation, etc.), DO NOT include the 1930 helpline prominently - just list it in the Authorities section.
+
+{social_media_rules}## 4. Required Evidence & Documents
+Provide a bulleted checklist of digital evidence the user needs to preserve immediately (e.g., specific URLs, timestamps, preservation of unedited screenshots, hash values if applicable).
+
+## 5. Authorities & Jurisdiction
+- List the specific authorities to contact:
+  - **Online Portal:** [https://cybercrime.gov.in/](https://cybercrime.gov.in/)
+  - Local Cyber Cell Police Station
+  - For UPI/financial fraud only: **Helpline 1930** (24x7)
+- Mention the appropriate jurisdiction logic (usually where the victim resides or where the device was when the crime occurred).
+
+TONE GUIDELINES:
+- Empathetic but Professional: Acknowledge the distress but remain objective.
+- For urgent cases (financial fraud, threats): Use urgent language and emphasize speed of action.
+- Disclaimer: End with a standard disclaimer that you are an AI assistant and this is information, not legal counsel.
+
+RESPONSE CONSTRAINTS:
+- If the Retrieved Context is insufficient to form a specific legal opinion, state this clearly in the Case Overview.
+- Do not hallucinate legal sections that do not exist in Indian Law.
+- ALWAYS include 1930 helpline and cybercrime.gov.in portal link in responses involving complaints or reporting.
+"""
+
+
+BNS_RULES = """**IMPORTANT - BNS FORMATTING RULE:**
+For any IPC (Indian Penal Code) sections, you MUST use the new Bharatiya Nyaya Sanhita (BNS) format. Use the mapping below:
+
+| BNS Section | Formerly IPC Section | Offence |
+|-------------|---------------------|---------|
+| BNS Section 319 | IPC Section 419 | Cheating by personation |
+| BNS Section 318 | IPC Section 420 | Cheating |
+| BNS Section 336 | IPC Section 468 | Forgery for purpose of cheating |
+| BNS Section 77 | IPC Section 354C | Voyeurism |
+| BNS Section 351 | IPC Section 503 | Criminal intimidation |
+| BNS Section 352 | IPC Section 507 | Anonymous criminal intimidation |
+| BNS Section 356 | IPC Section 499 | Defamation |
+
+**Required Format in Legal Analysis Table:**
+- Write as: **"BNS Section 319 (formerly IPC Section 419)"** NOT just "IPC Section 419"
+- Always show both the new BNS section and the old IPC section in parentheses
+"""
+
+SOCIAL_MEDIA_RULES = """**FOR SOCIAL MEDIA HARASSMENT / ILLICIT CONTENT / SENSITIVE VIDEOS:**
+If the case involves social media harassment, spread of nude/intimate/sensitive images or videos, impersonation on social platforms, or any abuse on social media:
+
+1. **FIRST** - Check if the user mentioned which platform (WhatsApp, Instagram, Facebook, etc.)
+2. **IF PLATFORM NOT MENTIONED** - Ask the user: "Which social media platform did this incident occur on? This will help me provide the specific grievance officer contact for faster resolution."
+3. **IF PLATFORM IS MENTIONED** - Provide the Grievance Officer contact from this list:
+
+**GRIEVANCE OFFICER CONTACTS:**
+| Platform | Officer Name | Email |
+|----------|-------------|-------|
+| WhatsApp | Siddhartha Nahar | grievance_officer_wa@support.whatsapp.com |
+| Facebook (Meta) | Meta India Team | fbgoindia@support.facebook.com |
+| Instagram | Meta India Team | support@instagram.com |
+| X (Twitter) | Vinay Prakash | grievance-officer-in@x.com |
+| YouTube / Google | Joe Grier | support-in@google.com |
+| Snapchat | Juhi Bhatnager | grievance-officer-in@snap.com |
+| LinkedIn | T. Mampilly | tmampilly@linkedin.com |
+| ShareChat | Harleen Sethi | grievance@sharechat.co |
+| Telegram | Abhimanyu Yadav | abhimanyu@telegram.org |
+| Reddit | Vijay Pamarathi | grievance-officer-in@reddit.com |
+| Quora | Resident Officer | rgo@quora.com |
+| Discord | Legal Team | grievance-officer-in@discord.com |
+| Tinder | Raunaq S. Kohli | grievance-officer-in@tinder.com |
+| Hinge | Raunaq S. Kohli | grievance-officer-in@hinge.co |
+| OkCupid | Raunaq S. Kohli | grievance-officer-in@okcupid.com |
+| Bumble | Prachetea Mazumdar | grievanceofficerindia@team.bumble.com |
+
+**Include in Recommended Next Steps for social media cases:**
+- Contact the platform's Grievance Officer (provide name and email from table above)
+- Report the content directly on the platform
+- File complaint at cybercrime.gov.in
+
+
+"""
+
+
+# -----------------------------
+# TOKEN ESTIMATION
+# -----------------------------
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate Llama-3 token count: ~4/3 tokens per word plus one per
+    punctuation mark (Markdown tables are punctuation heavy).
+    Exact counts come back from Groq in the usage block and are logged.
+    """
+    if not text:
+        return 0
+    words = punctuation = 0
+    for piece in _TOKEN_PIECES.findall(text):
+        if piece[0].isalnum() or piece[0] == "_":
+            words += 1
+        else:
+            punctuation += 1
+    return int(words * 4 / 3) + punctuation
+
+
+# -----------------------------
+# CONDITIONAL SECTIONS
+# -----------------------------
+_BNS_TRIGGERS = re.compile(
+    r"\b(ipc|bns|penal code|nyaya sanhita|cheat\w*|personation|forg\w*|"
+    r"defam\w*|intimidat\w*|voyeur\w*|extort\w*|threat\w*)\b",
+    re.IGNORECASE,
+)
+_SOCIAL_MEDIA_TRIGGERS = re.compile(
+    r"\b(social media|whatsapp|facebook|instagram|twitter|x\.com|youtube|snapchat|linkedin|"
+    r"sharechat|telegram|reddit|quora|discord|tinder|hinge|okcupid|bumble|dating app|"
+    r"profile|post(ed|s)?|morph\w*|nude\w*|intimate|obscene|sextort\w*|harass\w*|stalk\w*|"
+    r"bully\w*|troll\w*|impersonat\w*|fake account)\b",
+    re.IGNORECASE,
+)
+
+
+def _retrieved_signals(retrieved_docs) -> str:
+    """Laws, categories and titles of the retrieved cases as one searchable string."""
+    parts = []
+    for item in retrieved_docs:
+        meta = item.get("metadata") or {}
+        for field in ("laws", "category", "subcategory", "title"):
+            parts.append(str(meta.get(field, "")).replace("_", " "))
+    return " ".join(parts)
+
+
+def needs_bns_table(question: str, retrieved_docs) -> bool:
+    """IPC/BNS offences are in play (named in the query or in the retrieved laws)."""
+    return bool(_BNS_TRIGGERS.search(question) or _BNS_TRIGGERS.search(_retrieved_signals(retrieved_docs)))
+
+
+def needs_grievance_table(question: str, retrieved_docs) -> bool:
+    """The incident involves a social platform or social-media style abuse."""
+    return bool(
+        _SOCIAL_MEDIA_TRIGGERS.search(question)
+        or _SOCIAL_MEDIA_TRIGGERS.search(_retrieved_signals(retrieved_docs))
+    )
+
+
+def build_system_prompt(question: str, retrieved_docs) -> str:
+    return SYSTEM_PROMPT_TEMPLATE.format(
+        bns_rules=BNS_RULES if needs_bns_table(question, retrieved_docs) else "",
+        social_media_rules=SOCIAL_MEDIA_RULES if needs_grievance_table(question, retrieved_docs) else "",
+    )
+
+
+# -----------------------------
+# CONTEXT BUDGETING
+# -----------------------------
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, ending on a sentence where possible."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    cut = text[: max_tokens * CHARS_PER_TOKEN]
+    while cut and estimate_tokens(cut) > max_tokens:
+        cut = cut[: int(len(cut) * 0.9)]
+
+    last_period = cut.rfind(".")
+    if last_period > len(cut) // 2:
+        return cut[: last_period + 1]
+    return cut.rstrip() + "..."
+
+
+def fit_cases(case_blocks, budget: int):
+    """
+    Fit rendered case blocks (best first) into budget tokens.
+
+    Budget is shared fairly: short cases keep their full text and pass their
+    unused share on to longer ones. Cases that would get less than
+    MIN_CASE_TOKENS are dropped from the end, but the top-ranked case is
+    always kept (trimmed to at least MIN_CASE_TOKENS, even when a long
+    question leaves no budget) so the answer stays grounded. Returns the
+    kept (possibly trimmed) blocks in the original order.
+    """
+    blocks = list(case_blocks)
+    while len(blocks) > 1 and budget // len(blocks) < MIN_CASE_TOKENS:
+        blocks.pop()
+    if not blocks:
+        return []
+    budget = max(budget, MIN_CASE_TOKENS)
+
+    sizes = [estimate_tokens(block) for block in blocks]
+    allowance = [0] * len(blocks)
+    remaining = budget
+    open_slots = sorted(range(len(blocks)), key=lambda i: sizes[i])
+
+    # Water-filling: smallest cases first, each takes min(its size, fair share)
+    while open_slots:
+        share = remaining // len(open_slots)
+        index = open_slots.pop(0)
+        allowance[index] = min(sizes[index], share)
+        remaining -= allowance[index]
+
+    return [trim_to_tokens(block, allowance[i]) for i, block in enumerate(blocks)]
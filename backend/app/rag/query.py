@@ -1,49 +1,179 @@
-import chromadb
-from pathlib import Path
-from chromadb.utils import embedding_functions
+import os
 
-# --- CONFIG ---
-PROJECT_ROOT = Path(__file__).resolve().parents[3]
-DB_PATH = PROJECT_ROOT / "cyber_crime_db"
-COLLECTION_NAME = "cybercrime_rag"
-
-# --- INIT ONCE ---
-client = chromadb.PersistentClient(path=str(DB_PATH))
-
-embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name="all-MiniLM-L6-v2"
+from app.metrics import span
+from app.rag.engine import get_engine
+from app.rag.filters import matches_filters
+from app.rag.lexical import (
+    acts_mentioned, cites_section, is_section_lookup, reciprocal_rank_fusion, section_references,
 )
+from app.rag.mmr import MMR_ENABLED, mmr_select
 
-collection = client.get_collection(
-    name=COLLECTION_NAME,
-    embedding_function=embedding_fn
-)
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+LEXICAL_CANDIDATES = 2      # lexical hits fused per requested result
+FILTERED_LEXICAL_CANDIDATES = 4   # lexical hits are filtered after lookup, so over-fetch
 
 
-def retrieve_documents(query: str, top_k: int = 5):
-    """
-    Retrieve top-k relevant documents from ChromaDB.
-    Returns list of dicts compatible with llm.generate_answer().
-    """
-    results = collection.query(
-        query_texts=[query],
-        n_results=top_k
-    )
+def needs_embedding(query: str) -> bool:
+    """False when the query will be served by the lexical fast path alone."""
+    return not (HYBRID_RETRIEVAL and is_section_lookup(query) and get_engine().lexical_index())
 
-    if not results or not results["documents"]:
-        return []
-
-    retrieved = []
 
-    for i in range(len(results["documents"][0])):
-        retrieved.append({
+def _vector_hits(results):
+    hits = []
+    for i in range(len(results["ids"][0])):
+        hits.append({
             "id": results["ids"][0][i],
             "document": results["documents"][0][i],
             "metadata": results["metadatas"][0][i],
             "distance": (
                 results["distances"][0][i]
-                if "distances" in results else None
+                if results.get("distances") else None
             )
         })
+    return hits
+
+
+def _hit_embeddings(results):
+    """Stored vectors of the hits, when the search included them."""
+    embeddings = results.get("embeddings")
+    return list(embeddings[0]) if embeddings is not None else None
+
+
+def _lexical_documents(engine, record_ids, filters):
+    """Fetch lexical hits by id and drop those outside the filters."""
+    documents = engine.get_documents(record_ids)
+    return [item for item in documents if matches_filters(item["metadata"], filters)]
+
+
+def _diversify(query_embedding, hits, embeddings, top_k):
+    """Keep a diverse subset of the top-k vector hits (see mmr.py)."""
+    if not hits or embeddings is None:
+        return hits[:top_k]
+
+    selected = mmr_select(query_embedding, embeddings, top_k)
+    return [hits[i] for i in selected]
+
+
+def _rank(engine, query, query_embedding, results, top_k, filters, lexical):
+    """Vector hits -> MMR -> fusion with the lexical ranking (when hybrid)."""
+    if not results or not results["ids"] or not results["ids"][0]:
+        return []
+
+    vector_hits = _vector_hits(results)
+    if MMR_ENABLED:
+        with span("mmr"):
+            vector_hits = _diversify(query_embedding, vector_hits, _hit_embeddings(results), top_k)
+    if not lexical:
+        return vector_hits
+
+    # --- Hybrid: fuse with lexical ranking ---
+    lexical_factor = FILTERED_LEXICAL_CANDIDATES if filters else 1
+    with span("lexical_search"):
+        lexical_hits = lexical.search(query, top_k * LEXICAL_CANDIDATES * lexical_factor)
+    if not lexical_hits:
+        return vector_hits
+
+    by_id = {hit["id"]: hit for hit in vector_hits}
+    missing = [record_id for record_id, _ in lexical_hits if record_id not in by_id]
+    for item in _lexical_documents(engine, missing, filters):
+        item["distance"] = None
+        by_id[item["id"]] = item
+
+    fused_ids = reciprocal_rank_fusion([
+        [hit["id"] for hit in vector_hits],
+        [record_id for record_id, _ in lexical_hits if record_id in by_id],
+    ])[:len(vector_hits) if MMR_ENABLED else top_k]
+
+    return [by_id[record_id] for record_id in fused_ids]
+
+
+def retrieve_documents(query: str, top_k: int = 5, query_embedding=None, filters=None):
+    """
+    Retrieve top-k relevant documents.
+    Returns list of dicts compatible with llm.generate_answer().
+
+    - Section lookups ("IPC 420", "Section 66D IT Act") are answered from the
+      lexical index without embedding the query, keeping only cases that cite
+      that section under the act named in the query.
+    - Everything else fuses vector and lexical rankings (reciprocal rank fusion).
+    - filters (see filters.make_filters) restrict both to the matching subset;
+      the vector side pushes them down into the Chroma query.
+    - With MMR on, near-duplicate and weakly relevant cases are removed from
+      the vector top-k (mmr.py), so fewer than top_k documents may come back.
+
+    Pass query_embedding to reuse an embedding that was already computed
+    (e.g. for the semantic cache lookup).
+    """
+    engine = get_engine()
+    lexical = engine.lexical_index() if HYBRID_RETRIEVAL else None
+    lexical_factor = FILTERED_LEXICAL_CANDIDATES if filters else 1
+
+    # --- Fast path: pure statute lookup ---
+    if lexical and is_section_lookup(query):
+        numbers = section_references(query)
+        acts = acts_mentioned(query)
+        # Hits citing the number under another act are dropped below, so over-fetch
+        act_factor = FILTERED_LEXICAL_CANDIDATES if acts else 1
+        with span("lexical_search"):
+            hits = lexical.search(query, top_k * lexical_factor * act_factor, required_terms=numbers)
+        scores = dict(hits)
+        retrieved = [
+            item for item in _lexical_documents(engine, [record_id for record_id, _ in hits], filters)
+            if cites_section(item["metadata"].get("laws"), numbers, acts)
+        ][:top_k]
+        if retrieved:
+            for item in retrieved:
+                item["distance"] = None
+                item["score"] = scores[item["id"]]
+            return retrieved
+
+    # --- Vector search ---
+    if query_embedding is None:
+        query_embedding = engine.embed_query(query)
+
+    with span("vector_search"):
+        results = engine.search(
+            query_embedding, n_results=top_k, filters=filters, with_embeddings=MMR_ENABLED
+        )
+
+    return _rank(engine, query, query_embedding, results, top_k, filters, lexical)
+
+
+def retrieve_many(queries, top_k: int = 5, query_embeddings=None, filters=None):
+    """
+    retrieve_documents() for a list of queries, with one encoder pass and
+    one multi-query vector search for all of them (bulk /ask/batch jobs).
+
+    query_embeddings, if given, lines up with queries; None entries (and a
+    None list) are embedded here unless the query is a statute lookup.
+    Returns one document list per query, in order.
+    """
+    engine = get_engine()
+    query_embeddings = list(query_embeddings) if query_embeddings is not None else [None] * len(queries)
+
+    results = [None] * len(queries)
+    vector_rows = []
+    for row, query in enumerate(queries):
+        if needs_embedding(query):
+            vector_rows.append(row)
+        else:
+            results[row] = retrieve_documents(query, top_k, filters=filters)
+
+    if not vector_rows:
+        return results
+
+    to_embed = [row for row in vector_rows if query_embeddings[row] is None]
+    if to_embed:
+        for row, embedding in zip(to_embed, engine.embed([queries[row] for row in to_embed])):
+            query_embeddings[row] = embedding
+
+    with span("vector_search"):
+        searched = engine.search_many(
+            [query_embeddings[row] for row in vector_rows], n_results=top_k,
+            filters=filters, with_embeddings=MMR_ENABLED,
+        )
 
-    return retrieved
+    lexical = engine.lexical_index() if HYBRID_RETRIEVAL else None
+    for row, row_results in zip(vector_rows, searched):
+        results[row] = _rank(engine, queries[row], query_embeddings[row], row_results, top_k, filters, lexical)
+    return results
@@ -0,0 +1,98 @@
+"""
+Sliding-window rate limiter for LLM calls.
+
+Groq enforces per-minute quotas on requests and tokens. Bulk jobs
+(/ask/batch) acquire the limiter before every generation, so a large batch
+is spread over time instead of failing with 429s halfway through.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+
+# --- CONFIG ---
+GROQ_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+GROQ_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", "0"))     # 0 = not limited
+WINDOW_SECONDS = 60.0
+
+
+class RateLimiter:
+    """
+    Allows at most `requests` calls and `tokens` estimated tokens in any
+    window of `window` seconds. Zero disables a limit.
+
+    acquire() has no await between checking and recording, so it is safe
+    for concurrent tasks on one event loop without a lock.
+    """
+
+    def __init__(self, requests: int = GROQ_REQUESTS_PER_MINUTE, tokens: int = GROQ_TOKENS_PER_MINUTE, window: float = WINDOW_SECONDS):
+        self.max_requests = requests
+        self.max_tokens = tokens
+        self.window = window
+        self._calls = deque()     # (timestamp, tokens)
+        self._tokens = 0
+
+        self.waited_seconds = 0.0
+
+    def _expire(self, now: float):
+        while self._calls and now - self._calls[0][0] >= self.window:
+            _, tokens = self._calls.popleft()
+            self._tokens -= tokens
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        """Seconds until a call of `tokens` fits (0 if it fits now)."""
+        wait = 0.0
+        if self.max_requests and len(self._calls) >= self.max_requests:
+            oldest = self._calls[len(self._calls) - self.max_requests][0]
+            wait = max(wait, oldest + self.window - now)
+
+        if self.max_tokens and self._calls and self._tokens + tokens > self.max_tokens:
+            # Wait until enough of the oldest calls have left the window
+            freed = 0
+            for timestamp, used in self._calls:
+                freed += used
+                if self._tokens - freed + tokens <= self.max_tokens:
+                    wait = max(wait, timestamp + self.window - now)
+                    break
+        return wait
+
+    def _try_record(self, tokens: int) -> float:
+        """Record the call and return 0 if it fits now, else the seconds to wait."""
+        # A single call larger than the token quota can never fit; let it through alone
+        if self.max_tokens:
+            tokens = min(tokens, self.max_tokens)
+
+        now = time.monotonic()
+        self._expire(now)
+        wait = self._wait_time(now, tokens)
+        if wait <= 0:
+            self._calls.append((now, tokens))
+            self._tokens += tokens
+        return wait
+
+    def try_acquire(self, tokens: int = 0) -> bool:
+        """Take quota for one call only if it is available right now."""
+        return self._try_record(tokens) <= 0
+
+    async def acquire(self, tokens: int = 0):
+        while True:
+            wait = self._try_record(tokens)
+            if wait <= 0:
+                return
+            self.waited_seconds += wait
+            await asyncio.sleep(wait)
+
+    def stats(self) -> dict:
+        self._expire(time.monotonic())
+        return {
+            "requests_per_minute": self.max_requests,
+            "tokens_per_minute": self.max_tokens,
+            "requests_in_window": len(self._calls),
+            "tokens_in_window": self._tokens,
+            "waited_seconds": round(self.waited_seconds, 3),
+        }
+
+
+# Shared by every batch job in this process
+groq_limiter = RateLimiter()
@@ -0,0 +1,173 @@
+"""
+Markdown-aware splitting of LLM answers.
+
+Answers follow the fixed section layout from the system prompt, so they are
+split at section headings and paragraph breaks; over-long paragraphs are
+split further at sentences, and only as a last resort at whitespace. Each piece keeps the whitespace
+that followed it, so "".join(text + sep for text, sep in pieces) gives back
+the input exactly. Translation and TTS process the pieces independently
+and stitch the results back together.
+"""
+
+import re
+
+# --- CONFIG ---
+MAX_CHUNK_CHARS = 4500      # deep_translator / Google rejects requests over 5000 chars
+
+_HEADING = re.compile(r"^(?:#{1,6}\s|\*\*[^*\n]+\*\*\s*:?\s*$|[A-Z][A-Z &/()-]{3,}:?\s*$)", re.MULTILINE)
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+# Sentence end: . ! ? or the Devanagari danda, followed by whitespace
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s+")
+
+
+def _split_keep(text: str, pattern):
+    """Split on pattern matches, attaching each match (the separator) to the piece before it."""
+    pieces = []
+    start = 0
+    for match in pattern.finditer(text):
+        pieces.append((text[start:match.start()], match.group()))
+        start = match.end()
+    pieces.append((text[start:], ""))
+    return [(body, sep) for body, sep in pieces if body or sep]
+
+
+def _split_sections(text: str):
+    """Split before every heading line; separators stay with the preceding section."""
+    starts = [match.start() for match in _HEADING.finditer(text) if match.start() > 0]
+    bounds = [0] + starts + [len(text)]
+    sections = []
+    for begin, end in zip(bounds, bounds[1:]):
+        chunk = text[begin:end]
+        body = chunk.rstrip()
+        sections.append((body, chunk[len(body):]))
+    return [(body, sep) for body, sep in sections if body or sep]
+
+
+def _hard_wrap(text: str, max_chars: int):
+    """Break an over-long run at the last whitespace before max_chars."""
+    pieces = []
+    while len(text) > max_chars:
+        cut = text.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        pieces.append((text[:cut], text[cut:cut + 1] if text[cut:cut + 1] == " " else ""))
+        text = text[cut + len(pieces[-1][1]):]
+    pieces.append((text, ""))
+    return pieces
+
+
+def _pack(pieces, max_chars: int):
+    """Merge consecutive small pieces while the result stays within max_chars."""
+    packed = []
+    for body, sep in pieces:
+        if packed:
+            last_body, last_sep = packed[-1]
+            if len(last_body) + len(last_sep) + len(body) <= max_chars:
+                packed[-1] = (last_body + last_sep + body, sep)
+                continue
+        packed.append((body, sep))
+    return packed
+
+
+def split_markdown(text: str, max_chars: int = MAX_CHUNK_CHARS, pack: bool = False):
+    """
+    Split text into [(chunk, trailing_separator)], each chunk at most max_chars.
+
+    With pack=False every paragraph is its own chunk (the same cut points
+    SectionAccumulator uses), which keeps recurring paragraphs (disclaimer,
+    boilerplate next steps) identical across answers so they can be cached,
+    and gives translation many small pieces to run concurrently. pack=True
+    merges neighbours into as few chunks as the limit allows.
+    """
+    if not text:
+        return []
+
+    pieces = []
+    for section, section_sep in _split_sections(text):
+        if not section:
+            pieces.append((section, section_sep))
+            continue
+        for paragraph, paragraph_sep in _split_keep(section, _PARAGRAPH_BREAK):
+            if len(paragraph) <= max_chars:
+                pieces.append((paragraph, paragraph_sep))
+                continue
+            sentences = []
+            for sentence, sentence_sep in _split_keep(paragraph, _SENTENCE_END):
+                wrapped = _hard_wrap(sentence, max_chars)
+                wrapped[-1] = (wrapped[-1][0], wrapped[-1][1] + sentence_sep)
+                sentences.extend(wrapped)
+            sentences = _pack(sentences, max_chars)
+            sentences[-1] = (sentences[-1][0], sentences[-1][1] + paragraph_sep)
+            pieces.extend(sentences)
+        pieces[-1] = (pieces[-1][0], pieces[-1][1] + section_sep)
+
+    return _pack(pieces, max_chars) if pack else pieces
+
+
+def split_sentences(text: str, max_chars: int = MAX_CHUNK_CHARS):
+    """Sentence-level [(sentence, trailing_separator)], long sentences wrapped at max_chars."""
+    pieces = []
+    for sentence, sep in _split_keep(text or "", _SENTENCE_END):
+        wrapped = _hard_wrap(sentence, max_chars)
+        wrapped[-1] = (wrapped[-1][0], wrapped[-1][1] + sep)
+        pieces.extend(wrapped)
+    return [(body, sep) for body, sep in pieces if body or sep]
+
+
+def join_pieces(pieces) -> str:
+    return "".join(body + sep for body, sep in pieces)
+
+
+# A paragraph break is final once non-whitespace text follows it
+_PARAGRAPH_CLOSED = re.compile(r"[ \t]*\S")
+
+
+def _stream_cuts(text: str, final: bool):
+    """
+    Offsets in text where a chunk ends: before every heading line and after
+    every paragraph break. Only cuts that can no longer move as more text
+    arrives are returned (a heading line must be complete, a paragraph break
+    must be followed by text), unless final.
+    """
+    complete = text if final else text[:text.rfind("\n") + 1]
+    cuts = {match.start() for match in _HEADING.finditer(complete) if match.start() > 0}
+    for match in _PARAGRAPH_BREAK.finditer(text):
+        if _PARAGRAPH_CLOSED.match(text, match.end()):
+            cuts.add(match.end())
+    return sorted(cuts)
+
+
+class SectionAccumulator:
+    """
+    Collects streamed LLM deltas and releases every section / paragraph of
+    the answer as soon as it is complete. Used to translate / synthesize an
+    answer while it is still being generated.
+
+    Cut points depend only on the text, never on how the deltas arrived, so
+    the same answer always yields the same chunks and the translation and
+    TTS caches see identical keys across requests.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+
+    def _release(self, final: bool):
+        chunks = []
+        start = 0
+        for cut in _stream_cuts(self.buffer, final):
+            chunks.append(self.buffer[start:cut])
+            start = cut
+        if final:
+            chunks.append(self.buffer[start:])
+            start = len(self.buffer)
+        self.buffer = self.buffer[start:]
+        return [chunk for chunk in chunks if chunk.strip()]
+
+    def feed(self, delta: str):
+        """Returns the chunks completed by this delta (often none)."""
+        self.buffer += delta
+        return self._release(final=False)
+
+    def flush(self):
+        """Returns the remaining chunks once the stream has ended."""
+        return self._release(final=True)
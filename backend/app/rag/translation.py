@@ -0,0 +1,206 @@
+"""
+Translation service for answers and voice queries.
+
+- Google translator clients are reused per (thread, source, target)
+  instead of being built on every call
+- answers are split at every section and paragraph, long paragraphs also
+  at sentences (textsplit.py), and the pieces are translated concurrently
+- every translated piece is stored in a persistent SQLite LRU cache keyed
+  by (sha256(text), source, target), so recurring paragraphs such as the
+  disclaimer are only ever translated once per language
+"""
+
+import contextvars
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+from app.metrics import span
+from app.rag.textsplit import MAX_CHUNK_CHARS, split_markdown
+
+# --- CONFIG ---
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+TRANSLATION_CACHE_PATH = Path(
+    os.getenv("TRANSLATION_CACHE_PATH", PROJECT_ROOT / "cache" / "translations.sqlite3")
+)
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", "20000"))
+TRANSLATION_WORKERS = int(os.getenv("TRANSLATION_WORKERS", "4"))
+
+
+class TranslationCache:
+    """
+    Persistent LRU cache of translated pieces.
+
+    Rows carry a last-used timestamp; once the table grows past max_entries
+    the least recently used rows are deleted.
+    """
+
+    def __init__(self, path: Path = TRANSLATION_CACHE_PATH, max_entries: int = TRANSLATION_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " key TEXT PRIMARY KEY, translated TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)"
+            )
+        return self._conn
+
+    @staticmethod
+    def key(text: str, source: str, target: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{digest}:{source}:{target}"
+
+    def get_many(self, keys):
+        """{key: translated} for the keys that are cached (and marks them used)."""
+        if not keys:
+            return {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            conn = self._connection()
+            placeholders = ",".join("?" * len(unique))
+            rows = conn.execute(
+                f"SELECT key, translated FROM translations WHERE key IN ({placeholders})", unique
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE translations SET last_used = ? WHERE key = ?",
+                    [(time.time(), key) for key, _ in rows],
+                )
+                conn.commit()
+
+        found = dict(rows)
+        self.hits += sum(1 for key in keys if key in found)
+        self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, items):
+        """Store {key: translated}, evicting the least recently used rows if over capacity."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO translations (key, translated, last_used) VALUES (?, ?, ?)",
+                [(key, translated, now) for key, translated in items.items()],
+            )
+            (count,) = conn.execute("SELECT COUNT(*) FROM translations").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM translations WHERE key IN ("
+                    " SELECT key FROM translations ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class TranslationService:
+    """Chunked, cached, concurrent translation on top of deep_translator."""
+
+    def __init__(self, cache: TranslationCache = None, workers: int = TRANSLATION_WORKERS, max_chunk_chars: int = MAX_CHUNK_CHARS):
+        self.cache = cache
+        self.max_chunk_chars = max_chunk_chars
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="translate")
+        self._local = threading.local()
+
+        self.requests = 0
+        self.failures = 0
+
+    def _client(self, source: str, target: str):
+        """One GoogleTranslator per (thread, language pair); the client is not thread-safe."""
+        clients = getattr(self._local, "clients", None)
+        if clients is None:
+            clients = self._local.clients = {}
+
+        client = clients.get((source, target))
+        if client is None:
+            from deep_translator import GoogleTranslator
+
+            client = clients[(source, target)] = GoogleTranslator(source=source, target=target)
+        return client
+
+    def _translate_piece(self, text: str, source: str, target: str):
+        """Translated text, or None if the provider failed (the caller keeps the original)."""
+        self.requests += 1
+        try:
+            with span("translate_request"):
+                translated = self._client(source, target).translate(text)
+        except Exception as e:
+            self.failures += 1
+            print(f"⚠️ Translation error: {e}")
+            return None
+        return translated or None
+
+    def translate(self, text: str, source: str, target: str) -> str:
+        """
+        Translate text, preserving its section and paragraph layout.
+        Pieces that fail to translate are left in the source language.
+        """
+        if source == target or not text or not text.strip():
+            return text
+
+        pieces = split_markdown(text, self.max_chunk_chars)
+        keys = [TranslationCache.key(body, source, target) for body, _ in pieces]
+        translated = self.cache.get_many(keys) if self.cache else {}
+
+        pending = {}
+        for key, (body, _) in zip(keys, pieces):
+            if key not in translated and key not in pending and body.strip():
+                pending[key] = body
+
+        if pending:
+            futures = {
+                # copy_context: translate_request spans count towards the calling request
+                key: self._executor.submit(contextvars.copy_context().run, self._translate_piece, body, source, target)
+                for key, body in pending.items()
+            }
+            fresh = {key: future.result() for key, future in futures.items()}
+            fresh = {key: value for key, value in fresh.items() if value is not None}
+            if self.cache:
+                self.cache.put_many(fresh)
+            translated.update(fresh)
+
+        return "".join(
+            translated.get(key, body) + sep
+            for key, (body, sep) in zip(keys, pieces)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "cache": self.cache.stats() if self.cache else None,
+        }
+
+
+@lru_cache(maxsize=1)
+def get_translation_service() -> TranslationService:
+    """Process-wide translation service with the persistent cache."""
+    return TranslationService(cache=TranslationCache())
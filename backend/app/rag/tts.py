@@ -0,0 +1,204 @@
+"""
+Chunked text-to-speech with a content-addressed audio cache.
+
+The answer is split into lines and sentences (textsplit.py). Sentences are
+synthesized in parallel with gTTS, and the MP3 segments are yielded in order
+as soon as each is ready. MP3 frames concatenate cleanly, so a client can
+start playing the first sentence while later ones are still being
+synthesized.
+
+Each sentence is cached on disk under sha256(lang + text). Sentences are
+never packed together, so a recurring sentence (the 1930 helpline
+instructions, the disclaimer) has the same key whatever precedes it and is
+synthesized once per language.
+"""
+
+import contextvars
+import hashlib
+import io
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+from app.metrics import span
+from app.rag.textsplit import split_sentences
+
+# --- CONFIG ---
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+TTS_CACHE_DIR = Path(os.getenv("TTS_CACHE_DIR", PROJECT_ROOT / "cache" / "tts"))
+TTS_CACHE_MAX_MB = int(os.getenv("TTS_CACHE_MAX_MB", "512"))
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "4"))
+TTS_SEGMENT_CHARS = 400     # longer sentences are wrapped at this length
+PRUNE_EVERY_WRITES = 200
+
+_MARKDOWN = re.compile(r"[*_`#>|]+")
+_SPACES = re.compile(r"[ \t]+")
+
+
+def speakable(text: str) -> str:
+    """Strip Markdown markers that gTTS would otherwise read out."""
+    return _SPACES.sub(" ", _MARKDOWN.sub(" ", text or "")).strip()
+
+
+def speech_segments(text: str, max_chars: int = TTS_SEGMENT_CHARS):
+    """
+    Speakable sentences of at most max_chars, in reading order.
+    Lines (headings, list items) are split first, so a segment's text, and
+    therefore its cache key, does not depend on its neighbours.
+    """
+    segments = []
+    for line in (text or "").splitlines():
+        for sentence, _ in split_sentences(speakable(line), max_chars):
+            sentence = sentence.strip()
+            if sentence:
+                segments.append(sentence)
+    return segments
+
+
+class AudioCache:
+    """
+    MP3 segments on disk, addressed by sha256 of (lang, text).
+
+    Hits refresh the file's mtime; when the directory grows past max_bytes
+    the least recently used files are removed.
+    """
+
+    def __init__(self, cache_dir: Path = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, text: str, lang: str) -> Path:
+        digest = hashlib.sha256(f"{lang}\0{text}".encode("utf-8")).hexdigest()
+        return self.cache_dir / digest[:2] / f"{digest}.mp3"
+
+    def get(self, text: str, lang: str):
+        path = self._path(text, lang)
+        try:
+            audio = path.read_bytes()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass    # pruned by another worker after the read; the audio is still good
+        self.hits += 1
+        return audio
+
+    def put(self, text: str, lang: str, audio: bytes):
+        path = self._path(text, lang)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename so concurrent readers never see a partial file
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(audio)
+        tmp_path.replace(path)
+
+        with self._lock:
+            self._writes += 1
+            if self._writes % PRUNE_EVERY_WRITES == 0:
+                self.prune()
+
+    def prune(self):
+        """Delete least recently used segments until the cache fits max_bytes."""
+        files = []
+        for path in self.cache_dir.glob("*/*.mp3"):
+            try:
+                files.append((path.stat(), path))
+            except FileNotFoundError:
+                continue
+        total = sum(stat.st_size for stat, _ in files)
+        for stat, path in sorted(files, key=lambda item: item[0].st_mtime):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "dir": str(self.cache_dir),
+            "max_mb": self.max_bytes // (1024 * 1024),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SpeechSynthesizer:
+    """Parallel, cached gTTS synthesis of sentence segments."""
+
+    def __init__(self, cache: AudioCache = None, workers: int = TTS_WORKERS):
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts")
+
+        self.segments = 0
+        self.failures = 0
+
+    def synthesize_segment(self, text: str, lang: str) -> bytes:
+        """MP3 bytes for one segment (b"" if gTTS fails)."""
+        if self.cache:
+            audio = self.cache.get(text, lang)
+            if audio is not None:
+                return audio
+
+        self.segments += 1
+        try:
+            from gtts import gTTS
+
+            buffer = io.BytesIO()
+            with span("tts_segment"):
+                gTTS(text=text, lang=lang, slow=False).write_to_fp(buffer)
+            audio = buffer.getvalue()
+        except Exception as e:
+            self.failures += 1
+            print(f"⚠️ TTS error: {e}")
+            return b""
+
+        if self.cache and audio:
+            self.cache.put(text, lang, audio)
+        return audio
+
+    def iter_audio(self, text: str, lang: str = "en"):
+        """
+        Yield MP3 bytes per segment, in reading order.
+        All segments are submitted up front, so later ones synthesize while
+        earlier ones are being sent.
+        """
+        futures = [
+            self._executor.submit(contextvars.copy_context().run, self.synthesize_segment, segment, lang)
+            for segment in speech_segments(text)
+        ]
+        try:
+            for future in futures:
+                audio = future.result()
+                if audio:
+                    yield audio
+        finally:
+            # Client went away: don't synthesize what nobody will hear
+            for future in futures:
+                future.cancel()
+
+    def synthesize(self, text: str, lang: str = "en") -> bytes:
+        """The whole text as one MP3."""
+        return b"".join(self.iter_audio(text, lang))
+
+    def stats(self) -> dict:
+        return {
+            "synthesized_segments": self.segments,
+            "failures": self.failures,
+            "cache": self.cache.stats() if self.cache else None,
+        }
+
+
+@lru_cache(maxsize=1)
+def get_synthesizer() -> SpeechSynthesizer:
+    """Process-wide synthesizer with the on-disk audio cache."""
+    return SpeechSynthesizer(cache=AudioCache())
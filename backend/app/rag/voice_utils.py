@@ -2,27 +2,36 @@
 Voice Processing Utilities for Multilingual RAG
 
 Provides:
-- Speech-to-Text using OpenAI Whisper (cached model)
+- Speech-to-Text using OpenAI Whisper or faster-whisper (cached models,
+  silence trimmed before transcription)
 - Text translation using deep_translator
-- Text-to-Speech using gTTS with base64 encoding
+- Text-to-Speech using gTTS (chunked + cached, see tts.py) with base64 encoding
 """
 
 import os
-import io
 import base64
-import tempfile
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 from pathlib import Path
 
+import numpy as np
+
+from app.metrics import observe
+from app.rag.audio import decode_audio, trim_silence, SAMPLE_RATE, StreamDecoder, VAD_ENABLED
+from app.rag.textsplit import SectionAccumulator
+from app.rag.translation import get_translation_service
+from app.rag.tts import get_synthesizer
+
 # Add local ffmpeg to PATH for Windows
 PROJECT_ROOT = Path(__file__).resolve().parents[3]
 FFMPEG_BIN = PROJECT_ROOT / "backend" / "ffmpeg_tool" / "ffmpeg-8.0.1-essentials_build" / "bin"
 if FFMPEG_BIN.exists():
     os.environ["PATH"] += os.pathsep + str(FFMPEG_BIN)
 
-import whisper
-from deep_translator import GoogleTranslator
-from gtts import gTTS
+# whisper (torch), deep_translator and gTTS are imported on first use so that
+# text-only workers never pay for them.
 
 
 # -----------------------------
@@ -39,41 +48,116 @@ LANGUAGE_CODES = {
 # -----------------------------
 # WHISPER MODEL (CACHED)
 # -----------------------------
-@lru_cache(maxsize=1)
-def get_whisper_model():
+# "openai" (openai-whisper, PyTorch) or "faster" (faster-whisper: CTranslate2
+# with int8 weights, several times faster on CPU)
+WHISPER_BACKEND = os.getenv("WHISPER_BACKEND", "openai").lower()
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+
+# Per-language model tier, e.g. WHISPER_MODEL_EN=tiny.en for fast English
+# while Indic languages keep the multilingual model
+WHISPER_MODELS = {
+    code: os.getenv(f"WHISPER_MODEL_{code.upper()}", WHISPER_MODEL)
+    for code in ("en", "hi", "kn", "ta")
+}
+
+WHISPER_STATE = {"state": "not_loaded", "load_seconds": None, "error": None, "backend": WHISPER_BACKEND, "models": []}
+
+
+def get_whisper_model(model_name: str = WHISPER_MODEL, backend: str = WHISPER_BACKEND):
     """
-    Load and cache the Whisper model.
-    Using 'base' model for balance of speed and accuracy.
+    Load and cache a Whisper model.
+    Defaults to 'base' for balance of speed and accuracy; each
+    (model, backend) pair is loaded once.
     """
-    print("🎙️ Loading Whisper model (base)...")
-    model = whisper.load_model("base")
+    return _load_whisper_model(model_name, backend)
+
+
+@lru_cache(maxsize=4)
+def _load_whisper_model(model_name: str, backend: str):
+    WHISPER_STATE["state"] = "loading"
+    started = time.perf_counter()
+
+    try:
+        print(f"🎙️ Loading Whisper model ({model_name}, {backend})...")
+        if backend == "faster":
+            from faster_whisper import WhisperModel
+
+            model = WhisperModel(model_name, device="cpu", compute_type=WHISPER_COMPUTE_TYPE)
+        else:
+            import whisper
+
+            model = whisper.load_model(model_name)
+    except Exception as e:
+        WHISPER_STATE.update(state="error", error=str(e))
+        raise
+
+    WHISPER_STATE.update(
+        state="ready",
+        load_seconds=round(time.perf_counter() - started, 3),
+        error=None,
+    )
+    WHISPER_STATE["models"].append(model_name)
     print("✅ Whisper model loaded and cached!")
     return model
 
 
+def voice_health() -> dict:
+    """Whisper load state (does not trigger a load)."""
+    return {**WHISPER_STATE, "models": list(WHISPER_STATE["models"])}
+
+
 # -----------------------------
 # SPEECH-TO-TEXT
 # -----------------------------
-def transcribe_audio(audio_file_path: str, language: str = None) -> str:
+def transcribe_audio(audio, language: str = None, timings: dict = None) -> str:
     """
-    Transcribe audio file to text using Whisper.
+    Transcribe audio to text using Whisper.
     
     Args:
-        audio_file_path: Path to the audio file
-        language: Optional language hint (e.g., 'en', 'hi', 'kn', 'ta')
+        audio: Encoded upload bytes (decoded in memory through an ffmpeg pipe),
+            a StreamDecoder fed from the request stream, a 16 kHz float32
+            array, or a path to an audio file
+        language: Optional language hint (e.g., 'en', 'hi', 'kn', 'ta');
+            also selects the model tier from WHISPER_MODELS
+        timings: Optional dict that receives per-stage seconds
+            (decode, vad, transcribe) and audio / speech durations
     
     Returns:
         Transcribed text string
     """
-    model = get_whisper_model()
-    
+    timings = timings if timings is not None else {}
+
+    if isinstance(audio, (bytes, bytearray, StreamDecoder)):
+        started = time.perf_counter()
+        audio = audio.finish() if isinstance(audio, StreamDecoder) else decode_audio(bytes(audio))
+        timings["decode"] = round(time.perf_counter() - started, 3)
+
+    if isinstance(audio, np.ndarray):
+        timings["audio_seconds"] = round(len(audio) / SAMPLE_RATE, 2)
+        if VAD_ENABLED:
+            started = time.perf_counter()
+            audio = trim_silence(audio)
+            timings["vad"] = round(time.perf_counter() - started, 3)
+        timings["speech_seconds"] = round(len(audio) / SAMPLE_RATE, 2)
+
     # Whisper options
-    options = {}
-    if language and language in ["en", "hi", "kn", "ta"]:
-        options["language"] = language
-    
-    result = model.transcribe(audio_file_path, **options)
-    return result["text"].strip()
+    if not (language and language in ["en", "hi", "kn", "ta"]):
+        language = None
+    model = get_whisper_model(WHISPER_MODELS.get(language, WHISPER_MODEL))
+
+    started = time.perf_counter()
+    if WHISPER_BACKEND == "faster":
+        segments, _ = model.transcribe(audio, language=language, beam_size=1)
+        text = "".join(segment.text for segment in segments)
+    else:
+        options = {"fp16": False}   # CPU inference; avoids the fp16 fallback warning
+        if language:
+            options["language"] = language
+        text = model.transcribe(audio, **options)["text"]
+    timings["transcribe"] = round(time.perf_counter() - started, 3)
+
+    return text.strip()
 
 
 # -----------------------------
@@ -82,6 +166,9 @@ def transcribe_audio(audio_file_path: str, language: str = None) -> str:
 def translate_text(text: str, source_lang: str, target_lang: str) -> str:
     """
     Translate text between languages using Google Translator.
+
+    Goes through the shared translation service (translation.py), which
+    splits long text, translates the pieces concurrently and caches them.
     
     Args:
         text: Text to translate
@@ -89,21 +176,9 @@ def translate_text(text: str, source_lang: str, target_lang: str) -> str:
         target_lang: Target language code
     
     Returns:
-        Translated text string
+        Translated text string (the original on failure)
     """
-    if source_lang == target_lang:
-        return text
-    
-    if not text or not text.strip():
-        return text
-    
-    try:
-        translator = GoogleTranslator(source=source_lang, target=target_lang)
-        translated = translator.translate(text)
-        return translated if translated else text
-    except Exception as e:
-        print(f"⚠️ Translation error: {e}")
-        return text  # Fallback to original text
+    return get_translation_service().translate(text, source_lang, target_lang)
 
 
 def translate_to_english(text: str, source_lang: str) -> str:
@@ -122,6 +197,9 @@ def translate_from_english(text: str, target_lang: str) -> str:
 def text_to_speech_base64(text: str, lang_code: str = "en") -> str:
     """
     Convert text to speech and return as base64 encoded MP3.
+
+    Sentences are synthesized in parallel and cached (see tts.py).
+    Prefer POST /tts, which streams the same audio without the base64 overhead.
     
     Args:
         text: Text to convert to speech
@@ -132,44 +210,56 @@ def text_to_speech_base64(text: str, lang_code: str = "en") -> str:
     """
     if not text or not text.strip():
         return ""
-    
-    try:
-        # Generate TTS audio
-        tts = gTTS(text=text, lang=lang_code, slow=False)
-        
-        # Save to bytes buffer
-        audio_buffer = io.BytesIO()
-        tts.write_to_fp(audio_buffer)
-        audio_buffer.seek(0)
-        
-        # Encode to base64
-        audio_base64 = base64.b64encode(audio_buffer.read()).decode("utf-8")
-        
-        return audio_base64
-    
-    except Exception as e:
-        print(f"⚠️ TTS error: {e}")
-        return ""
+
+    audio = get_synthesizer().synthesize(text, lang_code)
+    return base64.b64encode(audio).decode("utf-8") if audio else ""
+
+
+# -----------------------------
+# SPEECH STAGES (TRANSLATE + TTS)
+# -----------------------------
+VOICE_STAGE_WORKERS = int(os.getenv("VOICE_STAGE_WORKERS", "4"))
+
+_stage_executor = ThreadPoolExecutor(max_workers=VOICE_STAGE_WORKERS, thread_name_prefix="voice-stage")
+
+
+def render_speech_chunk(text: str, translator_lang: str, gtts_lang: str, include_audio: bool = True):
+    """
+    Steps D + E for one chunk of the English answer.
+    Returns (native_text, mp3_bytes); mp3_bytes is b"" without audio.
+    """
+    native = translate_from_english(text, translator_lang) if translator_lang != "en" else text
+    audio = get_synthesizer().synthesize(native, gtts_lang) if include_audio else b""
+    return native, audio
 
 
 # -----------------------------
 # FULL PIPELINE HELPER
 # -----------------------------
 def process_voice_query(
-    audio_file_path: str,
+    audio,
     target_language: str,
-    rag_function
+    rag_function=None,
+    include_audio: bool = True,
+    rag_stream=None
 ) -> dict:
     """
     Full voice query processing pipeline.
     
     Args:
-        audio_file_path: Path to recorded audio file
+        audio: Recorded audio (upload bytes, StreamDecoder, float32 array or file path)
         target_language: User's selected language ('english', 'hindi', 'kannada', 'tamil')
         rag_function: Function that takes English query and returns (answer, sources)
+        include_audio: Synthesize the answer inline; with False the client
+            streams it from POST /tts instead
+        rag_stream: Function that takes English query and yields answer events
+            (glue.iter_answer_question). When given, steps C-E run as a
+            pipeline: every completed chunk of the answer is translated and
+            synthesized while the LLM is still generating the rest.
     
     Returns:
-        dict with query_text_native, response_text_native, audio_base64
+        dict with query_text_native, response_text_native, audio_base64,
+        sources and per-stage timings (seconds)
     """
     # Get language codes
     lang_config = LANGUAGE_CODES.get(target_language.lower(), LANGUAGE_CODES["english"])
@@ -177,35 +267,115 @@ def process_voice_query(
     gtts_lang = lang_config["gtts"]
     translator_lang = lang_config["translator"]
     
+    timings = {}
+    pipeline_started = time.perf_counter()
+
     # Step A: Speech-to-Text (Native language)
-    native_query = transcribe_audio(audio_file_path, language=whisper_lang)
+    native_query = transcribe_audio(audio, language=whisper_lang, timings=timings)
     print(f"📝 Transcribed ({target_language}): {native_query}")
     
     # Step B: Translate to English (if needed)
+    started = time.perf_counter()
     if translator_lang != "en":
         english_query = translate_to_english(native_query, translator_lang)
         print(f"🔄 Translated to English: {english_query}")
+        timings["translate_query"] = round(time.perf_counter() - started, 3)
     else:
         english_query = native_query
+
+    if rag_stream is not None:
+        native_response, audio_bytes, sources = _pipelined_answer(
+            rag_stream, english_query, translator_lang, gtts_lang, include_audio, timings
+        )
+        audio_base64 = base64.b64encode(audio_bytes).decode("utf-8") if audio_bytes else ""
+    else:
+        native_response, audio_base64, sources = _sequential_answer(
+            rag_function, english_query, target_language, translator_lang, gtts_lang, include_audio, timings
+        )
+
+    timings["total"] = round(time.perf_counter() - pipeline_started, 3)
+    for stage, seconds in timings.items():
+        if not stage.endswith("_seconds"):     # audio lengths, not durations
+            observe(f"voice_{stage}", seconds)
+    print("⏱️ Voice timings: " + ", ".join(f"{stage}={value}" for stage, value in timings.items()))
     
+    return {
+        "query_text_native": native_query,
+        "response_text_native": native_response,
+        "audio_base64": audio_base64,
+        "sources": sources,  # Include sources for frontend display
+        "timings": timings
+    }
+
+
+def _sequential_answer(rag_function, english_query, target_language, translator_lang, gtts_lang, include_audio, timings):
+    """Steps C, D, E one after another on the complete answer."""
     # Step C: RAG Query
+    started = time.perf_counter()
     english_response, sources = rag_function(english_query)
+    timings["rag"] = round(time.perf_counter() - started, 3)
     print(f"🤖 RAG Response: {english_response[:100]}...")
     
     # Step D: Translate response back to Native (if needed)
+    started = time.perf_counter()
     if translator_lang != "en":
         native_response = translate_from_english(english_response, translator_lang)
         print(f"🔄 Translated to {target_language}: {native_response[:100]}...")
+        timings["translate_answer"] = round(time.perf_counter() - started, 3)
     else:
         native_response = english_response
     
     # Step E: Text-to-Speech
-    audio_base64 = text_to_speech_base64(native_response, gtts_lang)
-    print(f"🔊 Generated audio ({len(audio_base64)} chars base64)")
-    
-    return {
-        "query_text_native": native_query,
-        "response_text_native": native_response,
-        "audio_base64": audio_base64,
-        "sources": sources  # Include sources for frontend display
-    }
+    started = time.perf_counter()
+    if include_audio:
+        audio_base64 = text_to_speech_base64(native_response, gtts_lang)
+        print(f"🔊 Generated audio ({len(audio_base64)} chars base64)")
+        timings["tts"] = round(time.perf_counter() - started, 3)
+    else:
+        audio_base64 = ""
+
+    return native_response, audio_base64, sources
+
+
+def _pipelined_answer(rag_stream, english_query, translator_lang, gtts_lang, include_audio, timings):
+    """
+    Steps C -> D -> E as a streaming stage graph.
+
+    LLM deltas are cut into sections / paragraphs (textsplit.SectionAccumulator);
+    each is handed to the stage pool (translate, then TTS) as soon as it is
+    complete, and the results are assembled in answer order. Only the last
+    chunk's translation + TTS remains after generation ends.
+    """
+    started = time.perf_counter()
+    accumulator = SectionAccumulator()
+    futures = []
+    sources = []
+    english_parts = []
+
+    def submit(chunks):
+        for chunk in chunks:
+            # copy_context: stage spans count towards the calling request
+            futures.append(_stage_executor.submit(
+                contextvars.copy_context().run, render_speech_chunk, chunk, translator_lang, gtts_lang, include_audio
+            ))
+
+    # Step C: RAG Query (streamed), feeding D + E per chunk
+    for event in rag_stream(english_query):
+        if event["type"] == "sources":
+            sources = event["sources"]
+        elif event["type"] == "token":
+            timings.setdefault("first_token", round(time.perf_counter() - started, 3))
+            english_parts.append(event["content"])
+            submit(accumulator.feed(event["content"]))
+    submit(accumulator.flush())
+    timings["rag"] = round(time.perf_counter() - started, 3)
+    print(f"🤖 RAG Response: {''.join(english_parts)[:100]}...")
+
+    # Steps D + E finish for the trailing chunks, assembled in order
+    rendered = [future.result() for future in futures]
+    native_response = "".join(native for native, _ in rendered)
+    audio_bytes = b"".join(audio for _, audio in rendered)
+    timings["speech_after_rag"] = round(time.perf_counter() - started - timings["rag"], 3)
+    print(f"🔊 Pipelined {len(rendered)} chunks ({len(audio_bytes)} bytes audio)")
+
+    return native_response, audio_bytes, sources
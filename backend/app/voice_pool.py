@@ -0,0 +1,135 @@
+"""
+Bounded worker pool for blocking voice work.
+
+The voice pipeline (Whisper, translation, LLM, gTTS) is fully synchronous.
+Running it on a dedicated pool keeps the event loop free for text chat, and
+the bounded queue makes overload visible (503 + Retry-After) instead of
+letting requests pile up.
+"""
+
+import asyncio
+import contextvars
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PoolSaturatedError(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Voice processing queue is full")
+        self.retry_after = retry_after
+
+
+class BoundedWorkerPool:
+    """
+    Thread pool with a concurrency limit and a bounded wait queue.
+
+    At most max_workers jobs run at once and at most max_queue jobs wait;
+    anything beyond that is rejected immediately with PoolSaturatedError.
+    """
+
+    def __init__(self, name: str, max_workers: int = 2, max_queue: int = 8):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+
+        self._pending = 0      # queued + running
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._last_wait = 0.0
+        self._service_total = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._pending - self._running
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up, from the average job time."""
+        finished = self.completed + self.failed
+        avg_service = self._service_total / finished if finished else 10.0
+        waves = (self.queue_depth + 1) / self.max_workers
+        return max(1, math.ceil(avg_service * waves))
+
+    def _reserve(self):
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise PoolSaturatedError(self.retry_after())
+            self._pending += 1
+
+    def _job(self, submitted: float, fn, args, kwargs):
+        started = time.perf_counter()
+        wait = started - submitted
+
+        with self._lock:
+            self._running += 1
+            self._last_wait = wait
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+
+        succeeded = False
+        try:
+            result = fn(*args, **kwargs)
+            succeeded = True
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._pending -= 1
+                if succeeded:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._service_total += time.perf_counter() - started
+
+        return result
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the pool and await its result."""
+        self._reserve()
+        # Carry the request context (metrics spans) into the worker thread
+        context = contextvars.copy_context()
+        future = self._executor.submit(context.run, self._job, time.perf_counter(), fn, args, kwargs)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self.completed + self.failed + self._running
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queue_depth": self.queue_depth,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "last_wait_seconds": round(self._last_wait, 4),
+                "avg_wait_seconds": round(self._wait_total / started, 4) if started else 0.0,
+                "max_wait_seconds": round(self._wait_max, 4),
+            }
+
+
+# --- SHARED INSTANCE ---
+voice_pool = BoundedWorkerPool(
+    "voice",
+    max_workers=int(os.getenv("VOICE_WORKERS", "2")),
+    max_queue=int(os.getenv("VOICE_QUEUE_SIZE", "8")),
+)
+
+# Interim /ws/voice transcripts: one worker and no queue, so a partial is
+# skipped rather than queued and never takes a /process-audio slot
+partial_pool = BoundedWorkerPool(
+    "voice-partial",
+    max_workers=int(os.getenv("VOICE_PARTIAL_WORKERS", "1")),
+    max_queue=0,
+)
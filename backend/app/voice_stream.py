@@ -0,0 +1,331 @@
+"""
+Real-time voice sessions over WebSocket (/ws/voice).
+
+The client streams audio while the user speaks; the server decodes it
+incrementally (one long-lived ffmpeg per session for webm), sends interim
+transcripts, detects the end of the utterance, and then streams the
+answer back as text and audio while the LLM is still generating.
+
+Interim transcripts only re-transcribe the current window of at most
+VOICE_PARTIAL_WINDOW seconds; once a window is full its text is frozen and
+the next window starts, so the cost stays linear in the utterance length.
+They run on their own single-worker pool (voice_pool.partial_pool) and are
+skipped while the previous one is still running, so they never take a
+/process-audio slot. The final transcript is one pass over the whole
+utterance.
+
+Protocol (JSON text frames unless noted):
+
+client -> server
+    {"type": "start", "language": "hindi", "format": "webm", "top_k": 5}
+    <binary>  audio chunks: "webm" (MediaRecorder output, any ffmpeg-readable
+              container) or "pcm16" (raw 16 kHz mono s16le)
+    {"type": "end"}   optional; the server also ends on trailing silence
+
+server -> client
+    {"type": "ready"}
+    {"type": "partial", "text": "..."}       while the user is speaking
+    {"type": "transcript", "text": "..."}    final native-language query
+    {"type": "sources", "sources": [...]}
+    {"type": "token", "content": "..."}      English answers, as generated
+    {"type": "text", "content": "..."}       translated answer, section by section
+    <binary>  MP3 segments, in order; concatenate or queue for playback
+    {"type": "done", "timings": {...}}
+    {"type": "error", "detail": "..."}
+"""
+
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.rag.audio import (
+    AudioDecodeError, AudioTooLargeError, MAX_AUDIO_SECONDS, MAX_UPLOAD_BYTES, SAMPLE_RATE,
+    StreamDecoder, trailing_silence,
+)
+from app.rag.glue import stream_answer_question
+from app.rag.textsplit import SectionAccumulator
+from app.rag.voice_utils import (
+    LANGUAGE_CODES, render_speech_chunk, transcribe_audio, translate_to_english,
+)
+from app.voice_pool import partial_pool, voice_pool, PoolSaturatedError
+
+# --- CONFIG ---
+PARTIAL_INTERVAL_SECONDS = float(os.getenv("VOICE_PARTIAL_INTERVAL", "1.5"))
+PARTIAL_WINDOW_SECONDS = float(os.getenv("VOICE_PARTIAL_WINDOW", "10"))   # longest audio re-transcribed per partial
+ENDPOINT_SILENCE_SECONDS = float(os.getenv("VOICE_ENDPOINT_SILENCE", "0.8"))
+ENDPOINT_CHECK_SECONDS = 0.2
+ENDPOINT_WINDOW_SECONDS = 5.0       # recent audio the trailing-silence check looks at
+MIN_PARTIAL_SECONDS = 0.5
+AUDIO_FORMATS = ("webm", "pcm16")
+
+
+class SpeechPipeline:
+    """
+    Translates and synthesizes answer chunks as they are submitted.
+
+    Each chunk starts rendering immediately (overlapping generation of the
+    next chunks); results() yields (native_text, mp3_bytes) in submission order.
+    """
+
+    def __init__(self, translator_lang: str, gtts_lang: str):
+        self.translator_lang = translator_lang
+        self.gtts_lang = gtts_lang
+        self._queue = asyncio.Queue()
+        self._tasks = []
+
+    async def _render(self, text: str):
+        return await asyncio.to_thread(render_speech_chunk, text, self.translator_lang, self.gtts_lang)
+
+    def submit(self, text: str):
+        task = asyncio.create_task(self._render(text))
+        self._tasks.append(task)
+        self._queue.put_nowait(task)
+
+    def close(self):
+        self._queue.put_nowait(None)
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+
+    async def results(self):
+        while True:
+            task = await self._queue.get()
+            if task is None:
+                return
+            yield await task
+
+
+class VoiceSession:
+    """One utterance: receive audio, transcribe, stream the answer back."""
+
+    def __init__(self, websocket: WebSocket, language: str, audio_format: str, top_k: int):
+        self.websocket = websocket
+        self.language = language
+        self.audio_format = audio_format
+        self.top_k = top_k
+
+        lang_config = LANGUAGE_CODES[language]
+        self.whisper_lang = lang_config["whisper"]
+        self.translator_lang = lang_config["translator"]
+        self.gtts_lang = lang_config["gtts"]
+
+        self.buffer = bytearray()       # pcm16 input
+        self._decoder = StreamDecoder(low_latency=True) if audio_format == "webm" else None
+        self.bytes_received = 0
+        self.endpointed = False
+        self.timings = {}
+        self._partial_task = None
+        self._partial_texts = []        # frozen transcripts of completed windows
+        self._window_start = 0          # first sample of the current window
+        self._send_lock = asyncio.Lock()
+
+    def close(self):
+        if self._decoder is not None:
+            self._decoder.close()
+
+    # ---- sending ----
+    async def send_json(self, message: dict):
+        async with self._send_lock:
+            await self.websocket.send_json(message)
+
+    async def send_bytes(self, data: bytes):
+        async with self._send_lock:
+            await self.websocket.send_bytes(data)
+
+    # ---- audio ----
+    async def _add_audio(self, data: bytes):
+        self.bytes_received += len(data)
+        if self.bytes_received > MAX_UPLOAD_BYTES:
+            raise AudioTooLargeError(f"Audio exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+        if self._decoder is not None:
+            await asyncio.to_thread(self._decoder.feed, data)
+        else:
+            self.buffer.extend(data)
+
+    def _n_samples(self) -> int:
+        if self._decoder is not None:
+            return self._decoder.decoded_samples
+        return len(self.buffer) // 2
+
+    def _samples(self, start: int = 0):
+        """16 kHz float32 samples decoded so far, from sample offset start."""
+        if self._decoder is not None:
+            return self._decoder.samples(start)
+        end = len(self.buffer) // 2
+        if end > MAX_AUDIO_SECONDS * SAMPLE_RATE:
+            raise AudioTooLargeError(f"Audio is longer than {MAX_AUDIO_SECONDS:g} seconds")
+        return np.frombuffer(bytes(self.buffer[2 * start:2 * end]), np.int16).astype(np.float32) / 32768.0
+
+    async def decode(self):
+        """The whole utterance as a 16 kHz float32 array."""
+        if self._decoder is None:
+            return self._samples()
+        if not self.bytes_received:
+            raise AudioDecodeError("Empty audio upload")
+        return await asyncio.to_thread(self._decoder.finish)
+
+    async def _partial(self):
+        """Interim transcript: frozen windows + the current window."""
+        start = self._window_start
+        samples = self._samples(start)
+        if len(samples) < MIN_PARTIAL_SECONDS * SAMPLE_RATE:
+            return
+
+        try:
+            text = await partial_pool.run(transcribe_audio, samples, self.whisper_lang)
+        except PoolSaturatedError:
+            return      # interim results are best-effort
+        text = (text or "").strip()
+
+        current = text
+        if len(samples) >= PARTIAL_WINDOW_SECONDS * SAMPLE_RATE:
+            # Window full: freeze its text; later partials only transcribe what follows
+            self._partial_texts.append(text)
+            self._window_start = start + len(samples)
+            current = ""
+
+        full = " ".join(part for part in self._partial_texts + [current] if part)
+        if full and not self.endpointed:
+            await self.send_json({"type": "partial", "text": full})
+
+    async def _receive(self):
+        """Read client messages until "end"."""
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            if message.get("bytes"):
+                await self._add_audio(message["bytes"])
+            elif message.get("text") and json.loads(message["text"]).get("type") == "end":
+                return
+
+    async def _watch(self):
+        """
+        Runs on its own timer, independent of incoming messages: checks the
+        recent audio for the end of speech every ENDPOINT_CHECK_SECONDS and
+        starts an interim transcript every PARTIAL_INTERVAL_SECONDS (unless
+        the previous one is still running). Returns at the endpoint.
+        """
+        recent = int(ENDPOINT_WINDOW_SECONDS * SAMPLE_RATE)
+        last_partial = time.monotonic()
+        while True:
+            await asyncio.sleep(ENDPOINT_CHECK_SECONDS)
+            total = self._n_samples()
+            silence = trailing_silence(self._samples(max(0, total - recent)))
+            if silence is not None and silence >= ENDPOINT_SILENCE_SECONDS:
+                return
+
+            idle = self._partial_task is None or self._partial_task.done()
+            if idle and time.monotonic() - last_partial >= PARTIAL_INTERVAL_SECONDS:
+                if self._partial_task is not None:
+                    self._partial_task.result()     # surface errors (e.g. too long)
+                last_partial = time.monotonic()
+                self._partial_task = asyncio.create_task(self._partial())
+
+    async def receive_audio(self):
+        """Collect audio until the client sends "end" or trailing silence is detected."""
+        receiver = asyncio.create_task(self._receive())
+        watcher = asyncio.create_task(self._watch())
+        try:
+            done, _ = await asyncio.wait({receiver, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.endpointed = True
+            for task in (receiver, watcher, self._partial_task):
+                if task is not None:
+                    task.cancel()
+        for task in done:
+            task.result()
+
+    # ---- answer ----
+    async def _send_speech(self, pipeline: SpeechPipeline, started: float):
+        async for native_text, audio in pipeline.results():
+            if self.translator_lang != "en":
+                await self.send_json({"type": "text", "content": native_text})
+            if audio:
+                self.timings.setdefault("first_audio", round(time.perf_counter() - started, 3))
+                await self.send_bytes(audio)
+
+    async def answer(self, english_query: str, started: float):
+        pipeline = SpeechPipeline(self.translator_lang, self.gtts_lang)
+        sender = asyncio.create_task(self._send_speech(pipeline, started))
+        accumulator = SectionAccumulator()
+
+        try:
+            async for event in stream_answer_question(english_query, self.top_k):
+                if event["type"] == "sources":
+                    await self.send_json(event)
+                elif event["type"] == "token":
+                    self.timings.setdefault("first_token", round(time.perf_counter() - started, 3))
+                    if self.translator_lang == "en":
+                        await self.send_json(event)
+                    for chunk in accumulator.feed(event["content"]):
+                        pipeline.submit(chunk)
+
+            for chunk in accumulator.flush():
+                pipeline.submit(chunk)
+            pipeline.close()
+            await sender
+        except BaseException:
+            sender.cancel()
+            pipeline.cancel()
+            raise
+
+    async def run(self):
+        await self.send_json({"type": "ready"})
+        await self.receive_audio()
+
+        # Everything below is on the critical path after the user stops speaking
+        started = time.perf_counter()
+        samples = await self.decode()
+        native_query = await voice_pool.run(transcribe_audio, samples, self.whisper_lang, self.timings)
+        await self.send_json({"type": "transcript", "text": native_query})
+
+        english_query = native_query
+        if self.translator_lang != "en":
+            english_query = await asyncio.to_thread(translate_to_english, native_query, self.translator_lang)
+
+        await self.answer(english_query, started)
+        self.timings["total"] = round(time.perf_counter() - started, 3)
+        await self.send_json({"type": "done", "timings": self.timings})
+
+
+async def voice_session(websocket: WebSocket):
+    """Entry point for the /ws/voice route."""
+    await websocket.accept()
+    try:
+        start = await websocket.receive_json()
+        language = str(start.get("language", "english")).lower()
+        audio_format = str(start.get("format", "webm")).lower()
+        if start.get("type") != "start" or language not in LANGUAGE_CODES or audio_format not in AUDIO_FORMATS:
+            await websocket.send_json({
+                "type": "error",
+                "detail": f"Expected a start message; languages: {', '.join(LANGUAGE_CODES)}, "
+                          f"formats: {', '.join(AUDIO_FORMATS)}",
+            })
+            await websocket.close(code=1008)
+            return
+
+        session = VoiceSession(websocket, language, audio_format, int(start.get("top_k", 5)))
+        try:
+            await session.run()
+        finally:
+            session.close()
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        return
+
+    except (AudioTooLargeError, AudioDecodeError, PoolSaturatedError) as e:
+        detail = "Voice processing is at capacity, please retry shortly" if isinstance(e, PoolSaturatedError) else str(e)
+        await websocket.send_json({"type": "error", "detail": detail})
+        await websocket.close(code=1009 if isinstance(e, AudioTooLargeError) else 1011)
+
+    except Exception as e:
+        await websocket.send_json({"type": "error", "detail": f"Voice processing error: {str(e)}"})
+        await websocket.close(code=1011)
@@ -0,0 +1,150 @@
+"""
+Synthetic case corpus in the data/cases.json schema.
+
+    {"<category>": [{"ids": [...], "metadatas": [{...}], "documents": [...]}, ...], ...}
+
+Cases are generated from templates with a fixed seed, so a given size is
+always the same corpus. About 10% of cases are near-duplicates of an
+earlier case (same incident, reworded location / amount), which is what
+the real dataset looks like and what MMR and the semantic cache react to.
+
+    python -m bench.corpus --sizes 1000 10000 --out /tmp/corpora
+"""
+
+import argparse
+import json
+import random
+from pathlib import Path
+
+CATEGORIES = {
+    "upi_fraud": {
+        "subcategories": ["fake payment link", "collect request scam", "QR code scam"],
+        "laws": ["Section 66D IT Act", "IPC 420", "BNS 318"],
+        "story": "The victim received a {hook} and lost Rs {amount} from their bank account via UPI.",
+        "hooks": ["payment link on WhatsApp", "UPI collect request", "QR code from a buyer on OLX"],
+    },
+    "account_hacking": {
+        "subcategories": ["social media takeover", "email compromise", "SIM swap"],
+        "laws": ["Section 66C IT Act", "Section 43 IT Act", "BNS 319"],
+        "story": "The attacker gained access through a {hook} and used the account to cheat contacts of Rs {amount}.",
+        "hooks": ["phishing login page", "leaked password", "SIM swap at a mobile store"],
+    },
+    "sextortion": {
+        "subcategories": ["video call blackmail", "morphed images"],
+        "laws": ["Section 67 IT Act", "Section 66E IT Act", "BNS 308"],
+        "story": "The accused used a {hook} to threaten the victim and demanded Rs {amount}.",
+        "hooks": ["recorded video call", "set of morphed photos", "fake dating profile"],
+    },
+    "loan_app_harassment": {
+        "subcategories": ["predatory lending app", "contact list harassment"],
+        "laws": ["Section 66E IT Act", "BNS 351", "IPC 384"],
+        "story": "A {hook} harvested the contact list and harassed relatives over a loan of Rs {amount}.",
+        "hooks": ["instant loan app", "unregistered lending app", "fake NBFC app"],
+    },
+    "job_fraud": {
+        "subcategories": ["registration fee scam", "task-based scam"],
+        "laws": ["Section 66D IT Act", "IPC 420", "BNS 318"],
+        "story": "The victim was offered a {hook} and paid Rs {amount} in fees before the recruiter disappeared.",
+        "hooks": ["work-from-home job", "overseas job offer", "paid review task on Telegram"],
+    },
+    "card_fraud": {
+        "subcategories": ["card cloning", "OTP phishing"],
+        "laws": ["Section 66C IT Act", "Section 66D IT Act", "IPC 420"],
+        "story": "Money was withdrawn after a {hook}; Rs {amount} was debited in several transactions.",
+        "hooks": ["skimmer at an ATM", "call from a fake bank officer", "SMS asking for the card PIN"],
+    },
+}
+CITIES = ["Mumbai", "Delhi", "Bengaluru", "Pune", "Hyderabad", "Chennai", "Kolkata", "Jaipur", "Lucknow", "Kochi"]
+OUTCOMES = [
+    "The police traced the beneficiary accounts and recovered part of the money.",
+    "An FIR was registered and the accused was arrested within two months.",
+    "The bank reversed the transactions after the complaint was filed on the portal.",
+    "The case is under investigation by the cyber cell.",
+]
+NEXT_STEPS = [
+    "Call the cybercrime helpline 1930 immediately",
+    "File a complaint on cybercrime.gov.in",
+    "Inform your bank and request a freeze on the account",
+    "Preserve screenshots and transaction IDs",
+    "Change passwords and enable two-factor authentication",
+]
+SERIOUSNESS = ["Low", "Medium", "High", "Critical"]
+DUPLICATE_RATE = 0.1
+
+
+def make_case(index: int, rng: random.Random, category: str, source: dict = None) -> dict:
+    """One case; when `source` is given, a light rewording of that case."""
+    spec = CATEGORIES[category]
+    city = rng.choice(CITIES)
+    amount = f"{rng.randint(5, 500) * 1000:,}"
+
+    if source is None:
+        hook = rng.choice(spec["hooks"])
+        description = " ".join([
+            spec["story"].format(hook=hook, amount=amount),
+            f"The incident was reported in {city}.",
+            rng.choice(OUTCOMES),
+        ])
+        subcategory = rng.choice(spec["subcategories"])
+        laws = rng.sample(spec["laws"], k=rng.randint(1, len(spec["laws"])))
+        seriousness = rng.choice(SERIOUSNESS)
+    else:
+        meta = source["metadatas"][0]
+        description = source["documents"][0].replace(meta["location"], city)
+        subcategory = meta["subcategory"]
+        laws = [law["section"] for law in meta["laws_involved"]]
+        seriousness = meta["seriousness_level"]
+
+    return {
+        "ids": [f"bench_{index:07d}"],
+        "metadatas": [{
+            "title": f"Incident {index} - {city}",
+            "category": category,
+            "subcategory": subcategory,
+            "seriousness_level": seriousness,
+            "location": city,
+            "year": rng.randint(2015, 2025),
+            "next_steps_user_should_take": rng.sample(NEXT_STEPS, k=3),
+            "laws_involved": [{"section": law} for law in laws],
+        }],
+        "documents": [description],
+    }
+
+
+def generate_cases(n: int, seed: int = 0) -> dict:
+    """{category: [case, ...]} with n cases in total."""
+    rng = random.Random(seed)
+    categories = list(CATEGORIES)
+    corpus = {category: [] for category in categories}
+    generated = []
+
+    for index in range(n):
+        if generated and rng.random() < DUPLICATE_RATE:
+            category, source = rng.choice(generated)
+            case = make_case(index, rng, category, source)
+        else:
+            category = categories[index % len(categories)]
+            case = make_case(index, rng, category)
+            generated.append((category, case))
+        corpus[category].append(case)
+
+    return corpus
+
+
+def write_corpus(n: int, out_dir: Path, seed: int = 0) -> Path:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"cases_{n}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(generate_cases(n, seed), f)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic cases.json corpora")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--out", type=Path, default=Path("bench_corpora"))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        print(f"📝 Wrote {write_corpus(size, args.out, args.seed)}")
@@ -0,0 +1,302 @@
+"""
+Retrieval quality vs latency, per retrieval configuration.
+
+Builds a labeled query set from the ingested cases and runs it through
+retrieve_documents() under each configuration (backend, flat-index
+precision, hybrid fusion, MMR, filters):
+
+- title        the case title; relevant = that case
+- description  the first sentence of the case description; relevant = that case
+- category     "<subcategory> (<category>)"; relevant = every case in the category
+- statute      a law cited by some case ("Section 66D IT Act"); relevant =
+               every case citing exactly that law
+
+recall@k is |relevant ∩ top-k| / min(k, |relevant|), so large relevant sets
+(category, statute) are not capped far below 1. MRR uses the first relevant
+hit. Latency is per retrieve_documents() call with the query already
+embedded (embedding cost is the same for every configuration and is
+reported once). Index size is what the configuration reads: for Chroma the
+HNSW segment files plus chroma.sqlite3 (which holds the vectors that are
+not yet flushed to HNSW, and for small collections most of them), for the
+flat backend the scanned matrix; plus the BM25 index for hybrid
+configurations. Vector size is the raw vectors alone (n x dim x bytes per
+value), which compares the backends like for like.
+
+    cd backend
+    python -m bench.evaluate                      # the ingested cyber_crime_db
+    python -m bench.evaluate --configs chroma flat-int8 hybrid-mmr --k 10
+    python -m bench.evaluate --synthetic 5000 --fake-embeddings --json eval.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from bench.run import percentile
+
+QUERY_KINDS = ("title", "description", "category", "statute")
+
+CONFIGS = {
+    "chroma": {"backend": "chroma", "hybrid": False, "mmr": False},
+    "flat": {"backend": "flat", "precision": "float32", "hybrid": False, "mmr": False},
+    "flat-f16": {"backend": "flat", "precision": "float16", "rescore": 0, "hybrid": False, "mmr": False},
+    "flat-int8": {"backend": "flat", "precision": "int8", "rescore": 0, "hybrid": False, "mmr": False},
+    "flat-int8-rescore": {"backend": "flat", "precision": "int8", "rescore": 4, "hybrid": False, "mmr": False},
+    "hybrid": {"backend": "chroma", "hybrid": True, "mmr": False},
+    "hybrid-mmr": {"backend": "chroma", "hybrid": True, "mmr": True},
+    "hybrid-mmr-filters": {"backend": "chroma", "hybrid": True, "mmr": True, "filters": True},
+}
+
+
+# -----------------------------
+# LABELED QUERIES
+# -----------------------------
+def iter_records(collection, page_size: int = 1000):
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas", "documents"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            return
+        yield from zip(page["ids"], page["metadatas"], page["documents"])
+        offset += len(page["ids"])
+
+
+def _description(document: str) -> str:
+    """First sentence of the Description line of an ingested composite document."""
+    for line in document.splitlines():
+        if line.startswith("Description:"):
+            text = line[len("Description:"):].strip()
+            sentence = text.split(". ")[0]
+            return " ".join(sentence.split()[:30])
+    return ""
+
+
+def _laws(metadata: dict):
+    return [law.strip() for law in str(metadata.get("laws", "")).split(";") if law.strip()]
+
+
+def build_queries(collection, per_kind: int = 100, seed: int = 0):
+    """[{kind, query, relevant: set(ids), category}] sampled from the collection."""
+    records = list(iter_records(collection))
+    by_category = defaultdict(set)
+    by_law = defaultdict(set)
+    subcategories = {}
+    for record_id, metadata, _ in records:
+        category = metadata.get("category") or ""
+        by_category[category].add(record_id)
+        for law in _laws(metadata):
+            by_law[law].add(record_id)
+        if metadata.get("subcategory"):
+            subcategories.setdefault((category, metadata["subcategory"]), None)
+
+    rng = random.Random(seed)
+    sample = rng.sample(records, min(per_kind, len(records)))
+    queries = []
+
+    for record_id, metadata, document in sample:
+        if metadata.get("title"):
+            queries.append({"kind": "title", "query": metadata["title"],
+                            "relevant": {record_id}, "category": metadata.get("category")})
+        description = _description(document)
+        if description:
+            queries.append({"kind": "description", "query": description,
+                            "relevant": {record_id}, "category": metadata.get("category")})
+
+    pairs = list(subcategories) or [(category, "") for category in by_category]
+    for category, subcategory in rng.sample(pairs, min(per_kind, len(pairs))):
+        label = category.replace("_", " ")
+        queries.append({"kind": "category", "query": f"{subcategory} ({label})" if subcategory else label,
+                        "relevant": by_category[category], "category": category})
+
+    laws = sorted(by_law)
+    for law in rng.sample(laws, min(per_kind, len(laws))):
+        queries.append({"kind": "statute", "query": law, "relevant": by_law[law], "category": None})
+
+    return queries
+
+
+# -----------------------------
+# METRICS
+# -----------------------------
+def score(ranked_ids, relevant, k: int):
+    """(recall@k, reciprocal rank) for one query."""
+    top = ranked_ids[:k]
+    recall = len(relevant.intersection(top)) / min(k, len(relevant))
+    rank = next((i + 1 for i, record_id in enumerate(ranked_ids) if record_id in relevant), None)
+    return recall, (1.0 / rank if rank else 0.0)
+
+
+def _dir_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def index_bytes(engine, config: dict) -> int:
+    """Bytes of the vector index the configuration reads (+ BM25 index when hybrid)."""
+    if config["backend"] == "flat":
+        total = engine.flat_index().nbytes
+    else:
+        # Chroma keeps each vector segment (HNSW) in a UUID-named directory; vectors
+        # not yet flushed to it (all of them, for small collections) live in chroma.sqlite3
+        total = sum(
+            _dir_bytes(path) for path in engine.db_path.iterdir()
+            if path.is_dir() and path.name != engine.flat_index_dir.name
+        )
+        sqlite_path = engine.db_path / "chroma.sqlite3"
+        if sqlite_path.exists():
+            total += sqlite_path.stat().st_size
+    if config.get("hybrid") and engine.lexical_path.exists():
+        total += engine.lexical_path.stat().st_size
+    return total
+
+
+def vector_bytes(engine, config: dict, n_documents: int, dim: int) -> int:
+    """Raw vector bytes: n x dim x 4 for Chroma (float32), the scanned matrix for flat."""
+    if config["backend"] == "flat":
+        return engine.flat_index().nbytes
+    return n_documents * dim * 4
+
+
+# -----------------------------
+# EVALUATION
+# -----------------------------
+def evaluate_config(name: str, config: dict, queries, embeddings, k: int, n_documents: int) -> dict:
+    from app.rag import query as query_module
+    from app.rag.engine import get_engine
+    from app.rag.filters import make_filters
+
+    engine = get_engine()
+    engine.backend = config["backend"]
+    engine.flat_precision = config.get("precision", engine.flat_precision)
+    engine.flat_rescore = config.get("rescore", 0)
+    query_module.HYBRID_RETRIEVAL = config["hybrid"]
+    query_module.MMR_ENABLED = config["mmr"]
+
+    recalls = defaultdict(list)
+    reciprocal_ranks = []
+    latencies = []
+    returned = []
+
+    with contextlib.redirect_stdout(io.StringIO()):    # MMR logs a line per query
+        for item, embedding in zip(queries, embeddings):
+            filters = make_filters(category=item["category"]) if config.get("filters") else None
+            started = time.perf_counter()
+            docs = query_module.retrieve_documents(item["query"], k, query_embedding=embedding, filters=filters)
+            latencies.append(time.perf_counter() - started)
+
+            recall, rr = score([doc["id"] for doc in docs], item["relevant"], k)
+            recalls[item["kind"]].append(recall)
+            reciprocal_ranks.append(rr)
+            returned.append(len(docs))
+
+    all_recalls = [value for values in recalls.values() for value in values]
+    return {
+        "config": name,
+        **config,
+        f"recall@{k}": round(sum(all_recalls) / len(all_recalls), 4),
+        "mrr": round(sum(reciprocal_ranks) / len(reciprocal_ranks), 4),
+        "recall_by_kind": {kind: round(sum(values) / len(values), 4) for kind, values in recalls.items()},
+        "mean_results": round(sum(returned) / len(returned), 2),
+        "ms_mean": round(1000 * sum(latencies) / len(latencies), 3),
+        "ms_p50": round(1000 * percentile(latencies, 50), 3),
+        "ms_p95": round(1000 * percentile(latencies, 95), 3),
+        "index_mb": round(index_bytes(get_engine(), config) / 1e6, 3),
+        "vector_mb": round(vector_bytes(get_engine(), config, n_documents, len(embeddings[0])) / 1e6, 3),
+    }
+
+
+def evaluate(config_names, k: int = 5, per_kind: int = 100, seed: int = 0) -> dict:
+    from app.rag.engine import get_engine
+    from app.rag.flat_index import MANIFEST_FILE
+
+    engine = get_engine().warm_up()
+    queries = build_queries(engine.collection, per_kind, seed)
+    if not queries:
+        raise SystemExit("❌ No cases found in the collection; run ingest first")
+
+    started = time.perf_counter()
+    embeddings = engine.embed([item["query"] for item in queries])
+    embed_ms = 1000 * (time.perf_counter() - started) / len(queries)
+
+    has_flat = (engine.flat_index_dir / MANIFEST_FILE).exists()
+    n_documents = engine.collection.count()
+    results = []
+    for name in config_names:
+        config = CONFIGS[name]
+        if config["backend"] == "flat" and not has_flat:
+            print(f"⚠️ Skipping {name}: flat index not exported (python -m app.rag.flat_index)")
+            continue
+        print(f"🔬 Evaluating {name}...")
+        results.append(evaluate_config(name, config, queries, embeddings, k, n_documents))
+
+    counts = defaultdict(int)
+    for item in queries:
+        counts[item["kind"]] += 1
+    return {
+        "documents": n_documents,
+        "k": k,
+        "queries": dict(counts),
+        "embed_ms_per_query": round(embed_ms, 3),
+        "configs": results,
+    }
+
+
+def print_report(report: dict):
+    k = report["k"]
+    queries = ", ".join(f"{count} {kind}" for kind, count in report["queries"].items())
+    print(f"\n📊 {report['documents']} cases, {queries} queries "
+          f"(embedding: {report['embed_ms_per_query']:.2f} ms/query, not included below)")
+
+    kinds = [kind for kind in QUERY_KINDS if kind in report["queries"]]
+    header = (f"  {'config':<20}{f'recall@{k}':>10}{'MRR':>8}{'results':>9}{'ms mean':>9}{'ms p95':>9}"
+              f"{'index MB':>10}{'vector MB':>11}"
+              + "".join(f"{kind[:11]:>12}" for kind in kinds))
+    print(header)
+    print("  " + "-" * (len(header) - 2))
+    for row in report["configs"]:
+        print(f"  {row['config']:<20}{row[f'recall@{k}']:>10.3f}{row['mrr']:>8.3f}{row['mean_results']:>9.2f}"
+              f"{row['ms_mean']:>9.2f}{row['ms_p95']:>9.2f}{row['index_mb']:>10.2f}{row['vector_mb']:>11.2f}"
+              + "".join(f"{row['recall_by_kind'].get(kind, 0.0):>12.3f}" for kind in kinds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k / MRR vs latency per retrieval configuration")
+    parser.add_argument("--configs", nargs="+", choices=list(CONFIGS), default=list(CONFIGS))
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=100, help="queries per kind")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--synthetic", type=int, metavar="N",
+                        help="evaluate on a temporary DB with N synthetic cases instead of cyber_crime_db")
+    parser.add_argument("--fake-embeddings", action="store_true",
+                        help="hash embeddings instead of sentence-transformers (no torch needed)")
+    parser.add_argument("--json", type=Path, help="also write the results here")
+    args = parser.parse_args()
+
+    # Per-query latency should not include the micro-batching wait
+    os.environ["QUERY_BATCHING"] = "false"
+    if args.synthetic:
+        os.environ["CYBERCRIME_DB_PATH"] = str(Path(tempfile.mkdtemp(prefix="cybercrime_eval_")) / "db")
+    if args.fake_embeddings:
+        from bench.fakes import install_hash_embeddings
+        install_hash_embeddings()
+    if args.synthetic:
+        from bench.run import ingest_synthetic
+        print(f"📝 Ingesting {args.synthetic} synthetic cases...")
+        ingest_synthetic(args.synthetic, Path(os.environ["CYBERCRIME_DB_PATH"]).parent, args.seed)
+
+    report = evaluate(args.configs, args.k, args.queries, args.seed)
+    print_report(report)
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+        print(f"\n💾 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Deterministic local stand-ins for the network services.
+
+Each fake has a configurable latency and returns output derived from its
+input (seeded by a hash), so two runs with the same settings do the same
+work. install() swaps them in before the app is imported:
+
+- Groq (sync + async, streamed and not) -> llm.client / llm.async_client
+- deep_translator.GoogleTranslator      -> sys.modules["deep_translator"]
+- gtts.gTTS                             -> sys.modules["gtts"]
+- whisper.load_model                    -> sys.modules["whisper"]
+- optionally the sentence-transformer embedding function (hash vectors),
+  and WAV decoding when ffmpeg is not installed
+"""
+
+import asyncio
+import hashlib
+import io
+import random
+import shutil
+import sys
+import time
+import types
+import wave
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class Latency:
+    """Simulated service latencies, in milliseconds."""
+    llm_first_token_ms: float = 300.0
+    llm_token_ms: float = 8.0
+    translate_ms: float = 150.0
+    translate_per_char_ms: float = 0.05
+    tts_ms: float = 200.0
+    tts_per_char_ms: float = 1.5
+    whisper_per_audio_second_ms: float = 150.0
+
+
+def _seed(text: str) -> int:
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:12], 16)
+
+
+# -----------------------------
+# LLM (Groq)
+# -----------------------------
+SECTIONS = (
+    "1. Situation Summary", "2. Applicable Laws", "3. Similar Cases",
+    "4. Immediate Next Steps", "5. Where to Report", "Disclaimer",
+)
+SENTENCES = (
+    "Report the incident on the national cybercrime helpline 1930 as soon as possible.",
+    "File a complaint at cybercrime.gov.in and keep the acknowledgement number.",
+    "Preserve screenshots, transaction IDs and the sender's details as evidence.",
+    "Similar cases were registered under Section 66D of the IT Act and IPC 420.",
+    "Ask your bank to freeze the beneficiary account and raise a chargeback request.",
+    "In comparable cases the police traced the mule accounts within a few weeks.",
+    "Do not share one-time passwords or remote-access codes with anyone.",
+    "This is general information and not a substitute for advice from a lawyer.",
+)
+
+
+def fake_answer(messages, max_sentences: int = 14) -> str:
+    """A structured, deterministic answer seeded by the user prompt."""
+    rng = random.Random(_seed(messages[-1]["content"]))
+    parts = []
+    for section in SECTIONS:
+        body = " ".join(rng.choice(SENTENCES) for _ in range(max(1, max_sentences // len(SECTIONS))))
+        parts.append(f"**{section}**\n{body}")
+    return "\n\n".join(parts)
+
+
+def _tokens(text: str):
+    """Split like an LLM stream: roughly 4 characters per delta."""
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+
+def _usage(messages, answer):
+    prompt_chars = sum(len(m["content"]) for m in messages)
+    return types.SimpleNamespace(prompt_tokens=prompt_chars // 4, completion_tokens=len(answer) // 4)
+
+
+def _chunk(content=None, usage=None):
+    choices = [] if content is None else [
+        types.SimpleNamespace(delta=types.SimpleNamespace(content=content))
+    ]
+    x_groq = types.SimpleNamespace(usage=usage) if usage is not None else None
+    return types.SimpleNamespace(choices=choices, x_groq=x_groq)
+
+
+class _Completions:
+    def __init__(self, latency: Latency):
+        self.latency = latency
+
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        answer = fake_answer(messages)
+        tokens = _tokens(answer)
+        if not stream:
+            time.sleep((self.latency.llm_first_token_ms + self.latency.llm_token_ms * len(tokens)) / 1000)
+            message = types.SimpleNamespace(content=answer)
+            return types.SimpleNamespace(
+                choices=[types.SimpleNamespace(message=message)], usage=_usage(messages, answer)
+            )
+
+        def stream_chunks():
+            time.sleep(self.latency.llm_first_token_ms / 1000)
+            for token in tokens:
+                yield _chunk(token)
+                time.sleep(self.latency.llm_token_ms / 1000)
+            yield _chunk(usage=_usage(messages, answer))
+
+        return stream_chunks()
+
+
+class _AsyncCompletions:
+    def __init__(self, latency: Latency):
+        self.latency = latency
+
+    async def create(self, model=None, messages=None, stream=False, **kwargs):
+        answer = fake_answer(messages)
+        tokens = _tokens(answer)
+        if not stream:
+            await asyncio.sleep((self.latency.llm_first_token_ms + self.latency.llm_token_ms * len(tokens)) / 1000)
+            message = types.SimpleNamespace(content=answer)
+            return types.SimpleNamespace(
+                choices=[types.SimpleNamespace(message=message)], usage=_usage(messages, answer)
+            )
+
+        async def stream_chunks():
+            await asyncio.sleep(self.latency.llm_first_token_ms / 1000)
+            for token in tokens:
+                yield _chunk(token)
+                await asyncio.sleep(self.latency.llm_token_ms / 1000)
+            yield _chunk(usage=_usage(messages, answer))
+
+        return stream_chunks()
+
+
+class FakeGroq:
+    """Implements the slice of the Groq client used by llm.py."""
+
+    def __init__(self, latency: Latency, asynchronous: bool = False):
+        completions = _AsyncCompletions(latency) if asynchronous else _Completions(latency)
+        self.chat = types.SimpleNamespace(completions=completions)
+
+
+# -----------------------------
+# TRANSLATOR / TTS / WHISPER
+# -----------------------------
+def make_translator_class(latency: Latency):
+    class FakeGoogleTranslator:
+        def __init__(self, source="auto", target="en"):
+            self.source = source
+            self.target = target
+
+        def translate(self, text):
+            time.sleep((latency.translate_ms + latency.translate_per_char_ms * len(text)) / 1000)
+            return f"[{self.target}] {text}"
+
+    return FakeGoogleTranslator
+
+
+def make_gtts_class(latency: Latency):
+    class FakeGTTS:
+        def __init__(self, text, lang="en", slow=False):
+            self.text = text
+            self.lang = lang
+
+        def write_to_fp(self, fp):
+            time.sleep((latency.tts_ms + latency.tts_per_char_ms * len(self.text)) / 1000)
+            # ~1 KB of fake MP3 per 10 characters of text
+            rng = random.Random(_seed(self.lang + self.text))
+            fp.write(bytes(rng.getrandbits(8) for _ in range(100 * max(1, len(self.text) // 10))))
+
+    return FakeGTTS
+
+
+BENCH_QUERIES = (
+    "I lost money in a UPI fraud after clicking a payment link",
+    "Someone hacked my Instagram account and is messaging my friends",
+    "A loan app is threatening to share my photos with my contacts",
+    "I was cheated in an online job offer that asked for a registration fee",
+    "What is section 66C IT Act",
+    "My debit card was cloned and money was withdrawn at an ATM",
+)
+
+
+def make_whisper_module(latency: Latency):
+    class FakeWhisperModel:
+        def transcribe(self, audio, **options):
+            seconds = len(audio) / 16000 if isinstance(audio, np.ndarray) else 5.0
+            time.sleep(latency.whisper_per_audio_second_ms * seconds / 1000)
+            return {"text": BENCH_QUERIES[int(seconds * 10) % len(BENCH_QUERIES)]}
+
+    module = types.ModuleType("whisper")
+    module.load_model = lambda name, *args, **kwargs: FakeWhisperModel()
+    return module
+
+
+def wav_bytes(seconds: float, speech_seconds: float = None, sample_rate: int = 16000, seed: int = 0) -> bytes:
+    """A mono 16-bit WAV: a tone (the "speech") padded with low noise (silence)."""
+    rng = np.random.default_rng(seed)
+    speech_seconds = seconds / 2 if speech_seconds is None else speech_seconds
+    lead = int(sample_rate * (seconds - speech_seconds) / 2)
+    speech = int(sample_rate * speech_seconds)
+    samples = rng.normal(0, 0.002, int(sample_rate * seconds))
+    samples[lead:lead + speech] += 0.3 * np.sin(np.arange(speech) * 2 * np.pi * 220 / sample_rate)
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes((np.clip(samples, -1, 1) * 32767).astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+
+def decode_wav(data: bytes, *args, **kwargs):
+    """Stand-in for audio.decode_audio when ffmpeg is missing (16 kHz mono WAV only)."""
+    with wave.open(io.BytesIO(data)) as wav:
+        frames = wav.readframes(wav.getnframes())
+    return np.frombuffer(frames, np.int16).astype(np.float32) / 32768.0
+
+
+# -----------------------------
+# EMBEDDINGS
+# -----------------------------
+def install_hash_embeddings(dim: int = 384):
+    """
+    Replace the sentence-transformer with bag-of-words hash vectors (no torch).
+    Retrieval quality is meaningless, but the vector-search work is real.
+    """
+    from chromadb import EmbeddingFunction
+    from chromadb.utils import embedding_functions
+
+    class HashEmbeddingFunction(EmbeddingFunction):
+        def __init__(self, model_name=None, **kwargs):
+            self.model_name = model_name
+
+        def __call__(self, input):
+            vectors = []
+            for text in input:
+                vector = np.zeros(dim, dtype=np.float32)
+                for word in text.lower().split():
+                    vector[_seed(word) % dim] += 1.0
+                norm = np.linalg.norm(vector)
+                vectors.append(vector / norm if norm else vector)
+            return vectors
+
+        @staticmethod
+        def name():
+            return "bench-hash"
+
+        def get_config(self):
+            return {}
+
+        @staticmethod
+        def build_from_config(config):
+            return HashEmbeddingFunction()
+
+    embedding_functions.SentenceTransformerEmbeddingFunction = HashEmbeddingFunction
+
+
+def install(latency: Latency = None, hash_embeddings: bool = False):
+    """
+    Install the fakes. Must run before app modules are imported (they bind
+    the Groq clients at import time); WAV decoding is patched afterwards by
+    install_decoder().
+    """
+    latency = latency or Latency()
+
+    sys.modules["deep_translator"] = types.SimpleNamespace(GoogleTranslator=make_translator_class(latency))
+    sys.modules["gtts"] = types.SimpleNamespace(gTTS=make_gtts_class(latency))
+    sys.modules["whisper"] = make_whisper_module(latency)
+    if hash_embeddings:
+        install_hash_embeddings()
+
+    from app.rag import llm
+    llm.client = FakeGroq(latency)
+    llm.async_client = FakeGroq(latency, asynchronous=True)
+    return latency
+
+
+def install_decoder():
+    """Decode uploads with the WAV reader if ffmpeg is not on PATH."""
+    if shutil.which("ffmpeg"):
+        return False
+    from app.rag import audio, voice_utils
+
+    class WavStreamDecoder(audio.StreamDecoder):
+        """StreamDecoder that buffers the upload and reads it as WAV on finish()."""
+
+        def __init__(self, max_seconds: float = audio.MAX_AUDIO_SECONDS, sample_rate: int = audio.SAMPLE_RATE, **kwargs):
+            self.max_samples = int(max_seconds * sample_rate)
+            self.max_seconds = max_seconds
+            self.bytes_in = 0
+            self._data = bytearray()
+
+        def feed(self, data: bytes):
+            self.bytes_in += len(data)
+            self._data.extend(data)
+
+        @property
+        def decoded_samples(self) -> int:
+            return 0
+
+        def finish(self, timeout: float = None):
+            samples = decode_wav(bytes(self._data))
+            self.check_duration(len(samples))
+            return samples
+
+        def close(self):
+            pass
+
+    audio.StreamDecoder = WavStreamDecoder
+    voice_utils.decode_audio = decode_wav
+    return True
@@ -0,0 +1,364 @@
+"""
+Offline end-to-end benchmark.
+
+Generates a synthetic corpus, ingests it into a throwaway Chroma DB, swaps
+the network services for the local stand-ins in fakes.py, and drives the
+real FastAPI app in-process (no sockets) at a fixed concurrency.
+
+Reports requests/s and p50 / p95 / p99 latency per scenario and per stage.
+Stage samples come from the Server-Timing header (/ask), client-side
+timing (/ask/stream: first token and total) and the response timings
+(/process-audio).
+
+    cd backend
+    python -m bench.run --sizes 1000 10000 --requests 200 --concurrency 16
+    python -m bench.run --sizes 500 --fake-embeddings --scenarios ask voice --json out.json
+
+Each corpus size runs in its own subprocess, since the DB location is read
+at import time.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+SCENARIOS = ("ask", "ask_stream", "voice")
+LANGUAGES = ("english", "hindi")
+
+
+def percentile(values, q: float) -> float:
+    """Nearest-rank percentile (q in 0-100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples, wall_seconds: float) -> dict:
+    return {
+        "count": len(samples),
+        "rps": round(len(samples) / wall_seconds, 2) if wall_seconds else 0.0,
+        "p50_ms": round(percentile(samples, 50) * 1000, 1),
+        "p95_ms": round(percentile(samples, 95) * 1000, 1),
+        "p99_ms": round(percentile(samples, 99) * 1000, 1),
+    }
+
+
+def parse_server_timing(header: str) -> dict:
+    """{stage: seconds} from 'stage;dur=12.3, other;dur=4.5'."""
+    timings = {}
+    for entry in filter(None, (part.strip() for part in (header or "").split(","))):
+        name, _, rest = entry.partition(";")
+        if rest.startswith("dur="):
+            timings[name] = float(rest[4:]) / 1000
+    return timings
+
+
+class Recorder:
+    """Latency samples per scenario and per (scenario, stage)."""
+
+    def __init__(self):
+        self.totals = defaultdict(list)
+        self.stages = defaultdict(lambda: defaultdict(list))
+        self.errors = defaultdict(int)
+
+    def record(self, scenario: str, seconds: float, stages: dict = None):
+        self.totals[scenario].append(seconds)
+        for stage, value in (stages or {}).items():
+            self.stages[scenario][stage].append(value)
+
+    def report(self, wall: dict) -> dict:
+        return {
+            scenario: {
+                **summarize(samples, wall[scenario]),
+                "errors": self.errors[scenario],
+                "stages": {
+                    stage: summarize(values, wall[scenario])
+                    for stage, values in sorted(self.stages[scenario].items())
+                },
+            }
+            for scenario, samples in self.totals.items()
+        }
+
+
+# -----------------------------
+# SCENARIOS
+# -----------------------------
+async def run_ask(client, recorder, question, language):
+    started = time.perf_counter()
+    response = await client.post("/ask", json={"question": question, "language": language})
+    elapsed = time.perf_counter() - started
+    if response.status_code != 200:
+        recorder.errors["ask"] += 1
+        return
+    stages = parse_server_timing(response.headers.get("server-timing"))
+    stages.pop("total", None)
+    recorder.record("ask", elapsed, stages)
+
+
+async def stream_lines(app, path: str, payload: dict):
+    """
+    POST to the ASGI app directly and yield (status, line) as body chunks are
+    sent. httpx's ASGITransport buffers the whole response, which would hide
+    time-to-first-token.
+    """
+    body = json.dumps(payload).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "client": ("bench", 0), "server": ("bench", 80),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    }
+    messages = asyncio.Queue()
+    request_sent = False
+    finished = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    task = asyncio.create_task(app(scope, receive, messages.put))
+    status, pending = None, b""
+    try:
+        while True:
+            message = await messages.get()
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                continue
+            pending += message.get("body", b"")
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                yield status, line.decode("utf-8")
+            if not message.get("more_body"):
+                break
+        if pending:
+            yield status, pending.decode("utf-8")
+    finally:
+        finished.set()
+        await task
+
+
+async def run_ask_stream(app, recorder, question, language):
+    started = time.perf_counter()
+    stages = {}
+    async for status, line in stream_lines(app, "/ask/stream", {"question": question, "language": language}):
+        if status != 200:
+            recorder.errors["ask_stream"] += 1
+            return
+        if not line:
+            continue
+        event = json.loads(line)
+        if event["type"] == "sources":
+            stages.setdefault("sources", time.perf_counter() - started)
+        elif event["type"] in ("token", "answer"):
+            stages.setdefault("first_token", time.perf_counter() - started)
+        elif event["type"] == "error":
+            recorder.errors["ask_stream"] += 1
+            return
+    recorder.record("ask_stream", time.perf_counter() - started, stages)
+
+
+async def run_voice(client, recorder, audio, language):
+    started = time.perf_counter()
+    response = await client.post(
+        "/process-audio",
+        files={"file": ("query.wav", audio, "audio/wav")},
+        data={"target_lang": language},
+    )
+    elapsed = time.perf_counter() - started
+    if response.status_code != 200:
+        recorder.errors["voice"] += 1
+        return
+    timings = response.json().get("timings") or {}
+    stages = {
+        stage: value for stage, value in timings.items()
+        if not stage.endswith("_seconds") and stage != "total"
+    }
+    recorder.record("voice", elapsed, stages)
+
+
+async def drive(app, scenario: str, requests: int, concurrency: int, recorder: Recorder) -> float:
+    """Send `requests` requests with at most `concurrency` in flight; returns wall seconds."""
+    import httpx
+    from bench.fakes import BENCH_QUERIES, wav_bytes
+
+    clips = [wav_bytes(3.0 + i, seed=i) for i in range(3)]
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        async def one(i):
+            async with semaphore:
+                language = LANGUAGES[i % len(LANGUAGES)]
+                try:
+                    if scenario == "voice":
+                        await run_voice(client, recorder, clips[i % len(clips)], language)
+                    elif scenario == "ask_stream":
+                        await run_ask_stream(app, recorder, BENCH_QUERIES[i % len(BENCH_QUERIES)], language)
+                    else:
+                        await run_ask(client, recorder, BENCH_QUERIES[i % len(BENCH_QUERIES)], language)
+                except Exception as e:
+                    recorder.errors[scenario] += 1
+                    print(f"⚠️ {scenario} request failed: {e}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return time.perf_counter() - started
+
+
+# -----------------------------
+# ONE CORPUS SIZE (subprocess)
+# -----------------------------
+def ingest_synthetic(size: int, workdir: Path, seed: int = 0) -> float:
+    """Write a synthetic corpus and ingest it into CYBERCRIME_DB_PATH; returns seconds."""
+    from app.rag import ingest
+    from bench.corpus import write_corpus
+
+    ingest.filename = write_corpus(size, workdir, seed)
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        ingest.ingest_cases(full_rebuild=True)
+    return time.perf_counter() - started
+
+
+def run_size(args) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix="cybercrime_bench_"))
+
+    # Module-level config is read at import time, so set it before importing the app
+    os.environ["CYBERCRIME_DB_PATH"] = str(workdir / "db")
+    os.environ["TRANSLATION_CACHE_PATH"] = str(workdir / "translations.sqlite3")
+    os.environ["TTS_CACHE_DIR"] = str(workdir / "tts")
+    os.environ["WARMUP_ON_STARTUP"] = "false"
+    if not args.cache:
+        os.environ["SEMANTIC_CACHE_ENABLED"] = "false"
+
+    from bench import fakes
+
+    latency = fakes.install(
+        fakes.Latency(
+            llm_first_token_ms=args.llm_ttft_ms,
+            llm_token_ms=args.llm_token_ms,
+            translate_ms=args.translate_ms,
+            tts_ms=args.tts_ms,
+            whisper_per_audio_second_ms=args.whisper_ms,
+        ),
+        hash_embeddings=args.fake_embeddings,
+    )
+
+    from app.rag.engine import get_engine
+
+    ingest_seconds = ingest_synthetic(args.size, workdir, args.seed)
+
+    started = time.perf_counter()
+    get_engine().warm_up()
+    warm_up_seconds = time.perf_counter() - started
+
+    from app.main import app
+    fakes.install_decoder()
+
+    recorder = Recorder()
+    wall = {}
+    for scenario in args.scenarios:
+        wall[scenario] = asyncio.run(drive(app, scenario, args.requests, args.concurrency, recorder))
+
+    return {
+        "size": args.size,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "latency": vars(latency),
+        "ingest_seconds": round(ingest_seconds, 2),
+        "warm_up_seconds": round(warm_up_seconds, 2),
+        "scenarios": recorder.report(wall),
+    }
+
+
+# -----------------------------
+# REPORT
+# -----------------------------
+def print_report(result: dict):
+    print(f"\n📊 {result['size']} cases — {result['requests']} requests/scenario, "
+          f"concurrency {result['concurrency']} "
+          f"(ingest {result['ingest_seconds']}s, warm-up {result['warm_up_seconds']}s)")
+    header = f"  {'scenario / stage':<32}{'n':>6}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("  " + "-" * (len(header) - 2))
+    for scenario, stats in result["scenarios"].items():
+        errors = f"  ({stats['errors']} errors)" if stats["errors"] else ""
+        print(f"  {scenario:<32}{stats['count']:>6}{stats['rps']:>9}{stats['p50_ms']:>10}"
+              f"{stats['p95_ms']:>10}{stats['p99_ms']:>10}{errors}")
+        for stage, s in stats["stages"].items():
+            print(f"    {stage:<30}{s['count']:>6}{s['rps']:>9}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the RAG / voice pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)   # one size, in the child process
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", action="store_true", help="keep the semantic cache enabled")
+    parser.add_argument("--fake-embeddings", action="store_true",
+                        help="hash embeddings instead of sentence-transformers (no torch needed)")
+    parser.add_argument("--llm-ttft-ms", type=float, default=300.0)
+    parser.add_argument("--llm-token-ms", type=float, default=8.0)
+    parser.add_argument("--translate-ms", type=float, default=150.0)
+    parser.add_argument("--tts-ms", type=float, default=200.0)
+    parser.add_argument("--whisper-ms", type=float, default=150.0, help="per second of audio")
+    parser.add_argument("--json", type=Path, help="also write the results here")
+    args = parser.parse_args()
+
+    if args.size is not None:
+        print(json.dumps(run_size(args)))
+        return
+
+    passthrough = list(sys.argv[1:])
+    results = []
+    for size in args.sizes:
+        print(f"🚀 Benchmarking {size} cases...", file=sys.stderr)
+        child_args = _without(passthrough, ("--sizes", "--json")) + ["--size", str(size)]
+        completed = subprocess.run(
+            [sys.executable, "-m", "bench.run", *child_args],
+            cwd=Path(__file__).resolve().parents[1], capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            print(completed.stderr, file=sys.stderr)
+            raise SystemExit(f"❌ Benchmark for {size} cases failed")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print_report(result)
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"\n💾 Results written to {args.json}")
+
+
+def _without(argv, options):
+    """argv minus the given options and their values."""
+    kept, skipping = [], False
+    for arg in argv:
+        if arg.startswith("--"):
+            skipping = arg.split("=")[0] in options
+        if not skipping:
+            kept.append(arg)
+    return kept
+
+
+if __name__ == "__main__":
+    main()